@@ -1,32 +1,90 @@
-import io
+import asyncio
 import gc
+import io
+import json
 from contextlib import asynccontextmanager
 from typing import List, Optional, Union
+import numpy as np
 import pandas as pd
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
-from src.graph import Graph, ChoroplethParams, Hist2DParams, DotParams, BubbleParams
+from src import dataset
+from src.admission import AdmissionControl, Rejected, estimate_cost
+from src.classify import SCHEMES
+from src.coalesce import SingleFlight, payload_key
+from src.capture import TrafficCapture
+from src.config import Admission, Capture, Lookup, Worker
+from src.graph import (
+    Graph,
+    SubsidyBoundaryParams,
+    ChoroplethParams,
+    Hist2DParams,
+    KDEParams,
+    HexbinParams,
+    DotParams,
+    BubbleParams,
+    fig_to_image,
+)
+from src.lookup import AGGREGATIONS, aggregate, as_points, town_index
+from src.projection import parse, parse_projected, to_lonlat
+from src.reference import check_region
+from src.store import GeometryStore, get_store, set_store
+from src.worker import create_pool
+import matplotlib.pyplot as plt
+
 
+# 繪圖worker池，RENDER_WORKERS為0時為None，改在主行程內繪圖
+render_pool = create_pool(Worker.COUNT, Worker.MAX_RSS_MB, Worker.MAX_REQUESTS)
 
-# 請求計數器，用於定期清理記憶體
-request_counter = 0
-CLEANUP_INTERVAL = 50  # 每50個請求清理一次記憶體
+# 合併相同的進行中繪圖請求
+render_flights = SingleFlight()
+# 繪圖請求的排隊與拒絕
+admission = AdmissionControl()
+
+# 等候繪圖時檢查用戶端是否已中斷連線的間隔（秒）
+DISCONNECT_POLL = 0.5
+
+
+async def warm_up(app: FastAPI, workers_ready: asyncio.Future):
+    """等待繪圖worker預熱完成並建立座標查詢的索引，之後/ready才回報就緒"""
+    try:
+        await asyncio.gather(workers_ready, asyncio.to_thread(town_index))
+    except Exception as e:
+        print(f"繪圖worker預熱失敗: {e}")
+        return
+    app.state.ready = True
+    print(f"已啟動 {render_pool.size} 個繪圖worker")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 啟動時初始化
-    global request_counter
-    request_counter = 0
-    graph_instance.cleanup_memory()
-    print("記憶體管理已初始化")
+    app.state.ready = False
+    warm_up_task = None
+    shared_store = None
+    if render_pool is not None:
+        # 幾何資料放在共享記憶體中，所有worker共用同一份
+        shared_store, render_pool.manifest = GeometryStore.create(dataset.latest())
+        # 主行程也使用共享的store（區域檢查、座標查詢），不另外載入一份
+        set_store(shared_store)
+        # 在背景預熱，服務可先接受連線，/ready在完成後才回報就緒
+        warm_up_task = asyncio.create_task(warm_up(app, render_pool.start()))
+    else:
+        graph_instance.warm_up()
+        await asyncio.to_thread(town_index)
+        app.state.ready = True
     yield
     # 關閉時清理
-    graph_instance.cleanup_memory()
-    print("應用關閉，記憶體已清理")
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    if render_pool is not None:
+        await render_pool.shutdown()
+    if shared_store is not None:
+        shared_store.close()
+    print("應用關閉")
 
 
 app = FastAPI(
@@ -35,11 +93,22 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# 流量錄製（設定CAPTURE_DIR時啟用）
+if Capture.DIR:
+    app.add_middleware(
+        TrafficCapture,
+        directory=Capture.DIR,
+        sample_rate=Capture.SAMPLE_RATE,
+        max_bytes=Capture.MAX_BYTES,
+        backup_count=Capture.BACKUP_COUNT,
+        redact_fields=Capture.REDACT,
+    )
+
 # 添加靜態文件服務
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 建立基礎Graph實例
-graph_instance = Graph()
+# 建立基礎Graph實例（僅在主行程內繪圖時需要）
+graph_instance = Graph() if render_pool is None else None
 
 # Jinja2模板設定
 templates = Jinja2Templates(directory="templates")
@@ -62,6 +131,29 @@ class ChoroplethData(BaseModel):
     cmap: Optional[str] = Field("GnBu", example="GnBu")
     colorbar_format: Optional[str] = Field("{x:,.0f}", example="{x:,.0f}")
     colorbar_tick_visible: Optional[bool] = Field(True, example=True)
+    scheme: Optional[str] = Field(None, example="quantile")
+    k: int = Field(5, example=5)
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
+
+
+class PointChoroplethData(BaseModel):
+    x: List[float] = Field([121.52, 121.55, 120.68], example=[121.52, 121.55, 120.68])
+    y: List[float] = Field([25.04, 25.03, 24.15], example=[25.04, 25.03, 24.15])
+    value: Optional[List[float]] = Field(None, example=None)
+    aggregation: str = Field("count", example="count")
+    level: Optional[str] = Field("county", example="county")
+    cmap: Optional[str] = Field("GnBu", example="GnBu")
+    colorbar_format: Optional[str] = Field("{x:,.0f}", example="{x:,.0f}")
+    colorbar_tick_visible: Optional[bool] = Field(True, example=True)
+    scheme: Optional[str] = Field(None, example="jenks")
+    k: int = Field(5, example=5)
+    format: str = Field("png", example="png")
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
 
 
 class DotPlotData(BaseModel):
@@ -70,6 +162,10 @@ class DotPlotData(BaseModel):
     size: Optional[Union[int, float]] = Field(10, example=10)
     color: Optional[str] = Field("red", example="red")
     alpha: Optional[float] = Field(0.5, example=0.5)
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
 
 
 class Hist2DData(BaseModel):
@@ -85,6 +181,52 @@ class Hist2DData(BaseModel):
     cmap: Optional[str] = Field("GnBu", example="GnBu")
     alpha: Optional[float] = Field(0.5, example=0.5)
     cmin: Optional[int] = Field(1, example=1)
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
+
+
+class KDEData(BaseModel):
+    x: List[float] = Field(
+        [121.52, 121.55, 121.50, 120.68, 120.30],
+        example=[121.52, 121.55, 121.50, 120.68, 120.30],
+    )
+    y: List[float] = Field(
+        [25.04, 25.03, 25.05, 24.15, 22.63],
+        example=[25.04, 25.03, 25.05, 24.15, 22.63],
+    )
+    weights: Optional[List[float]] = Field(None, example=None)
+    bandwidth: float = Field(2000, example=2000)
+    gridsize: int = Field(400, example=400)
+    cmap: Optional[str] = Field("YlOrRd", example="YlOrRd")
+    alpha: Optional[float] = Field(0.6, example=0.6)
+    cmin: Optional[float] = Field(None, example=None)
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
+
+
+class HexbinData(BaseModel):
+    x: List[float] = Field(
+        [121.52, 121.55, 121.50, 120.68, 120.30],
+        example=[121.52, 121.55, 121.50, 120.68, 120.30],
+    )
+    y: List[float] = Field(
+        [25.04, 25.03, 25.05, 24.15, 22.63],
+        example=[25.04, 25.03, 25.05, 24.15, 22.63],
+    )
+    weights: Optional[List[float]] = Field(None, example=None)
+    cellsize: float = Field(5000, example=5000)
+    cmap: Optional[str] = Field("GnBu", example="GnBu")
+    alpha: Optional[float] = Field(0.8, example=0.8)
+    cmin: Optional[float] = Field(1, example=1)
+    colorbar_format: Optional[str] = Field("{x:,.0f}", example="{x:,.0f}")
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
 
 
 class BubbleData(BaseModel):
@@ -105,46 +247,154 @@ class BubbleData(BaseModel):
         example=["red", "blue", "green", "yellow", "purple", "orange"],
     )
     alpha: Optional[float] = Field(0.5, example=0.5)
+    crs: Optional[str] = Field(None, example="EPSG:4326")
+    vintage: Optional[str] = Field(None, example="1120825")
+    projection: Optional[str] = Field(None, example=None)
+    region: Optional[str] = Field(None, example=None)
 
 
-# 轉換matplotlib的figure為圖片並返回
-def fig_to_image(fig):
+def resolve_vintage(vintage: Optional[str]) -> str:
+    """將請求的邊界資料版本解析為實際版本，未指定時為最新版本"""
     try:
-        img_buf = io.BytesIO()
-        fig.savefig(img_buf, format="png", bbox_inches="tight", dpi=300)
-        img_buf.seek(0)
-        return img_buf
-    finally:
-        # 確保figure被正確關閉以釋放記憶體
-        import matplotlib.pyplot as plt
+        return dataset.resolve(vintage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
-        plt.close(fig)
+def resolve_crs(crs: Optional[str]) -> Optional[str]:
+    """解析輸入座標的座標參考系統，未指定時為EPSG:4326經緯度"""
+    if crs is None:
+        return None
+    try:
+        return parse(crs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def resolve_projection(projection: Optional[str]) -> Optional[str]:
+    """解析繪圖的投影座標系統，未指定時以經緯度繪圖"""
+    if projection is None:
+        return None
+    try:
+        return parse_projected(projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-def cleanup_memory_if_needed():
-    """根據請求計數定期清理記憶體"""
-    global request_counter
-    request_counter += 1
+async def resolve_region(region: Optional[str], vintage: Optional[str]) -> Optional[str]:
+    """檢查單一區域的名稱（見src/reference.py的check_region），未指定時繪製全國"""
+    if region is None:
+        return None
+    try:
+        region = check_region(region)
+        # 確認此資料版本中有該區域（如改制前的版本沒有新的鄉鎮名稱）；
+        # 非預設版本的store在第一次使用時才載入，不在事件迴圈中進行
+        store = await asyncio.to_thread(get_store, dataset.resolve(vintage))
+        store.region_bounds(region)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return region
+
+
+def check_scheme(scheme: Optional[str], k: int):
+    """檢查分層設色圖的分級方式與分級數"""
+    if scheme is not None and scheme not in SCHEMES:
+        raise HTTPException(status_code=400, detail=f"不支援的分級方式: {scheme}")
+    if not 1 <= k <= 12:
+        raise HTTPException(status_code=400, detail=f"分級數必須介於1到12: {k}")
+
+
+async def render(method: str, *args) -> bytes:
+    """繪圖並回傳PNG內容，有worker池時交由worker繪圖"""
+    if render_pool is not None:
+        return await render_pool.render(method, *args)
+    fig, _ = getattr(graph_instance, method)(*args)
+    return fig_to_image(fig).getvalue()
+
+
+async def until_disconnected(request: Optional[Request], awaitable):
+    """等待結果，用戶端中斷連線時取消等待"""
+    task = asyncio.ensure_future(awaitable)
+    if request is None:
+        return await task
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                # 499: 用戶端已關閉連線（nginx慣例），回應不會被收到
+                raise HTTPException(status_code=499, detail="用戶端已中斷連線")
+    finally:
+        task.cancel()
 
-    if request_counter >= CLEANUP_INTERVAL:
-        graph_instance.cleanup_memory()
-        gc.collect()
-        request_counter = 0
 
+async def handle_plot_request(method: str, *args, request: Optional[Request] = None):
+    """
+    統一處理繪圖請求
 
-def handle_plot_request(plot_func, *args, **kwargs):
-    """統一處理繪圖請求的記憶體管理"""
+    參數相同的進行中請求共用同一次繪圖結果；超過容量時返回429/503，
+    排隊期間期限已過或所有等待的用戶端都已中斷連線時，不會開始繪圖。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + Admission.TIMEOUT
+    cost = estimate_cost(method, *args)
     try:
-        cleanup_memory_if_needed()
-        fig, _ = plot_func(*args, **kwargs)
-        img_buf = fig_to_image(fig)
-        return StreamingResponse(img_buf, media_type="image/png")
+        img = await until_disconnected(
+            request,
+            render_flights.run(
+                payload_key(method, *args),
+                lambda: admission.run(method, cost, deadline, lambda: render(method, *args)),
+            ),
+        )
+        return StreamingResponse(io.BytesIO(img), media_type="image/png")
+    except HTTPException:
+        raise
+    except Rejected as e:
+        raise HTTPException(
+            status_code=e.status,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
-        # 確保在錯誤情況下也清理記憶體
-        graph_instance.cleanup_memory()
+        if render_pool is None:
+            # 確保在錯誤情況下也關閉未完成的圖表
+            plt.close("all")
         raise HTTPException(status_code=500, detail=f"繪圖失敗: {str(e)}")
 
 
+async def read_points(
+    request: Request, crs: Optional[str] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    讀取座標查詢的請求內容，並轉為經緯度
+
+    Content-Type為application/octet-stream時，內容為little-endian float64的
+    (x, y)交錯陣列；否則為JSON物件{"x": [...], "y": [...]}。
+    大量座標不經pydantic逐筆驗證，直接轉為NumPy陣列。
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/octet-stream"):
+            if len(body) % 16:
+                raise ValueError("二進位內容的長度必須是16的倍數（float64的x, y成對）")
+            xy = np.frombuffer(body, dtype="<f8").reshape(-1, 2)
+            x, y = xy[:, 0], xy[:, 1]
+        else:
+            data = json.loads(body)
+            x, y = data["x"], data["y"]
+        return as_points(*to_lonlat(x, y, crs))
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"座標格式錯誤: {e}")
+
+
+def nullable(values: np.ndarray, missing: np.ndarray) -> list:
+    """將missing位置轉為null的列表"""
+    values = np.round(values, 2).astype(object)
+    values[missing] = None
+    return values.tolist()
+
+
 # 首頁端點，歡迎訊息
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -152,23 +402,77 @@ async def home(request: Request):
     return templates.TemplateResponse("home.html", {"request": request})
 
 
+# 就緒檢查端點
+@app.get("/ready", summary="就緒檢查")
+async def ready():
+    """預熱完成後返回200，否則返回503"""
+    if not app.state.ready:
+        raise HTTPException(status_code=503, detail="服務預熱中")
+    return {"status": "ready"}
+
+
+# 邊界資料版本端點
+@app.get("/vintages", summary="邊界資料版本")
+async def list_vintages():
+    """返回可用的邊界資料版本與預設（最新）版本"""
+    return {"vintages": list(dataset.vintages()), "latest": dataset.latest()}
+
+
 # 基礎地圖邊界端點
 @app.get("/boundary", summary="獲取地圖邊界")
-async def get_boundary():
-    """返回地圖的邊界圖"""
-    return handle_plot_request(graph_instance.plot_boundary)
+async def get_boundary(
+    request: Request,
+    vintage: Optional[str] = None,
+    projection: Optional[str] = None,
+    region: Optional[str] = None,
+):
+    """
+    返回地圖的邊界圖
+
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
+    """
+    return await handle_plot_request(
+        "plot_boundary",
+        resolve_vintage(vintage),
+        resolve_projection(projection),
+        await resolve_region(region, vintage),
+        request=request,
+    )
 
 
 # 基礎地圖邊界端點+補助地區顏色
 @app.get("/subsidy_boundary", summary="獲取帶補助地區顏色的地圖邊界")
-async def get_subsidy_boundary():
-    """返回帶補助地區顏色的地圖邊界圖"""
-    return handle_plot_request(graph_instance.plot_subsidy_boundary)
+async def get_subsidy_boundary(
+    request: Request,
+    type: int = 1,
+    vintage: Optional[str] = None,
+    projection: Optional[str] = None,
+    region: Optional[str] = None,
+):
+    """
+    返回帶補助地區顏色的地圖邊界圖
+
+    - **type**: 1為受補助地區分為4類，2為分為5類（平地原民區再分為2類），默認為1
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
+    """
+    if type not in (1, 2):
+        raise HTTPException(status_code=400, detail=f"不支援的補助地區分類: {type}")
+    params = SubsidyBoundaryParams(
+        type=type,
+        vintage=resolve_vintage(vintage),
+        projection=resolve_projection(projection),
+        region=await resolve_region(region, vintage),
+    )
+    return await handle_plot_request("plot_subsidy_boundary", params, request=request)
 
 
 # 分層設色圖端點
 @app.post("/choropleth", summary="建立分層設色圖")
-async def create_choropleth(data: ChoroplethData):
+async def create_choropleth(data: ChoroplethData, request: Request):
     """
     根據提供的資料建立分層設色圖
 
@@ -178,7 +482,13 @@ async def create_choropleth(data: ChoroplethData):
     - **cmap**: 顏色映射，默認為'GnBu'
     - **colorbar_format**: 顏色條格式，默認為'{x:,.0f}'
     - **colorbar_tick_visible**: true/false，顏色條刻度是否可見，默認為true
+    - **scheme**: 分級方式，quantile（分位數）、equal_interval（等距）、std（標準差）或jenks（自然斷點），默認為連續色階
+    - **k**: 分級數，默認為5
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
     """
+    check_scheme(data.scheme, data.k)
     df = pd.DataFrame(data.data)
 
     # 使用新的ChoroplethParams物件
@@ -189,14 +499,81 @@ async def create_choropleth(data: ChoroplethData):
         cmap=data.cmap,
         colorbar_format=data.colorbar_format,
         colorbar_tick_visible=data.colorbar_tick_visible,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
+        scheme=data.scheme,
+        k=data.k,
     )
 
-    return handle_plot_request(graph_instance.plot_choropleth, params)
+    return await handle_plot_request("plot_choropleth", params, request=request)
+
+
+# 點資料彙總的分層設色圖端點
+@app.post("/choropleth/points", summary="由點資料彙總建立分層設色圖")
+async def create_point_choropleth(data: PointChoroplethData, request: Request):
+    """
+    將點資料依所在的縣市或鄉鎮彙總後繪製分層設色圖
+
+    - **x**, **y**: 點的經緯度
+    - **value**: 各點的數值，sum與mean需要提供
+    - **aggregation**: count（點數）、sum（總和）、mean（平均）或density（每平方公里的點數，有value時為總和），默認為count
+    - **level**: 'county'或'town'，默認為'county'
+    - **cmap**, **colorbar_format**, **colorbar_tick_visible**, **scheme**, **k**: 同/choropleth
+    - **format**: png返回圖片，json返回彙總表，默認為png
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
+    """
+    if data.format not in ("png", "json"):
+        raise HTTPException(status_code=400, detail=f"不支援的格式: {data.format}")
+    if data.aggregation not in AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"不支援的彙總方式: {data.aggregation}")
+    level = data.level or "county"
+    if level not in ("county", "town"):
+        raise HTTPException(status_code=400, detail=f"不支援的層級: {level}")
+    check_scheme(data.scheme, data.k)
+    vintage = resolve_vintage(data.vintage)
+    try:
+        x, y = as_points(*to_lonlat(data.x, data.y, resolve_crs(data.crs)))
+        index = await asyncio.to_thread(town_index, vintage)
+        table = await asyncio.to_thread(
+            aggregate, index, x, y, data.value, data.aggregation, level
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if data.format == "json":
+        return JSONResponse(
+            {
+                "vintage": vintage,
+                "level": level,
+                "aggregation": data.aggregation,
+                "unmatched": int(len(x) - table["count"].sum()),
+                "data": table.astype(object).where(table.notna(), None).to_dict("records"),
+            }
+        )
+
+    params = ChoroplethParams(
+        data=table,
+        column=data.aggregation,
+        level=level,
+        cmap=data.cmap,
+        colorbar_format=data.colorbar_format,
+        colorbar_tick_visible=data.colorbar_tick_visible,
+        vintage=vintage,
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, vintage),
+        scheme=data.scheme,
+        k=data.k,
+    )
+    return await handle_plot_request("plot_choropleth", params, request=request)
 
 
 # 點圖端點
 @app.post("/dot", summary="建立點散布圖")
-async def create_dot_plot(data: DotPlotData):
+async def create_dot_plot(data: DotPlotData, request: Request):
     """
     根據提供的座標建立點散布圖
 
@@ -205,18 +582,30 @@ async def create_dot_plot(data: DotPlotData):
     - **size**: 點的大小，默認為1
     - **color**: 點的顏色，默認為'red'
     - **alpha**: 透明度，默認為0.5
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
     """
     # 使用新的DotParams物件
+    x, y = to_lonlat(data.x, data.y, resolve_crs(data.crs))
     params = DotParams(
-        x=data.x, y=data.y, size=data.size, color=data.color, alpha=data.alpha
+        x=x,
+        y=y,
+        size=data.size,
+        color=data.color,
+        alpha=data.alpha,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
     )
 
-    return handle_plot_request(graph_instance.plot_dot, params)
+    return await handle_plot_request("plot_dot", params, request=request)
 
 
 # 2D直方圖端點
 @app.post("/hist2d", summary="建立2D直方圖")
-async def create_hist2d(data: Hist2DData):
+async def create_hist2d(data: Hist2DData, request: Request):
     """
     根據提供的座標建立2D直方圖
 
@@ -226,23 +615,120 @@ async def create_hist2d(data: Hist2DData):
     - **cmap**: 顏色映射，默認為'GnBu'
     - **alpha**: 透明度，默認為0.5
     - **cmin**: 最小計數，默認為1
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
     """
     # 使用新的Hist2DParams物件
+    x, y = to_lonlat(data.x, data.y, resolve_crs(data.crs))
     params = Hist2DParams(
-        x=data.x,
-        y=data.y,
+        x=x,
+        y=y,
         bins=data.bins,
         cmap=data.cmap,
         alpha=data.alpha,
         cmin=data.cmin,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
     )
 
-    return handle_plot_request(graph_instance.plot_hist2d, params)
+    return await handle_plot_request("plot_hist2d", params, request=request)
+
+
+# 核密度熱度圖端點
+@app.post("/kde", summary="建立核密度熱度圖")
+async def create_kde(data: KDEData, request: Request):
+    """
+    根據提供的座標建立平滑的核密度熱度圖
+
+    - **x**: X座標列表
+    - **y**: Y座標列表
+    - **weights**: 各點的權重，默認每點為1
+    - **bandwidth**: 高斯核的標準差（公尺），默認為2000
+    - **gridsize**: 各子圖長邊的格數，默認為400
+    - **cmap**: 顏色映射，默認為'YlOrRd'
+    - **alpha**: 透明度，默認為0.6
+    - **cmin**: 低於此密度（每平方公里）的格不著色，默認為最大密度的1%
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
+    """
+    if not 0 < data.bandwidth <= Lookup.MAX_RADIUS:
+        raise HTTPException(
+            status_code=400, detail=f"bandwidth必須大於0且不超過{Lookup.MAX_RADIUS:g}"
+        )
+    if not 10 <= data.gridsize <= 2000:
+        raise HTTPException(status_code=400, detail="gridsize必須介於10到2000")
+    if data.weights is not None and len(data.weights) != len(data.x):
+        raise HTTPException(status_code=400, detail="weights與座標的長度不同")
+    x, y = to_lonlat(data.x, data.y, resolve_crs(data.crs))
+    params = KDEParams(
+        x=x,
+        y=y,
+        weights=data.weights,
+        bandwidth=data.bandwidth,
+        gridsize=data.gridsize,
+        cmap=data.cmap,
+        alpha=data.alpha,
+        cmin=data.cmin,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
+    )
+
+    return await handle_plot_request("plot_kde", params, request=request)
+
+
+# 六角形分箱圖端點
+@app.post("/hexbin", summary="建立六角形分箱圖")
+async def create_hexbin(data: HexbinData, request: Request):
+    """
+    根據提供的座標建立六角形分箱圖，各格依點數（或權重總和）著色
+
+    - **x**: X座標列表
+    - **y**: Y座標列表
+    - **weights**: 各點的權重，默認每點為1
+    - **cellsize**: 六角形的寬（對邊距離，公尺），默認為5000
+    - **cmap**: 顏色映射，默認為'GnBu'
+    - **alpha**: 透明度，默認為0.8
+    - **cmin**: 點數（或權重總和）低於此值的格不著色，默認為1
+    - **colorbar_format**: 顏色條格式，默認為'{x:,.0f}'
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
+    """
+    # 格太小時格網過大（台灣本島500公尺約70萬格）
+    if not 500 <= data.cellsize <= Lookup.MAX_RADIUS:
+        raise HTTPException(
+            status_code=400, detail=f"cellsize必須介於500到{Lookup.MAX_RADIUS:g}"
+        )
+    if data.weights is not None and len(data.weights) != len(data.x):
+        raise HTTPException(status_code=400, detail="weights與座標的長度不同")
+    x, y = to_lonlat(data.x, data.y, resolve_crs(data.crs))
+    params = HexbinParams(
+        x=x,
+        y=y,
+        weights=data.weights,
+        cellsize=data.cellsize,
+        cmap=data.cmap,
+        alpha=data.alpha,
+        cmin=data.cmin,
+        colorbar_format=data.colorbar_format,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
+    )
+
+    return await handle_plot_request("plot_hexbin", params, request=request)
 
 
 # 氣泡圖端點
 @app.post("/bubble", summary="建立氣泡圖")
-async def create_bubble(data: BubbleData):
+async def create_bubble(data: BubbleData, request: Request):
     """
     根據提供的座標建立氣泡圖
 
@@ -251,26 +737,142 @@ async def create_bubble(data: BubbleData):
     - **size**: 氣泡大小，默認為10
     - **color**: 氣泡顏色，默認為'red'
     - **alpha**: 透明度，默認為0.5
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    - **projection**: 繪圖的投影座標系統（如EPSG:3826），默認以經緯度繪圖
+    - **region**: 只繪製此縣市（如臺北市）或鄉鎮（如臺北市中正區），默認為全國
     """
     # 使用新的BubbleParams物件
+    x, y = to_lonlat(data.x, data.y, resolve_crs(data.crs))
     params = BubbleParams(
-        x=data.x, y=data.y, size=data.size, color=data.color, alpha=data.alpha
+        x=x,
+        y=y,
+        size=data.size,
+        color=data.color,
+        alpha=data.alpha,
+        vintage=resolve_vintage(data.vintage),
+        projection=resolve_projection(data.projection),
+        region=await resolve_region(data.region, data.vintage),
+    )
+
+    return await handle_plot_request("plot_bubble", params, request=request)
+
+
+# 座標查詢端點
+# 查詢在主行程的執行緒中進行（shapely運算時會釋放GIL），結果直接以JSONResponse
+# 輸出，略過jsonable_encoder對大型列表的逐筆轉換
+@app.post("/lookup/town", summary="座標所在的縣市鄉鎮")
+async def lookup_town(
+    request: Request, crs: Optional[str] = None, vintage: Optional[str] = None
+):
+    """
+    查詢每個座標所在的鄉鎮
+
+    - **內容**: JSON物件{"x": [...], "y": [...]}（經緯度），或Content-Type為
+      application/octet-stream的float64 (x, y)交錯陣列
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+
+    返回出現的鄉鎮表`towns`，以及每個座標在表中的位置`index`（不在任何鄉鎮為-1）
+    """
+    vintage = resolve_vintage(vintage)
+    x, y = await read_points(request, resolve_crs(crs))
+    index = await asyncio.to_thread(town_index, vintage)
+    towns, rows = index.towns(await asyncio.to_thread(index.locate, x, y))
+    return JSONResponse({"vintage": vintage, "towns": towns, "index": rows.tolist()})
+
+
+@app.post("/lookup/nearest", summary="距離座標最近的鄉鎮")
+async def lookup_nearest(
+    request: Request,
+    max_distance: Optional[float] = None,
+    crs: Optional[str] = None,
+    vintage: Optional[str] = None,
+):
+    """
+    查詢距離每個座標最近的鄉鎮與距離（公尺），座標在鄉鎮內時距離為0
+
+    - **內容**: 同/lookup/town
+    - **max_distance**: 搜尋的最大距離（公尺），超過時`index`為-1、`distance`為null
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+    """
+    if max_distance is not None and max_distance <= 0:
+        raise HTTPException(status_code=400, detail="max_distance必須大於0")
+    vintage = resolve_vintage(vintage)
+    x, y = await read_points(request, resolve_crs(crs))
+    index = await asyncio.to_thread(town_index, vintage)
+    fids, distance = await asyncio.to_thread(index.nearest, x, y, max_distance)
+    towns, rows = index.towns(fids)
+    return JSONResponse(
+        {
+            "vintage": vintage,
+            "towns": towns,
+            "index": rows.tolist(),
+            "distance": nullable(distance, fids < 0),
+        }
     )
 
-    return handle_plot_request(graph_instance.plot_bubble, params)
+
+@app.post("/lookup/within", summary="座標半徑內的鄉鎮")
+async def lookup_within(
+    request: Request,
+    radius: float,
+    crs: Optional[str] = None,
+    vintage: Optional[str] = None,
+):
+    """
+    查詢每個座標半徑內的所有鄉鎮
+
+    - **內容**: 同/lookup/town
+    - **radius**: 半徑（公尺）
+    - **crs**: 輸入座標的座標參考系統（如EPSG:3826），默認為EPSG:4326經緯度
+    - **vintage**: 邊界資料版本，默認為最新版本
+
+    返回依座標排序的配對：座標的位置`point`、鄉鎮表中的位置`index`與距離`distance`
+    """
+    if not 0 < radius <= Lookup.MAX_RADIUS:
+        raise HTTPException(
+            status_code=400, detail=f"radius必須大於0且不超過{Lookup.MAX_RADIUS:g}"
+        )
+    vintage = resolve_vintage(vintage)
+    x, y = await read_points(request, resolve_crs(crs))
+    index = await asyncio.to_thread(town_index, vintage)
+    point, fids, distance = await asyncio.to_thread(index.within, x, y, radius)
+    towns, rows = index.towns(fids)
+    return JSONResponse(
+        {
+            "vintage": vintage,
+            "towns": towns,
+            "point": point.tolist(),
+            "index": rows.tolist(),
+            "distance": np.round(distance, 2).tolist(),
+        }
+    )
 
 
 # 添加手動清理記憶體的端點（用於測試和維護）
 @app.post("/cleanup", summary="手動清理記憶體")
 async def manual_cleanup():
-    """手動觸發記憶體清理"""
-    graph_instance.cleanup_memory()
+    """手動觸發記憶體清理，有worker池時替換所有worker"""
+    if render_pool is not None:
+        render_pool.recycle_all()
+        return {"message": "已開始替換所有繪圖worker"}
+    plt.close("all")
     gc.collect()
-    global request_counter
-    request_counter = 0
     return {"message": "記憶體清理完成"}
 
 
+# worker狀態端點
+@app.get("/workers", summary="繪圖worker狀態")
+async def worker_stats():
+    """返回各繪圖worker的RSS、請求數與替換次數，以及合併與拒絕的繪圖請求數"""
+    stats = {"flights": render_flights.stats(), "admission": admission.stats()}
+    if render_pool is None:
+        return {"workers": [], **stats}
+    return {**render_pool.stats(), **stats}
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,213 @@
+"""
+繪圖請求的允入控制
+
+突發流量時，請求不再無限制地排在繪圖之後直到用戶端逾時：
+
+- 各繪圖方法有同時繪圖數的上限（Admission.LIMITS），超過時排隊等候
+- 某個方法排隊的請求數超過Admission.MAX_WAITING時，立即返回429
+- 排隊與繪圖中請求的估計成本總和超過Admission.MAX_COST時，立即返回503
+- 請求在期限內未開始繪圖時返回503；排隊中被取消（用戶端中斷連線）的請求
+  直接移出佇列，不會開始繪圖
+
+拒絕時附上Retry-After，依該方法最近的繪圖時間與排隊數估計。
+"""
+
+import asyncio
+import math
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, Dict
+
+from src.config import Admission, FigConfig
+
+# 估計繪圖時間的指數移動平均權重
+SMOOTHING = 0.2
+
+
+class Rejected(Exception):
+    """請求超過容量或逾時，status為HTTP狀態碼"""
+
+    def __init__(self, status: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def estimate_cost(method: str, *args) -> float:
+    """
+    Estimate the cost of a render, in units of one county map.
+
+    Town-level choropleths draw about 370 polygons instead of 22; point
+    layers scale with the number of points, 2D histograms with the number
+    of bins, and density heatmaps with their grid size.
+    """
+    cost = 1.0
+    for params in args:
+        if getattr(params, "level", None) == "town":
+            cost += 1.0
+        x = getattr(params, "x", None)
+        if x is not None:
+            cost += len(x) / 100_000
+        bins = getattr(params, "bins", None)
+        if bins is not None:
+            cost += bins * bins / 100_000
+        gridsize = getattr(params, "gridsize", None)
+        if gridsize is not None:
+            # 各子圖一次FFT，格數為gridsize的平方（加上外擴區）
+            cost += len(FigConfig.AREA_RANGE) * gridsize * gridsize / 1_000_000
+    return cost
+
+
+class AdmissionControl:
+    """
+    Bounded render queue with per-method concurrency limits.
+
+    Parameters
+    ----------
+    limits : dict
+        Concurrent renders per method; others get ``default_limit``.
+    default_limit : int
+        Concurrent renders of a method not in ``limits``.
+    max_waiting : int
+        Requests that may wait per method.
+    max_cost : float
+        Total estimated cost of waiting and running requests. A request
+        costing more than that on its own is still admitted when nothing
+        else is waiting or running.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int] = Admission.LIMITS,
+        default_limit: int = Admission.DEFAULT_LIMIT,
+        max_waiting: int = Admission.MAX_WAITING,
+        max_cost: float = Admission.MAX_COST,
+    ):
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self.max_waiting = max_waiting
+        self.max_cost = max_cost
+        self.cost = 0.0
+        self.running: Dict[str, int] = defaultdict(int)
+        self._queues: Dict[str, deque] = defaultdict(deque)
+        # 各方法的估計繪圖時間（秒）
+        self.duration: Dict[str, float] = defaultdict(lambda: 1.0)
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+
+    def limit(self, method: str) -> int:
+        return self.limits.get(method, self.default_limit)
+
+    def retry_after(self, method: str) -> int:
+        """排隊的請求全部完成所需的估計秒數"""
+        waiting = len(self._queues[method]) + 1
+        seconds = self.duration[method] * waiting / self.limit(method)
+        return min(60, max(1, math.ceil(seconds)))
+
+    def _admit(self, method: str, cost: float):
+        if len(self._queues[method]) >= self.max_waiting:
+            self.rejected += 1
+            raise Rejected(429, "此類繪圖請求過多，請稍後再試", self.retry_after(method))
+        if self.cost > 0 and self.cost + cost > self.max_cost:
+            self.rejected += 1
+            raise Rejected(503, "繪圖服務忙碌中，請稍後再試", self.retry_after(method))
+
+    async def _acquire(self, method: str, timeout: float):
+        queue = self._queues[method]
+        if not queue and self.running[method] < self.limit(method):
+            self.running[method] += 1
+            return
+        slot = asyncio.get_running_loop().create_future()
+        queue.append(slot)
+        try:
+            await asyncio.wait_for(slot, max(0.0, timeout))
+        except BaseException:
+            if slot.done() and not slot.cancelled():
+                # 已取得名額，交給下一個等候者
+                self._release(method)
+            elif slot in queue:
+                # 同一輪中_release可能已取出這個已取消的名額
+                queue.remove(slot)
+            raise
+
+    def _release(self, method: str):
+        self.running[method] -= 1
+        queue = self._queues[method]
+        while queue:
+            slot = queue.popleft()
+            if not slot.done():
+                self.running[method] += 1
+                slot.set_result(None)
+                break
+
+    async def run(
+        self, method: str, cost: float, deadline: float, call: Callable[[], Awaitable]
+    ):
+        """
+        Run ``call()`` once ``method`` has a free slot.
+
+        Once started, a render is not cancelled; cancelling the caller
+        while the render runs only stops waiting for it.
+
+        Parameters
+        ----------
+        deadline : float
+            The event loop time by which the render must have started.
+
+        Raises
+        ------
+        Rejected
+            If the request is over capacity or its deadline passes while
+            it waits.
+        """
+        loop = asyncio.get_running_loop()
+        self._admit(method, cost)
+        self.cost += cost
+        acquired = False
+        try:
+            await self._acquire(method, deadline - loop.time())
+            acquired = True
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise Rejected(503, "等候繪圖逾時，請稍後再試", self.retry_after(method))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            # 未取得名額時（不論原因）歸還成本，取得後由release歸還
+            if not acquired:
+                self.cost -= cost
+
+        started = loop.time()
+        task = asyncio.ensure_future(call())
+
+        def release(task: asyncio.Future):
+            if not task.cancelled():
+                task.exception()  # 呼叫者已取消時，避免未取得的例外被記錄為錯誤
+            self.cost -= cost
+            self._release(method)
+            elapsed = loop.time() - started
+            self.duration[method] += SMOOTHING * (elapsed - self.duration[method])
+
+        task.add_done_callback(release)
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        methods = sorted(set(self.running) | set(self._queues))
+        return {
+            "cost": round(self.cost, 2),
+            "max_cost": self.max_cost,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "methods": {
+                m: {
+                    "running": self.running[m],
+                    "waiting": len(self._queues[m]),
+                    "limit": self.limit(m),
+                    "duration": round(self.duration[m], 2),
+                }
+                for m in methods
+            },
+        }
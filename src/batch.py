@@ -0,0 +1,295 @@
+"""
+離線批次繪圖
+
+依清單（manifest）一次繪製大量地圖，不經過API服務：
+
+    python -m src.batch maps.json output/ [--workers 4] [--force]
+
+清單為JSON或YAML，資料檔的路徑相對於清單所在的目錄：
+
+    {
+        "defaults": {"vintage": "1120825", "cmap": "GnBu"},
+        "maps": [
+            {"name": "population", "type": "choropleth", "data": "pop.csv",
+             "column": "value", "level": "town", "scheme": "quantile"},
+            {"name": "stations", "type": "dot", "data": "stations.parquet",
+             "x": "lon", "y": "lat", "size": 5},
+            {"name": "accidents", "type": "hist2d", "data": "accidents.csv",
+             "x": "E", "y": "N", "crs": "EPSG:3826", "bins": 200}
+        ]
+    }
+
+- type: choropleth、dot或hist2d，其餘欄位為ChoroplethParams、DotParams或
+  Hist2DParams的欄位
+- data: CSV或Parquet；分層設色圖的資料需有county（及town）欄位，點資料以
+  x、y指定座標的欄位名稱（預設為x、y），crs為座標的座標參考系統
+
+繪圖使用與API服務相同的worker池，幾何資料放在共享記憶體中只載入一次。
+每張地圖的輸出為<輸出目錄>/<name>.png；清單項目、資料版本與資料檔內容
+都未變更的地圖不會重新繪製（記錄於輸出目錄中的STATE_FILE）。
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import yaml
+from src import dataset
+from src.config import Worker
+from src.graph import ChoroplethParams, DotParams, Hist2DParams
+from src.projection import parse, parse_projected, to_lonlat
+
+# 記錄各地圖輸入指紋的檔案，位於輸出目錄中
+STATE_FILE = ".batch-state.json"
+
+# 清單的type對應的繪圖方法與參數物件
+MAP_TYPES = {
+    "choropleth": ("plot_choropleth", ChoroplethParams),
+    "dot": ("plot_dot", DotParams),
+    "hist2d": ("plot_hist2d", Hist2DParams),
+}
+
+# 清單項目中不屬於參數物件的欄位
+_ENTRY_KEYS = {"name", "type", "data", "x", "y", "crs"}
+
+
+def load_manifest(path: Path) -> List[dict]:
+    """
+    Read a manifest and apply its defaults to every map.
+
+    Raises
+    ------
+    ValueError
+        If a map has no name or type, a name is repeated, or a type is not
+        supported.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = yaml.safe_load(f) if path.suffix in (".yaml", ".yml") else json.load(f)
+    defaults = manifest.get("defaults", {})
+    entries = []
+    for entry in manifest.get("maps", []):
+        if "name" not in entry or "type" not in entry:
+            raise ValueError(f"清單項目缺少name或type: {entry}")
+        if entry["type"] not in MAP_TYPES:
+            raise ValueError(f"{entry['name']}: 不支援的地圖類型: {entry['type']}")
+        if any(entry["name"] == e["name"] for e in entries):
+            raise ValueError(f"地圖名稱重複: {entry['name']}")
+        # 預設值只套用到有該欄位的地圖類型（如cmap不套用到點圖）
+        params_class = MAP_TYPES[entry["type"]][1]
+        accepted = _ENTRY_KEYS | {f.name for f in dataclasses.fields(params_class)}
+        entries.append({**{k: v for k, v in defaults.items() if k in accepted}, **entry})
+    return entries
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    """讀取CSV或Parquet資料檔（Parquet需安裝pyarrow或fastparquet）"""
+    if path.suffix == ".csv":
+        return pd.read_csv(path)
+    if path.suffix in (".parquet", ".pq"):
+        return pd.read_parquet(path)
+    raise ValueError(f"不支援的資料檔格式: {path}")
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def fingerprint(entry: dict, base_dir: Path) -> str:
+    """清單項目、實際的資料版本與資料檔內容的雜湊"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(entry, sort_keys=True, ensure_ascii=False, default=str).encode())
+    h.update(dataset.resolve(entry.get("vintage")).encode())
+    if "data" in entry:
+        h.update(file_digest(base_dir / entry["data"]).encode())
+    return h.hexdigest()
+
+
+def build_params(entry: dict, base_dir: Path) -> tuple:
+    """
+    Build the plot method and parameter object of a manifest entry.
+
+    Raises
+    ------
+    ValueError
+        If the entry has fields its parameter object does not, or its
+        vintage or CRS is invalid.
+    """
+    method, params_class = MAP_TYPES[entry["type"]]
+    fields = {f.name for f in dataclasses.fields(params_class)}
+    options = {k: v for k, v in entry.items() if k not in _ENTRY_KEYS}
+    unknown = set(options) - fields
+    if unknown:
+        raise ValueError(f"{entry['type']}不支援的欄位: {', '.join(sorted(unknown))}")
+    options["vintage"] = dataset.resolve(options.get("vintage"))
+    if options.get("projection") is not None:
+        options["projection"] = parse_projected(options["projection"])
+
+    data = read_table(base_dir / entry["data"])
+    if entry["type"] == "choropleth":
+        return method, params_class(data=data, **options)
+    crs = parse(entry["crs"]) if entry.get("crs") else None
+    x, y = to_lonlat(data[entry.get("x", "x")], data[entry.get("y", "y")], crs)
+    return method, params_class(x=x, y=y, **options)
+
+
+def load_state(output_dir: Path) -> Dict[str, str]:
+    path = output_dir / STATE_FILE
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(output_dir: Path, state: Dict[str, str]):
+    # 先寫入暫存檔再改名，中斷時不會留下寫到一半的紀錄
+    tmp = output_dir / f"{STATE_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    tmp.replace(output_dir / STATE_FILE)
+
+
+class LocalRenderer:
+    """workers為0時在本行程內依序繪圖"""
+
+    def __init__(self):
+        from src.graph import Graph
+
+        self.graph = Graph()
+        self.graph.warm_up()
+        self.size = 1
+
+    async def render(self, method: str, *args) -> bytes:
+        from src.graph import fig_to_image
+
+        fig, _ = getattr(self.graph, method)(*args)
+        return fig_to_image(fig).getvalue()
+
+    async def shutdown(self):
+        pass
+
+
+async def run(
+    manifest: Path, output_dir: Path, workers: int, force: bool = False
+) -> dict:
+    """
+    Render every map of a manifest whose inputs changed since the last run.
+
+    Returns
+    -------
+    dict
+        The names of the maps rendered, skipped and failed (with the error),
+        the bytes written and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    entries = load_manifest(manifest)
+    base_dir = manifest.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state = load_state(output_dir)
+
+    summary = {"rendered": [], "skipped": [], "failed": {}, "bytes": 0}
+    todo = []
+    for entry in entries:
+        name = entry["name"]
+        try:
+            key = fingerprint(entry, base_dir)
+        except (OSError, ValueError) as e:
+            summary["failed"][name] = str(e)
+            continue
+        if not force and state.get(name) == key and (output_dir / f"{name}.png").exists():
+            summary["skipped"].append(name)
+        else:
+            todo.append((entry, key))
+
+    if todo:
+        renderer, shared_store = await _start(workers)
+        # 資料檔在主行程讀取，同時送出的地圖數限制為worker數的兩倍
+        limit = asyncio.Semaphore(renderer.size * 2)
+
+        async def render(entry: dict, key: str):
+            name = entry["name"]
+            async with limit:
+                try:
+                    method, params = await asyncio.to_thread(build_params, entry, base_dir)
+                    img = await renderer.render(method, params)
+                except Exception as e:
+                    summary["failed"][name] = f"{type(e).__name__}: {e}"
+                    return
+            (output_dir / f"{name}.png").write_bytes(img)
+            state[name] = key
+            summary["rendered"].append(name)
+            summary["bytes"] += len(img)
+            print(f"  {name}.png ({len(img) / 1024:,.0f} KB)", flush=True)
+
+        try:
+            await asyncio.gather(*(render(entry, key) for entry, key in todo))
+        finally:
+            save_state(output_dir, state)
+            await renderer.shutdown()
+            if shared_store is not None:
+                shared_store.close()
+
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+async def _start(workers: int) -> tuple:
+    """啟動worker池（幾何資料放在共享記憶體中），workers為0時在本行程內繪圖"""
+    if workers <= 0:
+        return LocalRenderer(), None
+    from src.store import GeometryStore
+    from src.worker import create_pool
+
+    pool = create_pool(workers, Worker.MAX_RSS_MB, Worker.MAX_REQUESTS)
+    shared_store, pool.manifest = GeometryStore.create(dataset.latest())
+    await pool.start()
+    return pool, shared_store
+
+
+def print_summary(summary: dict):
+    rendered = len(summary["rendered"])
+    seconds = summary["seconds"]
+    print(
+        f"已繪製 {rendered} 張、略過 {len(summary['skipped'])} 張（輸入未變更）、"
+        f"失敗 {len(summary['failed'])} 張，共 {seconds:.1f} 秒"
+    )
+    if rendered:
+        print(
+            f"平均 {rendered / seconds:.2f} 張/秒，"
+            f"輸出 {summary['bytes'] / 1024 / 1024:,.1f} MB"
+        )
+    for name, error in summary["failed"].items():
+        print(f"  失敗 {name}: {error}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="GIS Toolkit 離線批次繪圖")
+    parser.add_argument("manifest", type=Path, help="清單檔（JSON或YAML）")
+    parser.add_argument("output", type=Path, help="輸出目錄")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="繪圖worker數，0為在本行程內繪圖（預設: CPU數）",
+    )
+    parser.add_argument("--force", action="store_true", help="忽略紀錄，全部重新繪製")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run(args.manifest, args.output, args.workers, args.force))
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import json
+import logging
+import random
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+PLOT_PATHS = {
+    "/boundary",
+    "/subsidy_boundary",
+    "/choropleth",
+    "/choropleth/points",
+    "/dot",
+    "/hist2d",
+    "/kde",
+    "/hexbin",
+    "/bubble",
+}
+
+REDACTED = "***"
+
+
+def _mask(value):
+    """與原值型別、形狀相同的遮蔽值：字串為REDACTED，數值為0，串列逐項遮蔽"""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return type(value)(0)
+    if isinstance(value, str):
+        return REDACTED
+    if isinstance(value, list):
+        return [_mask(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _mask(v) for k, v in value.items()}
+    return value
+
+
+def redact(value, fields: Iterable[str]):
+    """
+    Mask the values of fields named in ``fields``, at any depth.
+
+    A masked value keeps the type and shape of the original (see
+    ``_mask``), so the request still validates when replayed.
+    """
+    fields = set(fields)
+    if not fields:
+        return value
+    if isinstance(value, dict):
+        return {
+            k: _mask(v) if k in fields else redact(v, fields) for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(v, fields) for v in value]
+    return value
+
+
+def _has_field(value, fields: set) -> bool:
+    if isinstance(value, dict):
+        return any(k in fields or _has_field(v, fields) for k, v in value.items())
+    if isinstance(value, list):
+        return any(_has_field(v, fields) for v in value)
+    return False
+
+
+class TrafficCapture:
+    """
+    ASGI middleware, sampling plot requests into rotating JSONL files.
+
+    Each line records the endpoint, query string, JSON body, status,
+    server-side duration and response size, so the file can be fed back
+    through ``test/replay.py``. ``redacted`` marks records whose body had
+    fields masked; they no longer reproduce the original request.
+    """
+
+    def __init__(
+        self,
+        app,
+        directory: str,
+        sample_rate: float = 1.0,
+        max_bytes: int = 50 * 1024 * 1024,
+        backup_count: int = 10,
+        redact_fields: Optional[List[str]] = None,
+        paths: Iterable[str] = PLOT_PATHS,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.redact_fields = redact_fields or []
+        self.paths = set(paths)
+
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            Path(directory) / "capture.jsonl",
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger = logging.getLogger(f"{__name__}.{directory}")
+        self.logger.handlers = [handler]
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in self.paths
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        body = bytearray()
+        response = {"status": None, "bytes": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self._write(scope, bytes(body), response, time.perf_counter() - start)
+
+    def _write(self, scope, body: bytes, response: dict, duration: float):
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = None
+        fields = set(self.redact_fields)
+        record = {
+            "ts": time.time() - duration,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "body": redact(payload, fields),
+            "redacted": _has_field(payload, fields),
+            "status": response["status"],
+            "duration": round(duration, 4),
+            "response_bytes": response["bytes"],
+        }
+        self.logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,181 @@
+"""
+分層設色圖的分級方式
+
+將數值分為k級，回傳包含最小值與最大值的k + 1個級距邊界：
+
+- quantile：分位數，各級的筆數相近
+- equal_interval：等距
+- std：以平均數為中心，每一個標準差一級
+- jenks：Fisher-Jenks自然斷點，使各級內的離差平方和最小
+
+相同的數值欄位常被重複繪製，級距依數值內容的雜湊快取，重複請求不必重算。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+SCHEMES = ("quantile", "equal_interval", "std", "jenks")
+
+# 快取的級距組數
+CACHE_SIZE = 256
+
+# Fisher-Jenks每次計算的成本矩陣最多BLOCK個元素，限制大量數值時的記憶體用量
+BLOCK = 1 << 22
+# 數值超過JENKS_SAMPLE筆時，改以排序後等間隔取出的JENKS_SAMPLE筆計算
+JENKS_SAMPLE = 2000
+
+
+def quantile(values: np.ndarray, k: int) -> np.ndarray:
+    return np.quantile(values, np.linspace(0, 1, k + 1))
+
+
+def equal_interval(values: np.ndarray, k: int) -> np.ndarray:
+    return np.linspace(values.min(), values.max(), k + 1)
+
+
+def std(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Breaks one standard deviation apart, centred on the mean.
+
+    An odd ``k`` puts the mean in the middle of a class, an even ``k`` on
+    a break; the outer classes extend to the minimum and maximum.
+    """
+    mean, sd = values.mean(), values.std()
+    offsets = np.arange(1, k) - k / 2
+    inner = mean + offsets * sd
+    inner = inner[(inner > values.min()) & (inner < values.max())]
+    return np.concatenate([[values.min()], inner, [values.max()]])
+
+
+def jenks(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Fisher-Jenks natural breaks.
+
+    The dynamic program is the same as the classic one: ``cost[j, i]`` is
+    the least sum of squared deviations of the first ``i`` sorted values
+    in ``j`` classes. Within-class deviations come from prefix sums, and
+    each class count is one vectorized minimum over all (start, end)
+    pairs instead of two nested Python loops.
+
+    The cost is quadratic in the number of values, so more than
+    ``JENKS_SAMPLE`` values are thinned to evenly spaced order statistics
+    first (keeping the minimum and maximum). Town-level data is well below
+    that.
+
+    Interior breaks are the midpoints between the largest value of a
+    class and the smallest of the next, so a class holding only the
+    minimum or the maximum keeps a range of its own.
+    """
+    x = np.sort(values)
+    if len(x) > JENKS_SAMPLE:
+        x = x[np.linspace(0, len(x) - 1, JENKS_SAMPLE).round().astype(int)]
+    n = len(x)
+    k = min(k, n)
+    s1 = np.concatenate([[0.0], np.cumsum(x)])
+    s2 = np.concatenate([[0.0], np.cumsum(x * x)])
+
+    def ssd(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """x[start:end]的離差平方和，start < end"""
+        length = end - start
+        total = s1[end] - s1[start]
+        return s2[end] - s2[start] - total * total / length
+
+    ends = np.arange(1, n + 1)
+    cost = ssd(np.zeros(n, dtype=int), ends)
+    # split[j][i - 1]為前i個值分為j + 1級時，最後一級的起點
+    split = [np.zeros(n, dtype=int)]
+    for j in range(1, k):
+        new_cost = np.full(n, np.inf)
+        new_split = np.zeros(n, dtype=int)
+        step = max(1, BLOCK // n)
+        for lo in range(j, n, step):
+            end = ends[lo : lo + step]
+            # 最後一級為x[start:end]，start至少為j（前面j級各至少一個值）
+            start = np.arange(j, n)
+            valid = start[None, :] < end[:, None]
+            total = np.where(
+                valid,
+                cost[start - 1][None, :]
+                + ssd(start[None, :], np.maximum(end[:, None], start[None, :] + 1)),
+                np.inf,
+            )
+            best = np.argmin(total, axis=1)
+            new_cost[lo : lo + step] = total[np.arange(len(end)), best]
+            new_split[lo : lo + step] = start[best]
+        cost = new_cost
+        split.append(new_split)
+
+    # 由最後一級往前回溯各級的起點
+    starts = []
+    end = n
+    for j in range(k - 1, 0, -1):
+        end = split[j][end - 1]
+        starts.append(end)
+    starts = np.array(starts[::-1], dtype=int)
+    # 內部邊界取相鄰兩級之間（前一級的最大值與本級的最小值）的中點，
+    # 只有最小值或最大值的一級也保有自己的範圍
+    inner = (x[starts - 1] + x[starts]) / 2
+    return np.concatenate([[x[0]], inner, [x[-1]]])
+
+
+_SCHEMES = {
+    "quantile": quantile,
+    "equal_interval": equal_interval,
+    "std": std,
+    "jenks": jenks,
+}
+
+_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def breaks(values, scheme: str, k: int = 5) -> np.ndarray:
+    """
+    Class breaks of the values, memoized by a hash of their content.
+
+    Parameters
+    ----------
+    values : array-like
+        The values to classify; NaN is ignored.
+    scheme : str
+        One of ``SCHEMES``.
+    k : int
+        The number of classes.
+
+    Returns
+    -------
+    np.ndarray
+        The increasing, distinct class edges, from the minimum to the
+        maximum; fewer than ``k + 1`` if the values do not support that
+        many classes. A single edge if every value is the same.
+
+    Raises
+    ------
+    ValueError
+        If ``scheme`` is not supported, ``k`` is less than 1, or there is
+        no value to classify.
+    """
+    if scheme not in _SCHEMES:
+        raise ValueError(f"不支援的分級方式: {scheme}")
+    if k < 1:
+        raise ValueError(f"分級數必須至少為1: {k}")
+    values = np.asarray(values, dtype=np.float64).reshape(-1)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        raise ValueError("沒有可分級的數值")
+
+    key = (hashlib.blake2b(values.tobytes(), digest_size=16).digest(), scheme, k)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = np.unique(_SCHEMES[scheme](values, k))
+    result.setflags(write=False)
+    with _lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
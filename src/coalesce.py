@@ -0,0 +1,117 @@
+"""
+合併相同的進行中繪圖請求
+
+儀表板載入時常有許多用戶端同時送出相同的請求。以繪圖方法與參數的正規化
+雜湊為鍵，第一個請求實際繪圖，其餘相同的請求在繪圖完成前到達時等待同一個
+結果，不另外繪圖。
+
+合併在主行程的事件迴圈中進行，有worker池時每組相同的請求只會送到一個
+worker，因此也涵蓋跨行程的重複繪圖。
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+from typing import Awaitable, Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+
+def _update(h, value):
+    """將參數值依內容而非物件身分寫入雜湊"""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        h.update(f"<{type(value).__name__}>".encode())
+        for field in dataclasses.fields(value):
+            h.update(field.name.encode())
+            _update(h, getattr(value, field.name))
+    elif isinstance(value, pd.DataFrame):
+        h.update(f"<DataFrame {list(value.columns)!r}>".encode())
+        try:
+            h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        except TypeError:
+            # 欄位內含無法雜湊的值（如巢狀列表）
+            h.update(repr(value.to_dict("split")).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(f"<ndarray {value.dtype.str} {value.shape}>".encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, (list, tuple)):
+        h.update(f"<{type(value).__name__} {len(value)}>".encode())
+        for item in value:
+            _update(h, item)
+    elif isinstance(value, dict):
+        h.update(f"<dict {len(value)}>".encode())
+        for k in sorted(value, key=repr):
+            _update(h, k)
+            _update(h, value[k])
+    else:
+        h.update(f"<{type(value).__name__} {value!r}>".encode())
+
+
+def payload_key(method: str, *args) -> str:
+    """
+    Canonical hash of a render request.
+
+    Parameter objects are hashed field by field, so the key includes the
+    resolved vintage and projection; arrays and data frames by content.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(method.encode())
+    for arg in args:
+        _update(h, arg)
+    return h.hexdigest()
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; concurrent callers share it.
+
+    The call runs in its own task, so a caller that is cancelled (e.g. its
+    client disconnected) does not cancel the result the others await. The
+    call is cancelled only when every caller waiting for it is.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable]):
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = asyncio.ensure_future(call())
+            self._flights[key] = flight
+            self._waiters[key] = 0
+            flight.add_done_callback(lambda f: self._done(key, f))
+        else:
+            self.coalesced += 1
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(flight)
+        finally:
+            if self._flights.get(key) is flight:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not flight.done():
+                    # 已沒有人等待結果，之後相同的請求重新繪圖
+                    self._forget(key)
+                    flight.cancel()
+
+    def _forget(self, key: str):
+        self._flights.pop(key, None)
+        self._waiters.pop(key, None)
+
+    def _done(self, key: str, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            self._forget(key)
+        if not flight.cancelled():
+            # 所有等待者都已取消時，避免未取得的例外被記錄為錯誤
+            flight.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from matplotlib import font_manager
 
@@ -15,6 +16,9 @@ class Font:
     TimesNewRoman_Bold = FONT_DIR / "TimesNewRoman-Bold.ttf"
     Urbanist = FONT_DIR / "Urbanist-Regular.ttf"
 
+    # 建立快照時取出子集的字體，見src/fonts.py
+    SUBSET = (NotoSerifTC,)
+
     def register(self, font):
         font_manager.fontManager.addfont(font)
 
@@ -37,8 +41,38 @@ class Font:
 class Shapefile:
     SHAPEFILE_DIR = WORK_DIR / "res" / "shp"
 
-    COUNTY = SHAPEFILE_DIR / "COUNTY_MOI_1090820.shp"
-    TOWN = SHAPEFILE_DIR / "TOWN_MOI_1120825.shp"
+    # 鄉鎮界以發布日期命名（如TOWN_MOI_1120825.shp），每個檔案為一個資料版本，
+    # 縣市界由鄉鎮界合併而得，見src/dataset.py
+    TOWN_PATTERN = "TOWN_MOI_*.shp"
+
+
+class Snapshot:
+    """由res/shp與res/fonts預先建立的快照，見src/snapshot.py"""
+
+    DIR = WORK_DIR / "res" / "snapshot"
+    FONTS = DIR / "fonts.json"
+    # Font.SUBSET的子集字檔
+    FONT_SUBSETS = DIR / "fonts"
+    # 各資料版本的圖層快照位於DIR/<版本>/，META為其中的描述檔名稱
+    META = "meta.json"
+
+
+class Raster:
+    """分層設色圖的圖徵編號點陣，見src/raster.py；RASTER_FILL為0時改以多邊形填色"""
+
+    ENABLED = os.environ.get("RASTER_FILL", "1") != "0"
+    DIR = Snapshot.DIR / "raster"
+
+
+class Dataset:
+    """邊界資料版本設定，非預設版本在記憶體預算內依最近使用保留"""
+
+    MEMORY_MB = int(os.environ.get("DATASET_MEMORY_MB", "512"))
+    # 每個版本保留的投影圖層與單一區域圖層數，依最近使用淘汰（見src/store.py）
+    PROJECTED_CACHE = int(os.environ.get("PROJECTED_CACHE_SIZE", "4"))
+    REGION_CACHE = int(os.environ.get("REGION_CACHE_SIZE", "16"))
+    # 檢查res/shp是否有新版本的最短間隔（秒），見src/dataset.py
+    RELOAD_INTERVAL = float(os.environ.get("DATASET_RELOAD_INTERVAL", "2"))
 
 
 class Json:
@@ -47,14 +81,95 @@ class Json:
     COUNTY_TOWN = JSON_DIR / "county_town.json"
     TOWN_TYPE_BY_TOWN = JSON_DIR / "town_type_by_town.json"
     TOWN_TYPE_BY_TYPE = JSON_DIR / "town_type_by_type.json"
+    TOWN_TYPE_SP6 = JSON_DIR / "town_type_sp6.json"
     NO_GAS_STATION_TOWN = JSON_DIR / "no_gas_station_town.json"
 
+    # 檢查分類檔是否更新的最短間隔（秒），見src/reference.py
+    RELOAD_INTERVAL = float(os.environ.get("REFERENCE_RELOAD_INTERVAL", "2"))
+
+
+class Lookup:
+    """座標查詢設定，見src/lookup.py"""
+
+    # 計算距離時使用的投影座標系（TWD97 TM2，公尺）
+    METRIC_CRS = "EPSG:3826"
+    # 計算距離時將鄉鎮邊界切成最多CHUNK_SIZE段的折線
+    CHUNK_SIZE = 32
+    # 單次查詢的座標數上限
+    MAX_POINTS = int(os.environ.get("LOOKUP_MAX_POINTS", "5000000"))
+    # 半徑查詢的半徑上限（公尺）
+    MAX_RADIUS = float(os.environ.get("LOOKUP_MAX_RADIUS", "50000"))
+
+
+class Capture:
+    """流量錄製設定，CAPTURE_DIR未設定時不錄製"""
+
+    DIR = os.environ.get("CAPTURE_DIR")
+    SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", "1.0"))
+    MAX_BYTES = int(os.environ.get("CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+    BACKUP_COUNT = int(os.environ.get("CAPTURE_BACKUP_COUNT", "10"))
+    REDACT = [f for f in os.environ.get("CAPTURE_REDACT", "").split(",") if f]
+
+
+class Worker:
+    """繪圖worker設定，RENDER_WORKERS為0時在主行程內繪圖"""
+
+    COUNT = int(os.environ.get("RENDER_WORKERS", "2"))
+    MAX_RSS_MB = int(os.environ.get("RENDER_WORKER_MAX_RSS_MB", "1024"))
+    MAX_REQUESTS = int(os.environ.get("RENDER_WORKER_MAX_REQUESTS", "1000"))
+
+
+class Admission:
+    """繪圖請求的允入控制，見src/admission.py"""
+
+    # 各繪圖方法同時繪圖的上限，未列於RENDER_LIMITS（如"plot_hist2d=1,plot_dot=4"）
+    # 的方法為worker數
+    DEFAULT_LIMIT = max(1, Worker.COUNT)
+    LIMITS = {
+        method: int(limit)
+        for method, limit in (
+            item.split("=") for item in os.environ.get("RENDER_LIMITS", "").split(",") if item
+        )
+    }
+    # 各繪圖方法排隊等候的請求數上限，超過時返回429
+    MAX_WAITING = int(os.environ.get("RENDER_MAX_WAITING", "32"))
+    # 排隊與繪圖中請求的估計成本總和上限（一張縣市地圖約為1），超過時返回503
+    MAX_COST = float(os.environ.get("RENDER_MAX_COST", "64"))
+    # 請求的期限（秒），期限內未開始繪圖時返回503
+    TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", "30"))
+
+
+def png_threads(processes: int) -> int:
+    """同時繪圖的行程數為processes時，每個行程壓縮PNG的執行緒數（最多4）"""
+    return min(4, max(1, (os.cpu_count() or 1) // max(1, processes)))
+
+
+class Png:
+    """輸出PNG的編碼設定，見src/png.py"""
+
+    # 分段平行壓縮的執行緒數，為1時使用matplotlib的PNG輸出。未指定時將CPU
+    # 平分給同時繪圖的行程：worker池依池的大小設定各worker的值（見
+    # src/worker.py，含python -m src.batch --workers），多個uvicorn worker時
+    # 請自行設定
+    THREADS = int(os.environ.get("PNG_THREADS", str(png_threads(Worker.COUNT))))
+    # zlib壓縮等級
+    LEVEL = int(os.environ.get("PNG_LEVEL", "6"))
+
+
+class Templates:
+    """可重複使用的底圖figure，見src/template.py"""
+
+    # 各行程保留的閒置底圖數上限，為0時每個請求重新建立底圖
+    SIZE = int(os.environ.get("TEMPLATE_POOL_SIZE", "8"))
+
 
 class FigConfig:
     WIDTH = 14.65
     HEIGHT = 16
     DPI = 200
     SIZE = (WIDTH, HEIGHT)
+    # 輸出PNG的DPI
+    SAVE_DPI = 300
 
     AREA_RANGE = {
         "taiwan": {
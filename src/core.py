@@ -1,9 +1,16 @@
+from typing import Optional
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+from shapely.geometry import box
 import matplotlib
 matplotlib.use('Agg')  # 使用非互動式backend
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from src import projection as proj
 from src.config import FigConfig, Shapefile
+from src.store import REGION, GeometryStore, LayerView, get_store
 
 
 class GeoPlot:
@@ -11,69 +18,132 @@ class GeoPlot:
         self.fig_config = FigConfig()
         self.area_list = [area for area in enumerate(self.fig_config.AREA_RANGE)]
 
-    def base(self) -> tuple[plt.Figure, plt.Axes]:
+    def base(self, projection: Optional[str] = None) -> tuple[plt.Figure, plt.Axes]:
         """
         Create the base figure and axes for the plot.
 
+        Parameters
+        ----------
+        projection : str, optional
+            A projected CRS to render in. The insets then cover their
+            bounds reprojected to it, with an equal aspect ratio; the
+            default is longitude/latitude.
+
         Returns
         -------
         tuple[plt.Figure, plt.Axes]
             The figure and axes of the plot.
         """
-        fig, ax = plt.subplots(figsize=self.fig_config.SIZE, dpi=self.fig_config.DPI)
+        fig, ax = self._figure(self.fig_config.SIZE)
         ax.set_axis_off()
         ax.set_xticks([])
         ax.set_yticks([])
         ax.set_xlim(118.93, 122.7)
         ax.set_ylim(21.5, 25.5)
 
-        area_range = self.fig_config.AREA_RANGE
+        area_range = proj.area_bounds(projection)
+
+        def inset(bounds: tuple, label: str, frame_on: bool = True) -> plt.Axes:
+            return self._inset(ax, bounds, label, area_range[label], projection, frame_on)
 
         # taiwan
-        self._inset(ax, bounds=(0, 0, 1, 1), label="taiwan", frame_on=False)
+        inset(bounds=(0, 0, 1, 1), label="taiwan", frame_on=False)
 
         x0, x1 = 0.02, 0.19
         w0, w1 = 0.21, 0.06
         y = 0.35
         # penghu
-        h = self._cal_insert_ax_height(area_range["penghu"]["bounds"], w0)
-        self._inset(ax, bounds=(x0, y, w0, h), label="penghu")
+        h = self._cal_insert_ax_height(area_range["penghu"], w0)
+        inset(bounds=(x0, y, w0, h), label="penghu")
 
         # kinmen
         y = y + h + 0.01
-        h = self._cal_insert_ax_height(area_range["kinmen"]["bounds"], w0)
-        self._inset(ax, bounds=(x0, y, w0, h), label="kinmen")
+        h = self._cal_insert_ax_height(area_range["kinmen"], w0)
+        inset(bounds=(x0, y, w0, h), label="kinmen")
 
         # kinmen-wuqiu
-        _h = self._cal_insert_ax_height(area_range["kinmen-wuqiu"]["bounds"], w1)
-        self._inset(ax, bounds=(x1, y + _h - 0.02, w1, _h), label="kinmen-wuqiu")
+        _h = self._cal_insert_ax_height(area_range["kinmen-wuqiu"], w1)
+        inset(bounds=(x1, y + _h - 0.02, w1, _h), label="kinmen-wuqiu")
 
         # lienchiang
         y = y + h + 0.01
-        h = self._cal_insert_ax_height(area_range["lienchiang"]["bounds"], w0)
-        self._inset(ax, bounds=(x0, y, w0, h), label="lienchiang")
+        h = self._cal_insert_ax_height(area_range["lienchiang"], w0)
+        inset(bounds=(x0, y, w0, h), label="lienchiang")
 
         # lienchiang-dongyin
-        _h = self._cal_insert_ax_height(area_range["lienchiang-dongyin"]["bounds"], w1)
-        self._inset(ax, bounds=(x1, y + _h - 0.03, w1, _h), label="lienchiang-dongyin")
+        _h = self._cal_insert_ax_height(area_range["lienchiang-dongyin"], w1)
+        inset(bounds=(x1, y + _h - 0.03, w1, _h), label="lienchiang-dongyin")
 
         # lienchiang-juguang
-        _h = self._cal_insert_ax_height(area_range["lienchiang-juguang"]["bounds"], w1)
-        self._inset(ax, bounds=(x1, y + _h + 0.05, w1, _h), label="lienchiang-juguang")
+        _h = self._cal_insert_ax_height(area_range["lienchiang-juguang"], w1)
+        inset(bounds=(x1, y + _h + 0.05, w1, _h), label="lienchiang-juguang")
 
         return fig, ax
 
+    def region_base(
+        self, bounds: dict, projection: Optional[str] = None
+    ) -> tuple[plt.Figure, plt.Axes]:
+        """
+        Create the figure and axes of a single-region map.
+
+        The one inset, labelled ``REGION``, fills the axes; the figure takes
+        the aspect ratio of the region and about the pixel count of the
+        whole-country layout.
+
+        Parameters
+        ----------
+        bounds : dict
+            The extent of the region (see ``GeometryStore.region_bounds``).
+        projection : str, optional
+            A projected CRS to render in. Defaults to longitude/latitude.
+        """
+        ratio = (bounds["max_y"] - bounds["min_y"]) / (bounds["max_x"] - bounds["min_x"])
+        if projection is None:
+            center_y = (bounds["min_y"] + bounds["max_y"]) / 2
+            ratio /= np.cos(center_y * np.pi / 180)
+        # 過於狹長的區域留白，不讓圖片變得極窄或極扁
+        ratio = min(max(ratio, 0.25), 4.0)
+        width, height = self.fig_config.SIZE
+        width = np.sqrt(width * height / ratio)
+
+        fig, ax = self._figure((width, width * ratio))
+        ax.set_axis_off()
+        ax.set_xticks([])
+        ax.set_yticks([])
+        self._inset(ax, (0, 0, 1, 1), REGION, bounds, projection, frame_on=False)
+        return fig, ax
+
+    def _figure(self, figsize: tuple) -> tuple[plt.Figure, plt.Axes]:
+        """
+        不經過pyplot建立figure，plt.close("all")不會關閉可重複使用的底圖
+        （見src/template.py）
+        """
+        fig = Figure(figsize=figsize, dpi=self.fig_config.DPI)
+        FigureCanvasAgg(fig)
+        return fig, fig.subplots()
+
     def _inset(
-        self, ax: plt.Axes, bounds: tuple, label: str, frame_on: bool = True
+        self,
+        ax: plt.Axes,
+        bounds: tuple,
+        label: str,
+        area_bounds: dict,
+        projection: Optional[str] = None,
+        frame_on: bool = True,
     ) -> plt.Axes:
         ax_in = ax.inset_axes(bounds, label=label)
         ax_in.set_xticks([])
         ax_in.set_yticks([])
         ax_in.set_frame_on(frame_on)
 
-        area_info = self.fig_config.AREA_RANGE[label]
-        ax_in.set_xlim(area_info["bounds"]["min_x"], area_info["bounds"]["max_x"])
-        ax_in.set_ylim(area_info["bounds"]["min_y"], area_info["bounds"]["max_y"])
+        ax_in.set_xlim(area_bounds["min_x"], area_bounds["max_x"])
+        ax_in.set_ylim(area_bounds["min_y"], area_bounds["max_y"])
+        if projection is None:
+            # 經緯度座標的長寬比，與geopandas繪製未投影資料時相同
+            center_y = (area_bounds["min_y"] + area_bounds["max_y"]) / 2
+            ax_in.set_aspect(1 / np.cos(center_y * np.pi / 180))
+        else:
+            ax_in.set_aspect("equal")
 
         return ax_in
 
@@ -94,29 +164,97 @@ class GeoData:
         self.fig_config = FigConfig()
         self.shapefile = Shapefile()
 
-    def get_county_gpd(self, bbox: tuple) -> gpd.GeoDataFrame:
+    def get_store(self, vintage: Optional[str] = None) -> GeometryStore:
+        """
+        Get the geometry store of a boundary vintage in this process.
+
+        Workers attach to the shared-memory store of the default vintage
+        created by the parent; other vintages are loaded on first use.
+
+        Parameters
+        ----------
+        vintage : str, optional
+            The boundary vintage, e.g. "1120825". Defaults to the latest.
         """
-        Get the GeoDataFrame of the county shapefile.
+        return get_store(vintage)
+
+    def get_view(
+        self,
+        name: str,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+    ) -> LayerView:
+        """
+        Get the array view of a layer, used for drawing.
+
+        Parameters
+        ----------
+        name : str
+            The layer name, "county", "town" or "arcs".
+        vintage : str, optional
+            The boundary vintage. Defaults to the latest.
+        projection : str, optional
+            A projected CRS to draw in. Defaults to longitude/latitude.
+        region : str, optional
+            A county or county+town name; the view then has the single
+            inset ``REGION``.
+        """
+        return self.get_store(vintage).layer(name, projection, region)
+
+    def get_layer(self, name: str, vintage: Optional[str] = None) -> gpd.GeoDataFrame:
+        """
+        Get the whole layer as a GeoDataFrame, building it on first use.
+
+        The GeoDataFrame is cached on the store of its vintage, so it is
+        released when that vintage is evicted.
+
+        Parameters
+        ----------
+        name : str
+            The layer name, either "county" or "town".
+        vintage : str, optional
+            The boundary vintage. Defaults to the latest.
+        """
+        store = self.get_store(vintage)
+        key = ("gdf", name)
+        if key not in store.cache:
+            gdf = store.layer(name).to_gdf()
+            gdf.sindex  # 預先建立空間索引
+            store.cache[key] = gdf
+        return store.cache[key]
+
+    def _query(self, name: str, bbox: tuple, vintage: Optional[str]) -> gpd.GeoDataFrame:
+        layer = self.get_layer(name, vintage)
+        idx = layer.sindex.query(box(*bbox), predicate="intersects")
+        idx.sort()
+        return layer.iloc[idx].reset_index(drop=True)
+
+    def get_county_gpd(self, bbox: tuple, vintage: Optional[str] = None) -> gpd.GeoDataFrame:
+        """
+        Get the GeoDataFrame of the county layer.
 
         Parameters
         ----------
         bbox : tuple
             The bounding box of the area, in the form of (min_x, min_y, max_x, max_y).
+        vintage : str, optional
+            The boundary vintage. Defaults to the latest.
         """
-        gdf = gpd.read_file(self.shapefile.COUNTY, bbox=bbox)
-        return gdf
+        return self._query("county", bbox, vintage)
 
-    def get_town_gpd(self, bbox: tuple) -> gpd.GeoDataFrame:
+    def get_town_gpd(self, bbox: tuple, vintage: Optional[str] = None) -> gpd.GeoDataFrame:
         """
-        Get the GeoDataFrame of the town shapefile.
+        Get the GeoDataFrame of the town layer.
 
         Parameters
         ----------
         bbox : tuple
             The bounding box of the area, in the form of (min_x, min_y, max_x, max_y).
+        vintage : str, optional
+            The boundary vintage. Defaults to the latest.
         """
-        gdf = gpd.read_file(self.shapefile.TOWN, bbox=bbox)
-        return gdf
+        return self._query("town", bbox, vintage)
 
     def merge_gdf_and_df(
         self, gdf: gpd.GeoDataFrame, df: pd.DataFrame, **kwargs
@@ -0,0 +1,92 @@
+"""
+邊界資料版本
+
+res/shp中的鄉鎮界shapefile以內政部發布日期（民國年月日）命名，例如
+TOWN_MOI_1120825.shp，每個檔案即為一個資料版本（vintage）。縣市界由
+鄉鎮界合併而得（見src/topology.py），因此每個版本只需要鄉鎮界。
+
+找到的版本會被快取，目錄的修改時間最多每Dataset.RELOAD_INTERVAL秒
+檢查一次，新增或移除shapefile後才重新列出目錄。
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.config import Dataset, Shapefile
+
+_NAME = re.compile(r"TOWN_MOI_(\d+)\.shp$")
+
+# 目錄: (上次檢查的時間, 目錄的修改時間, 找到的版本)
+_found: Dict[Path, tuple[float, Optional[float], Dict[str, Path]]] = {}
+
+
+def _scan(shapefile_dir: Path) -> Dict[str, Path]:
+    found = {}
+    for path in shapefile_dir.glob(Shapefile.TOWN_PATTERN):
+        match = _NAME.match(path.name)
+        if match:
+            found[match.group(1)] = path
+    return dict(sorted(found.items(), key=lambda item: int(item[0])))
+
+
+def vintages(shapefile_dir: Path = Shapefile.SHAPEFILE_DIR) -> Dict[str, Path]:
+    """
+    Discover the boundary vintages under ``res/shp``.
+
+    The directory is listed again only when its modification time has
+    changed, checked at most every ``Dataset.RELOAD_INTERVAL`` seconds.
+
+    Returns
+    -------
+    Dict[str, Path]
+        The town shapefile of each vintage, oldest first.
+    """
+    now = time.monotonic()
+    cached = _found.get(shapefile_dir)
+    if cached is not None and now - cached[0] < Dataset.RELOAD_INTERVAL:
+        return dict(cached[2])
+    try:
+        mtime = os.stat(shapefile_dir).st_mtime
+    except OSError:
+        mtime = None
+    if cached is None or cached[1] != mtime:
+        found = _scan(shapefile_dir)
+    else:
+        found = cached[2]
+    _found[shapefile_dir] = (now, mtime, found)
+    return dict(found)
+
+
+def latest() -> str:
+    """最新的資料版本"""
+    found = vintages()
+    if not found:
+        raise FileNotFoundError(
+            f"{Shapefile.SHAPEFILE_DIR}中沒有鄉鎮界shapefile（{Shapefile.TOWN_PATTERN}）"
+        )
+    return list(found)[-1]
+
+
+def resolve(vintage: Optional[str] = None) -> str:
+    """
+    Resolve a requested vintage, defaulting to the latest.
+
+    Raises
+    ------
+    ValueError
+        If the vintage does not exist.
+    """
+    if vintage is None:
+        return latest()
+    found = vintages()
+    if vintage not in found:
+        raise ValueError(f"未知的資料版本: {vintage}，可用版本: {', '.join(found)}")
+    return vintage
+
+
+def town_path(vintage: str) -> Path:
+    """資料版本的鄉鎮界shapefile"""
+    return vintages()[resolve(vintage)]
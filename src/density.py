@@ -0,0 +1,112 @@
+"""
+核密度估計
+
+將點（可加權）依子圖的範圍分箱到格網上，再以FFT與高斯核做卷積。分箱後
+的成本只與格網大小有關，與點數無關，適合數百萬點的熱度圖。
+
+高斯核的傅立葉轉換仍是高斯函數，因此直接以頻域的轉移函數相乘，不需建立
+核的陣列。格網每邊外擴約4個標準差（子圖外的點也會影響邊緣），FFT的循環
+卷積只會把外擴區的值繞到另一側的外擴區，不影響子圖內的結果。
+"""
+
+import numpy as np
+
+# 格網外擴的標準差倍數
+TRUNCATE = 4.0
+
+
+def bin_points(
+    x: np.ndarray,
+    y: np.ndarray,
+    weights,
+    bounds: dict,
+    shape: tuple[int, int],
+    pad: tuple[int, int] = (0, 0),
+) -> np.ndarray:
+    """
+    Sum the points (or their weights) in each cell of a grid over ``bounds``.
+
+    Parameters
+    ----------
+    bounds : dict
+        ``{"min_x", "max_x", "min_y", "max_y"}`` of the unpadded grid.
+    shape : tuple[int, int]
+        (rows, columns) of the unpadded grid.
+    pad : tuple[int, int]
+        Cells added on both sides along y and x; points there are binned too.
+
+    Returns
+    -------
+    np.ndarray
+        (rows + 2 * pad[0], columns + 2 * pad[1]) float64 sums, first row
+        at ``min_y``.
+    """
+    rows, cols = shape
+    pad_y, pad_x = pad
+    col = np.floor((x - bounds["min_x"]) / (bounds["max_x"] - bounds["min_x"]) * cols)
+    row = np.floor((y - bounds["min_y"]) / (bounds["max_y"] - bounds["min_y"]) * rows)
+    col += pad_x
+    row += pad_y
+    width, height = cols + 2 * pad_x, rows + 2 * pad_y
+    inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+    index = row[inside].astype(np.int64) * width + col[inside].astype(np.int64)
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)[inside]
+    return np.bincount(index, weights=w, minlength=width * height).reshape(height, width)
+
+
+def gaussian_smooth(grid: np.ndarray, sigma: tuple[float, float]) -> np.ndarray:
+    """
+    Convolve a grid with a Gaussian of ``sigma`` cells (along y, x) via FFT.
+
+    The convolution is circular; pad the grid by ``TRUNCATE * sigma`` to
+    keep the wrapped part out of the cells of interest.
+    """
+    fy = np.fft.fftfreq(grid.shape[0])[:, None]
+    fx = np.fft.rfftfreq(grid.shape[1])[None, :]
+    transfer = np.exp(-2 * np.pi**2 * ((sigma[0] * fy) ** 2 + (sigma[1] * fx) ** 2))
+    smoothed = np.fft.irfft2(np.fft.rfft2(grid) * transfer, s=grid.shape)
+    # FFT的捨入誤差可能產生極小的負值
+    return np.maximum(smoothed, 0)
+
+
+def kde(
+    x: np.ndarray,
+    y: np.ndarray,
+    bounds: dict,
+    shape: tuple[int, int],
+    bandwidth: tuple[float, float],
+    cell_area: float,
+    weights=None,
+    max_pad: int = 1024,
+) -> np.ndarray:
+    """
+    Gaussian kernel density of points over a grid.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        The points, in the coordinates of ``bounds``.
+    bounds : dict
+        ``{"min_x", "max_x", "min_y", "max_y"}`` of the grid.
+    shape : tuple[int, int]
+        (rows, columns) of the grid.
+    bandwidth : tuple[float, float]
+        The standard deviation of the kernel along y and x, in cells.
+    cell_area : float
+        The area of a cell; the density is per unit of this area.
+    weights : array-like, optional
+        A weight per point; the density then sums weights.
+    max_pad : int
+        The most cells padded on each side, bounding the FFT size for very
+        wide kernels (points farther away are left out).
+
+    Returns
+    -------
+    np.ndarray
+        (rows, columns) density, first row at ``min_y``.
+    """
+    pad = tuple(min(max_pad, int(np.ceil(TRUNCATE * b))) for b in bandwidth)
+    grid = bin_points(x, y, weights, bounds, shape, pad)
+    smoothed = gaussian_smooth(grid, bandwidth)
+    rows, cols = shape
+    return smoothed[pad[0] : pad[0] + rows, pad[1] : pad[1] + cols] / cell_area
@@ -0,0 +1,90 @@
+"""
+字體的註冊與子集
+
+Noto Serif TC的完整字檔很大，圖中卻只用到圖例的幾十個字。建立快照時
+（python -m src.snapshot）將Font.SUBSET中的字體取出常用字的子集（ASCII與
+res/json中所有的字），family為"<原名> Subset"。
+
+執行時以子集註冊字體；family依文字選擇字體，子集缺字時才註冊並使用完整
+字體，不會出現缺字的方框。warm_up在啟動時以各字體繪製一次文字，預先載入
+字檔並建立findfont與字型物件的快取。
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable
+
+from matplotlib import ft2font
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from src.config import FigConfig, Font, Snapshot
+from src.snapshot import register_fonts
+
+# 完整字體的family: (子集的family, 子集包含的字元碼)
+_subsets: Dict[str, tuple[str, frozenset]] = {}
+# 有子集、尚未註冊的完整字體，family: 字檔
+_deferred: Dict[str, Path] = {}
+
+
+def subset_path(font: Path, subset_dir: Path = Snapshot.FONT_SUBSETS) -> Path:
+    return subset_dir / f"{font.stem}.subset{font.suffix}"
+
+
+def register(fonts: Iterable[Path], subset_dir: Path = Snapshot.FONT_SUBSETS):
+    """
+    Register fonts, preferring the subset of a font when it has been built.
+
+    A font with a subset is registered under the subset's family; its full
+    file is registered only for the first text the subset cannot render
+    (see ``family``).
+    """
+    paths = []
+    for font in fonts:
+        path = subset_path(font, subset_dir)
+        if font not in Font.SUBSET or not path.exists():
+            paths.append(font)
+            continue
+        face = ft2font.FT2Font(str(path))
+        subset_family = face.family_name
+        name = subset_family.removesuffix(" Subset")
+        _subsets[name] = (subset_family, frozenset(face.get_charmap()))
+        _deferred[name] = font
+        paths.append(path)
+    register_fonts(paths)
+
+
+def family(name: str, text: str) -> str:
+    """
+    The family to render ``text`` in with the font family ``name``.
+
+    Returns
+    -------
+    str
+        The subset's family if it has every character of ``text``,
+        otherwise ``name`` (registering the full font on first use).
+    """
+    subset = _subsets.get(name)
+    if subset is None:
+        return name
+    subset_family, charset = subset
+    if all(ord(c) in charset for c in text if not c.isspace()):
+        return subset_family
+    font = _deferred.pop(name, None)
+    if font is not None:
+        register_fonts([font])
+    return name
+
+
+def warm_up(samples: Dict[str, str], dpi: float = FigConfig.SAVE_DPI):
+    """
+    Draw sample text once in every font.
+
+    Parameters
+    ----------
+    samples : dict
+        Font family to the text drawn in it, e.g. the legend labels.
+    """
+    fig = Figure(figsize=(4, len(samples) * 0.5), dpi=dpi)
+    FigureCanvasAgg(fig)
+    for i, (name, text) in enumerate(samples.items()):
+        fig.text(0, i / len(samples), text, family=family(name, text), size=14)
+    fig.canvas.draw()
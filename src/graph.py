@@ -1,25 +1,61 @@
-import json
-from typing import List, Union
+import io
+from typing import List, Optional, Union
 import pandas as pd
 import matplotlib
 
 matplotlib.use("Agg")  # 使用非互動式backend，減少記憶體使用
+import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.colors import BoundaryNorm, Normalize, to_rgba_array
+from matplotlib.transforms import AffineDeltaTransform
+from matplotlib.ticker import FormatStrFormatter, MaxNLocator, StrMethodFormatter
 from dataclasses import dataclass
 from contextlib import contextmanager
+from src import fonts, template
+from src.classify import breaks
 from src.core import GeoPlot, GeoData
-from src.config import FigConfig, Font, Shapefile
+from src.density import kde
+from src.hexbin import hex_grid
+from src.projection import area_bounds, from_lonlat, unit_lengths
+from src.config import FigConfig, Font, Png, Raster, Shapefile
+from src.raster import feature_ids, fill, inset_shape
+from src.reference import town_codes
+from src.store import REGION
+from src.topology import ARC_COUNTY, ARC_TOWN
 
 # 設置matplotlib的記憶體管理參數
 plt.rcParams["figure.max_open_warning"] = 0  # 關閉過多圖表的警告
 
+# 補助地區分類的圖例：{分類: {標籤: 顏色}}
+SUBSIDY_LEGENDS = {
+    1: {
+        "山地原民區": "#477160",
+        "平地原民區": "#7FB685",
+        "偏遠地區": "#FFC145",
+        "離島地區": "#90C2E7",
+    },
+    2: {
+        "山地原民區": "#477160",
+        "平地原民區": "#A8D8B9",
+        "平地原民區(6)": "#42AB9E",
+        "偏遠地區": "#FFC145",
+        "離島地區": "#90C2E7",
+    },
+}
+
+# 色條的位置與大小，疊在主圖右側
+COLORBAR = {"location": "right", "orientation": "vertical", "fraction": 0.03, "pad": -0.03}
+
 
 @dataclass
 class SubsidyBoundaryParams:
     """補助區域邊界參數物件"""
 
     type: int  # 1: 受補助地區分為4類, 2: 受補助地區分為5類(平地原民區再分為2類)
+    vintage: Optional[str] = None  # 邊界資料版本，預設為最新版本
+    projection: Optional[str] = None  # 繪圖的投影座標系統，預設為經緯度
+    region: Optional[str] = None  # 只繪製此縣市或鄉鎮（"縣市"或"縣市鄉鎮"），預設為全國
 
 
 @dataclass
@@ -32,6 +68,11 @@ class ChoroplethParams:
     cmap: str = "GnBu"
     colorbar_format: str = "{x:,.0f}"
     colorbar_tick_visible: bool = True
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
+    scheme: Optional[str] = None  # 分級方式，見src/classify.py，None為連續色階
+    k: int = 5  # 分級數
 
 
 @dataclass
@@ -44,6 +85,43 @@ class Hist2DParams:
     cmap: str = "GnBu"
     alpha: float = 0.5
     cmin: int = 1
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
+
+
+@dataclass
+class KDEParams:
+    """核密度熱度圖參數物件"""
+
+    x: List[float]
+    y: List[float]
+    weights: Optional[List[float]] = None  # 各點的權重，預設每點為1
+    bandwidth: float = 2000  # 高斯核的標準差（公尺）
+    gridsize: int = 400  # 各子圖長邊的格數
+    cmap: str = "YlOrRd"
+    alpha: float = 0.6
+    cmin: Optional[float] = None  # 低於此密度（每平方公里）的格不著色，預設為最大密度的1%
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
+
+
+@dataclass
+class HexbinParams:
+    """六角形分箱圖參數物件"""
+
+    x: List[float]
+    y: List[float]
+    weights: Optional[List[float]] = None  # 各點的權重，預設每點為1
+    cellsize: float = 5000  # 六角形的寬（對邊距離，公尺）
+    cmap: str = "GnBu"
+    alpha: float = 0.8
+    cmin: float = 1  # 點數（或權重總和）低於此值的格不著色
+    colorbar_format: str = "{x:,.0f}"
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
 
 
 @dataclass
@@ -55,6 +133,9 @@ class DotParams:
     size: Union[int, float] = 1
     color: str = "red"
     alpha: float = 0.5
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
 
 
 @dataclass
@@ -67,6 +148,9 @@ class BubbleParams:
     color: List[str] = None
     alpha: float = 0.5
     cmin: int = 1
+    vintage: Optional[str] = None
+    projection: Optional[str] = None
+    region: Optional[str] = None
 
     def __post_init__(self):
         if self.size is None:
@@ -75,6 +159,36 @@ class BubbleParams:
             self.color = ["red"] * len(self.x)
 
 
+def fig_to_image(fig: plt.Figure) -> io.BytesIO:
+    """轉換matplotlib的figure為PNG圖片，並關閉figure以釋放記憶體"""
+    try:
+        img_buf = io.BytesIO()
+        fig.savefig(
+            img_buf,
+            format="png",
+            bbox_inches="tight",
+            dpi=FigConfig.SAVE_DPI,
+            # 多執行緒時分段平行壓縮PNG，見src/png.py
+            backend="module://src.png" if Png.THREADS > 1 else None,
+        )
+        img_buf.seek(0)
+        return img_buf
+    finally:
+        # 底圖歸還池中重複使用（見src/template.py），其他figure關閉以釋放記憶體
+        if not template.release(fig):
+            plt.close(fig)
+
+
+def _tick_formatter(fmt: str):
+    """與Colorbar的format參數相同：先試%格式，不適用時為str.format格式"""
+    try:
+        formatter = FormatStrFormatter(fmt)
+        formatter(0)
+        return formatter
+    except (TypeError, ValueError):
+        return StrMethodFormatter(fmt)
+
+
 class Graph:
     def __init__(self):
         self.fig_config = FigConfig()
@@ -82,9 +196,27 @@ class Graph:
         self.geo_plot = GeoPlot()
         self.geo_data = GeoData()
 
-        font = Font()
-        font.register(Font().Urbanist)
-        font.register(Font().NotoSerifTC)
+        # Noto Serif TC有子集時以子集註冊，見src/fonts.py
+        fonts.register([Font.Urbanist, Font.NotoSerifTC])
+
+    def warm_up(self):
+        """
+        Load the layers and render the base layout once.
+
+        This moves layer loading, font loading and lookup, and Agg setup
+        out of the first request.
+        """
+        store = self.geo_data.get_store()
+        labels = {label for legend in SUBSIDY_LEGENDS.values() for label in legend}
+        fonts.warm_up({"Urbanist": "0123456789,.-−%", "Noto Serif TC": "".join(sorted(labels))})
+        fig, ax = self.plot_boundary()
+        if Raster.ENABLED:
+            # 預先載入（或建立）各子圖的圖徵編號點陣
+            for i, a in self.geo_plot.area_list:
+                shape = inset_shape(ax.child_axes[i])
+                for layer in ("county", "town"):
+                    feature_ids(store, layer, a, shape)
+        fig_to_image(fig)
 
     @contextmanager
     def _managed_plot(self):
@@ -111,30 +243,180 @@ class Graph:
 
         gc.collect()
 
-    def plot_boundary(self) -> tuple[plt.Figure, plt.Axes]:
+    def _plot_paths(
+        self,
+        ax: plt.Axes,
+        layer: str,
+        area: str,
+        fids: np.ndarray = None,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+        **kwargs,
+    ) -> tuple[np.ndarray, PathCollection]:
+        """
+        以子圖的float32頂點繪製圖徵，kwargs傳給PathCollection
+
+        頂點已是子圖的axes座標，因此以transAxes繪製，不經過資料座標轉換
+        """
+        view = self.geo_data.get_view(layer, vintage, projection, region)
+        fids, paths = view.inset_paths(area, fids)
+        collection = PathCollection(paths, transform=ax.transAxes, **kwargs)
+        ax.add_collection(collection, autolim=False)
+        return fids, collection
+
+    def _fill(
+        self,
+        ax: plt.Axes,
+        layer: str,
+        area: str,
+        fids: np.ndarray,
+        colors: np.ndarray,
+        zorder: float = 1,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        以各圖徵的顏色填滿子圖中的圖徵
+
+        Raster.ENABLED時由子圖的圖徵編號點陣查表上色，否則繪製多邊形，
+        kwargs只用於繪製多邊形時（傳給PathCollection）。單一區域的地圖
+        種類太多、圖徵也少，不建立點陣
+        """
+        if Raster.ENABLED and region is None:
+            store = self.geo_data.get_store(vintage)
+            ids = feature_ids(store, layer, area, inset_shape(ax), projection)
+            return fill(ax, ids, fids, colors, zorder=zorder)
+        _, collection = self._plot_paths(
+            ax,
+            layer,
+            area,
+            fids,
+            vintage=vintage,
+            projection=projection,
+            region=region,
+            facecolors=colors,
+            zorder=zorder,
+            **{"edgecolors": "none", **kwargs},
+        )
+        return collection
+
+    def _plot_arcs(
+        self,
+        ax: plt.Axes,
+        area: str,
+        rank: int = ARC_COUNTY,
+        color: str = "black",
+        linewidth: float = 0.8,
+        zorder: float = 2,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+    ) -> PathCollection:
+        """
+        繪製指定等級的邊界弧段，每條共用邊界只描繪一次
+
+        同一等級的弧段合為一條Path；弧段端點使用圓頭，避免交會處出現缺口
+        """
+        view = self.geo_data.get_view("arcs", vintage, projection, region)
+        fids = np.flatnonzero(view.column("rank") == rank)
+        collection = PathCollection(
+            [view.inset_path(area, fids)],
+            transform=ax.transAxes,
+            facecolors="none",
+            edgecolors=color,
+            linewidths=linewidth,
+            capstyle="round",
+            joinstyle="round",
+            zorder=zorder,
+        )
+        ax.add_collection(collection, autolim=False)
+        return collection
+
+    def _layout(
+        self,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+        variant=None,
+    ) -> tuple[plt.Figure, plt.Axes, list, dict]:
+        """
+        取出底圖，回傳figure、axes、子圖清單[(索引, 名稱)]與各子圖的範圍
+
+        有region時只有一個涵蓋該區域的子圖REGION。variant為"colorbar"
+        （預先建立色條）或("legend", 補助地區分類)（預先建立圖例）
+        """
+        if region is None:
+            area_list, area_range = self.geo_plot.area_list, area_bounds(projection)
+
+            def base():
+                return self.geo_plot.base(projection)
+
+        else:
+            bounds = self.geo_data.get_store(vintage).region_bounds(region, projection)
+            area_list, area_range = [(0, REGION)], {REGION: bounds}
+
+            def base():
+                return self.geo_plot.region_base(bounds, projection)
+
+        def build() -> tuple:
+            fig, ax = base()
+            if variant == "colorbar":
+                sm = plt.cm.ScalarMappable(cmap="GnBu", norm=Normalize(0, 1))
+                sm._A = []
+                return fig, ax, fig.colorbar(sm, ax=ax, **COLORBAR)
+            if variant is not None and variant[0] == "legend":
+                self._subsidy_legend(ax, variant[1])
+            return fig, ax
+
+        # 單一區域的版面依範圍區分，同名區域在不同資料版本的範圍可能不同
+        key = (projection, tuple(area_range[REGION].values()) if region else None, variant)
+        t = template.pool().checkout(key, build)
+        return t.fig, t.ax, area_list, area_range
+
+    def plot_boundary(
+        self,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+    ) -> tuple[plt.Figure, plt.Axes]:
         """
         Plot the boundary of the given area.
 
+        Parameters
+        ----------
+        vintage : str, optional
+            The boundary vintage. Defaults to the latest.
+        projection : str, optional
+            A projected CRS to draw in. Defaults to longitude/latitude.
+        region : str, optional
+            A county ("臺北市") or county and town ("臺北市中正區") to map
+            alone, on a single axes fitted to it. Defaults to the whole
+            country with its insets.
+
         Returns
         -------
         tuple[plt.Figure, plt.Axes]
             The figure and axes of the plot.
         """
-        area_list = self.geo_plot.area_list
-        area_range = self.fig_config.AREA_RANGE
+        fig, ax, _, _ = self._boundary(vintage, projection, region)
+        return fig, ax
 
-        fig, ax = self.geo_plot.base()
+    def _boundary(
+        self,
+        vintage: Optional[str] = None,
+        projection: Optional[str] = None,
+        region: Optional[str] = None,
+        variant=None,
+    ) -> tuple[plt.Figure, plt.Axes, list, dict]:
+        """繪製縣市邊界的底圖，回傳值同_layout"""
+        layers = {"vintage": vintage, "projection": projection, "region": region}
+        fig, ax, area_list, area_range = self._layout(**layers, variant=variant)
         for i, a in area_list:
-            bbox = (
-                area_range[a]["bounds"]["min_x"],
-                area_range[a]["bounds"]["min_y"],
-                area_range[a]["bounds"]["max_x"],
-                area_range[a]["bounds"]["max_y"],
-            )
-            gdf = self.geo_data.get_county_gpd(bbox)
-            gdf.boundary.plot(ax=ax.child_axes[i], color="black", linewidth=0.8)
-
-        return fig, ax
+            self._plot_arcs(ax.child_axes[i], a, **layers)
+        return fig, ax, area_list, area_range
 
     def plot_subsidy_boundary(
         self, params: SubsidyBoundaryParams
@@ -147,91 +429,81 @@ class Graph:
         tuple[plt.Figure, plt.Axes]
             The figure and axes of the plot.
         """
-        area_list = self.geo_plot.area_list
-        area_range = self.fig_config.AREA_RANGE
+        town = self.geo_data.get_view(
+            "town", params.vintage, params.projection, params.region
+        )
         if params.type == 1:
-            with open("res/json/town_type_by_town.json", "r", encoding="utf-8") as f:
-                town_type = json.load(f)
-                colormap = {
-                    "山地原民區": "#477160",
-                    "平地原民區": "#A8D8B9",
-                    "偏遠地區": "#FFC145",
-                    "離島地區": "#90C2E7",
-                }
+            reference = "town_type"
+            colormap = {
+                "山地原民區": "#477160",
+                "平地原民區": "#A8D8B9",
+                "偏遠地區": "#FFC145",
+                "離島地區": "#90C2E7",
+            }
         elif params.type == 2:
-            with open("res/json/town_type_sp6.json", "r", encoding="utf-8") as f:
-                town_type = json.load(f)
-                colormap = {
-                    "山地原民區": "#477160",
-                    "平地原民區": "#A8D8B9",
-                    "平地原民區(6)": "#42AB9E",
-                    "偏遠地區": "#FFC145",
-                    "離島地區": "#90C2E7",
-                }
-
-        fig, ax = self.geo_plot.base()
+            reference = "town_type_sp6"
+            colormap = {
+                "山地原民區": "#477160",
+                "平地原民區": "#A8D8B9",
+                "平地原民區(6)": "#42AB9E",
+                "偏遠地區": "#FFC145",
+                "離島地區": "#90C2E7",
+            }
+        else:
+            raise ValueError(f"不支援的補助地區分類: {params.type}")
+
+        # 各鄉鎮的類別代碼，-1（未分類）對應到最後的透明色
+        categories, codes = town_codes(reference, params.vintage)
+        palette = to_rgba_array(
+            [colormap.get(c, "#ffffff00") for c in categories] + ["#ffffff00"]
+        )
+
+        layers = {
+            "vintage": params.vintage,
+            "projection": params.projection,
+            "region": params.region,
+        }
+        fig, ax, area_list, _ = self._layout(**layers, variant=("legend", params.type))
         for i, a in area_list:
-            bbox = (
-                area_range[a]["bounds"]["min_x"],
-                area_range[a]["bounds"]["min_y"],
-                area_range[a]["bounds"]["max_x"],
-                area_range[a]["bounds"]["max_y"],
-            )
-            county_gdf = self.geo_data.get_county_gpd(bbox)
-            town_gdf = self.geo_data.get_town_gpd(bbox)
-            town_gdf["town_type"] = town_gdf.apply(
-                lambda row: town_type.get(row["COUNTYNAME"] + row["TOWNNAME"]),
-                axis=1,
-            )
-            town_gdf["color"] = town_gdf["town_type"].map(
-                lambda x: colormap.get(x, "#ffffff00")
-            )
-            county_gdf.boundary.plot(
-                ax=ax.child_axes[i], color="black", linewidth=0.8, zorder=3
+            fids = town.inset_fids(a)
+            colors = palette[codes[fids]]
+            self._plot_arcs(ax.child_axes[i], a, zorder=3, **layers)
+            self._plot_arcs(
+                ax.child_axes[i],
+                a,
+                ARC_TOWN,
+                color="gray",
+                linewidth=0.5,
+                zorder=1,
+                **layers,
             )
-            town_gdf.boundary.plot(
-                ax=ax.child_axes[i], color="gray", linewidth=0.5, zorder=1
+            self._fill(
+                ax.child_axes[i],
+                "town",
+                a,
+                fids,
+                colors,
+                zorder=2,
+                edgecolors=colors,
+                linewidths=plt.rcParams["patch.linewidth"],
+                **layers,
             )
-            town_gdf.plot(ax=ax.child_axes[i], color=town_gdf["color"], zorder=2)
 
-        if params.type == 1:
-            ax.legend(
-                handles=[
-                    plt.Rectangle((0, 0), 1, 1, color="#477160", label="山地原民區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#7FB685", label="平地原民區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#FFC145", label="偏遠地區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#90C2E7", label="離島地區"),
-                ],
-                labels=[
-                    "山地原民區",
-                    "平地原民區",
-                    "偏遠地區",
-                    "離島地區",
-                ],
-                prop={"family": "Noto Serif TC", "size": 14},
-                loc="lower right",
-            )
-        elif params.type == 2:
-            ax.legend(
-                handles=[
-                    plt.Rectangle((0, 0), 1, 1, color="#477160", label="山地原民區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#A8D8B9", label="平地原民區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#42AB9E", label="平地原民區(6)"),
-                    plt.Rectangle((0, 0), 1, 1, color="#FFC145", label="偏遠地區"),
-                    plt.Rectangle((0, 0), 1, 1, color="#90C2E7", label="離島地區"),
-                ],
-                labels=[
-                    "山地原民區",
-                    "平地原民區",
-                    "平地原民區(6)",
-                    "偏遠地區",
-                    "離島地區",
-                ],
-                prop={"family": "Noto Serif TC", "size": 14},
-                loc="lower right",
-            )
         return fig, ax
 
+    def _subsidy_legend(self, ax: plt.Axes, type: int):
+        """補助地區分類的圖例，建立在底圖上（見_layout）"""
+        colors = SUBSIDY_LEGENDS[type]
+        ax.legend(
+            handles=[
+                plt.Rectangle((0, 0), 1, 1, color=color, label=label)
+                for label, color in colors.items()
+            ],
+            labels=list(colors),
+            prop={"family": fonts.family("Noto Serif TC", "".join(colors)), "size": 14},
+            loc="lower right",
+        )
+
     def plot_choropleth(self, params: ChoroplethParams) -> tuple[plt.Figure, plt.Axes]:
         """
         Plot a choropleth map of the given data.
@@ -246,45 +518,54 @@ class Graph:
         tuple[plt.Figure, plt.Axes]
             The figure and axes of the plot.
         """
-        area_list = self.geo_plot.area_list
-        area_range = self.fig_config.AREA_RANGE
-        
         # 計算全域數值範圍，確保所有子圖使用相同的顏色級距
         vmin = params.data[params.column].min()
         vmax = params.data[params.column].max()
-
-        fig, ax = self.geo_plot.base()
+        norm = Normalize(vmin=vmin, vmax=vmax)
+        if params.scheme is not None:
+            values = params.data[params.column].to_numpy(dtype=float)
+            edges = breaks(values, params.scheme, params.k)
+            # 所有數值相同時只有一個邊界，無法分級，維持連續色階
+            if len(edges) > 1:
+                # clip使等於最後一個邊界的最大值歸入最後一級，而非超出範圍
+                norm = BoundaryNorm(edges, ncolors=plt.get_cmap(params.cmap).N, clip=True)
+
+        layers = {
+            "vintage": params.vintage,
+            "projection": params.projection,
+            "region": params.region,
+        }
+        fig, ax, area_list, _ = self._layout(**layers, variant="colorbar")
         for i, a in area_list:
-            bbox = (
-                area_range[a]["bounds"]["min_x"],
-                area_range[a]["bounds"]["min_y"],
-                area_range[a]["bounds"]["max_x"],
-                area_range[a]["bounds"]["max_y"],
+            layer = "town" if params.level == "town" else "county"
+            view = self.geo_data.get_view(layer, **layers)
+            idx = view.inset_fids(a)
+            keys = pd.DataFrame(
+                {"COUNTYNAME": view.column("COUNTYNAME")[idx], "_fid": idx}
             )
-            if params.level == "town":
-                gdf = self.geo_data.get_town_gpd(bbox)
-            else:
-                gdf = self.geo_data.get_county_gpd(bbox)
+            if layer == "town":
+                keys["TOWNNAME"] = view.column("TOWNNAME")[idx]
 
-            gdf = self.geo_data.merge_gdf_and_df(
-                gdf,
+            merged = keys.merge(
                 params.data,
-                left_on=["COUNTYNAME", "TOWNNAME"]
-                if params.level == "town"
-                else ["COUNTYNAME"],
-                right_on=["county", "town"] if params.level == "town" else ["county"],
+                left_on=["COUNTYNAME", "TOWNNAME"] if layer == "town" else ["COUNTYNAME"],
+                right_on=["county", "town"] if layer == "town" else ["county"],
             )
-            if gdf.empty:
-                county_edge = self.geo_data.get_county_gpd(bbox)
-                county_edge.boundary.plot(
-                    ax=ax.child_axes[i], color="black", linewidth=0.8
+            merged = merged[merged[params.column].notna()]
+            if not merged.empty:
+                # 使用全域數值範圍確保所有子圖的顏色級距一致
+                values = merged[params.column].to_numpy(dtype=float)
+                self._fill(
+                    ax.child_axes[i],
+                    layer,
+                    a,
+                    merged["_fid"].to_numpy(),
+                    plt.get_cmap(params.cmap)(norm(values)),
+                    zorder=1,
+                    **layers,
                 )
-                continue
-            # 使用全域數值範圍確保所有子圖的顏色級距一致
-            gdf.plot(ax=ax.child_axes[i], column=params.column, cmap=params.cmap, vmin=vmin, vmax=vmax)
 
-            county_edge = self.geo_data.get_county_gpd(bbox)
-            county_edge.boundary.plot(ax=ax.child_axes[i], color="black", linewidth=0.8)
+            self._plot_arcs(ax.child_axes[i], a, **layers)
 
         self._colorbar(
             ax,
@@ -293,6 +574,7 @@ class Graph:
             params.cmap,
             params.colorbar_format,
             params.colorbar_tick_visible,
+            norm=norm,
         )
 
         return fig, ax
@@ -305,22 +587,28 @@ class Graph:
         cmap: str,
         colorbar_format: str,
         colorbar_tick_visible: bool = True,
+        norm: Optional[Normalize] = None,
     ) -> plt.colorbar:
-        sm = plt.cm.ScalarMappable(cmap=cmap, norm=plt.Normalize(vmin=vmin, vmax=vmax))
+        if norm is None:
+            norm = Normalize(vmin=vmin, vmax=vmax)
+        stepped = isinstance(norm, BoundaryNorm)
+        sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
         sm._A = []
 
-        cbar = plt.colorbar(
-            sm,
-            ax=ax,
-            location="right",
-            orientation="vertical",
-            fraction=0.03,
-            pad=-0.03,
-            format=colorbar_format,
-        )
+        cbar = template.colorbar(ax.figure)
+        if cbar is None:
+            cbar = ax.figure.colorbar(sm, ax=ax, format=colorbar_format, **COLORBAR)
+        else:
+            # 底圖預先建立的色條，換上此請求的色階與格式
+            cbar.update_normal(sm)
+            cbar.formatter = _tick_formatter(colorbar_format)
 
         if colorbar_tick_visible:
-            cbar.locator = MaxNLocator(nbins=6)
+            # 分級時色條為等高的色塊，刻度標在各級的邊界
+            if stepped:
+                cbar.set_ticks(norm.boundaries)
+            else:
+                cbar.locator = MaxNLocator(nbins=6)
             cbar.ax.tick_params(
                 axis="y",
                 labelsize=18,
@@ -344,15 +632,16 @@ class Graph:
         params : Hist2DParams
             包含繪製2D直方圖所需參數的物件
         """
-        area_list = self.geo_plot.area_list
-        area_range = self.fig_config.AREA_RANGE
+        x, y = from_lonlat(params.x, params.y, params.projection)
 
-        fig, ax = self.plot_boundary()
+        fig, ax, area_list, area_range = self._boundary(
+            params.vintage, params.projection, params.region
+        )
         for i, a in area_list:
-            bounds = area_range[a]["bounds"]
+            bounds = area_range[a]
             ax.child_axes[i].hist2d(
-                params.x,
-                params.y,
+                x,
+                y,
                 bins=params.bins,
                 cmap=params.cmap,
                 alpha=params.alpha,
@@ -365,6 +654,130 @@ class Graph:
 
         return fig, ax
 
+    def plot_kde(self, params: KDEParams) -> tuple[plt.Figure, plt.Axes]:
+        """
+        Plot a kernel density heatmap of the given points.
+
+        Each inset gets its own grid, ``gridsize`` cells along its longer
+        side; the bandwidth in meters is converted to cells of that grid.
+        All insets share one color scale, in points (or weights) per km².
+
+        Parameters
+        ----------
+        params : KDEParams
+            包含繪製核密度熱度圖所需參數的物件
+        """
+        x, y = from_lonlat(params.x, params.y, params.projection)
+
+        fig, ax, area_list, area_range = self._boundary(
+            params.vintage, params.projection, params.region
+        )
+        densities = {}
+        for _, a in area_list:
+            bounds = area_range[a]
+            center = (bounds["min_y"] + bounds["max_y"]) / 2
+            unit_x, unit_y = unit_lengths(params.projection, center)
+            width = (bounds["max_x"] - bounds["min_x"]) * unit_x
+            height = (bounds["max_y"] - bounds["min_y"]) * unit_y
+            cell = max(width, height) / params.gridsize
+            shape = (max(1, round(height / cell)), max(1, round(width / cell)))
+            cell_area = (width / shape[1]) * (height / shape[0]) / 1e6
+            bandwidth = (
+                params.bandwidth / (height / shape[0]),
+                params.bandwidth / (width / shape[1]),
+            )
+            densities[a] = kde(x, y, bounds, shape, bandwidth, cell_area, params.weights)
+
+        vmax = max(d.max() for d in densities.values())
+        cmin = params.cmin if params.cmin is not None else vmax * 0.01
+        norm = Normalize(vmin=cmin, vmax=max(vmax, cmin))
+
+        if vmax <= 0:
+            # 範圍內沒有點（或權重總和為0），只有邊界
+            return fig, ax
+        for i, a in area_list:
+            bounds = area_range[a]
+            density = np.ma.masked_less(densities[a], cmin)
+            if density.count() == 0:
+                continue
+            inset = ax.child_axes[i]
+            inset.imshow(
+                density,
+                cmap=params.cmap,
+                norm=norm,
+                alpha=params.alpha,
+                origin="lower",
+                extent=(bounds["min_x"], bounds["max_x"], bounds["min_y"], bounds["max_y"]),
+                # 維持子圖原本的長寬比
+                aspect=inset.get_aspect(),
+                interpolation="bilinear",
+                zorder=1,
+            )
+
+        return fig, ax
+
+    def plot_hexbin(self, params: HexbinParams) -> tuple[plt.Figure, plt.Axes]:
+        """
+        Plot the points binned into hexagons, colored by count.
+
+        The hexagons are regular in meters, ``cellsize`` wide, and their
+        grid is cached per inset and cell size (see src/hexbin.py); a
+        request only bins its points and colors the cells. All insets share
+        one color scale.
+
+        Parameters
+        ----------
+        params : HexbinParams
+            包含繪製六角形分箱圖所需參數的物件
+        """
+        x, y = from_lonlat(params.x, params.y, params.projection)
+
+        fig, ax, area_list, area_range = self._boundary(
+            params.vintage, params.projection, params.region, variant="colorbar"
+        )
+        cells = {}
+        for _, a in area_list:
+            bounds = area_range[a]
+            center = (bounds["min_y"] + bounds["max_y"]) / 2
+            grid = hex_grid(
+                (bounds["min_x"], bounds["max_x"], bounds["min_y"], bounds["max_y"]),
+                params.cellsize,
+                *unit_lengths(params.projection, center),
+            )
+            cells[a] = (grid, grid.counts(x, y, params.weights))
+
+        vmax = max(values.max() for _, values in cells.values())
+        norm = Normalize(vmin=params.cmin, vmax=max(vmax, params.cmin))
+        cmap = plt.get_cmap(params.cmap)
+        for i, a in area_list:
+            grid, values = cells[a]
+            keep = values >= params.cmin
+            if not keep.any():
+                continue
+            inset = ax.child_axes[i]
+            # 同一個六角形以各格心位移繪製，只有顏色隨請求改變
+            collection = PolyCollection(
+                [grid.hexagon],
+                offsets=grid.centers[keep],
+                offset_transform=inset.transData,
+                transform=AffineDeltaTransform(inset.transData),
+                facecolors=cmap(norm(values[keep])),
+                edgecolors="none",
+                alpha=params.alpha,
+                zorder=1,
+            )
+            inset.add_collection(collection, autolim=False)
+
+        self._colorbar(
+            ax,
+            params.cmin,
+            max(vmax, params.cmin),
+            params.cmap,
+            params.colorbar_format,
+            norm=norm,
+        )
+        return fig, ax
+
     def plot_dot(self, params: DotParams) -> tuple[plt.Figure, plt.Axes]:
         """
         Plot a dot chart of the given data.
@@ -374,12 +787,13 @@ class Graph:
         params : DotParams
             包含繪製點圖所需參數的物件
         """
-        area_list = self.geo_plot.area_list
-
-        fig, ax = self.plot_boundary()
+        x, y = from_lonlat(params.x, params.y, params.projection)
+        fig, ax, area_list, _ = self._boundary(
+            params.vintage, params.projection, params.region
+        )
         for i, a in area_list:
             ax.child_axes[i].scatter(
-                params.x, params.y, s=params.size, c=params.color, alpha=params.alpha
+                x, y, s=params.size, c=params.color, alpha=params.alpha
             )
 
         return fig, ax
@@ -396,13 +810,14 @@ class Graph:
         params : BubbleParams
             包含繪製氣泡圖所需參數的物件
         """
-        area_list = self.geo_plot.area_list
-
-        fig, ax = self.plot_boundary()
+        x, y = from_lonlat(params.x, params.y, params.projection)
+        fig, ax, area_list, _ = self._boundary(
+            params.vintage, params.projection, params.region
+        )
         for i, a in area_list:
             ax.child_axes[i].scatter(
-                params.x,
-                params.y,
+                x,
+                y,
                 s=params.size,
                 c=params.color,
                 alpha=params.alpha,
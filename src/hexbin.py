@@ -0,0 +1,125 @@
+"""
+六角形分箱
+
+正方形的分箱在經緯度座標下會變形。這裡以公尺為單位建立正六角形的格網
+（尖頂朝上），每個子圖與格大小的格網只建立一次並快取：格心的座標與一個
+六角形的頂點，繪圖時以同一個六角形加上各格心的位移繪製。
+
+點所屬的格以兩組錯開的矩形格點計算：正六角形格網的格心即這兩組格點，
+每點取兩組中較近的格心，全部為向量運算，再以np.bincount累計。
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class HexGrid:
+    """
+    A pointy-top hexagonal grid over the bounds of an inset.
+
+    Attributes
+    ----------
+    bounds : tuple
+        (min_x, max_x, min_y, max_y) of the inset, in data units.
+    dx, dy : float
+        The spacing of the centers of each rectangular lattice, in data
+        units: the width of a hexagon and √3 times it (in meters).
+    nx, ny : int
+        The columns and rows of the first lattice; the second, offset by
+        half a cell, has one fewer of each.
+    centers : np.ndarray
+        (cells, 2) centers in data units, the first lattice first.
+    hexagon : np.ndarray
+        (6, 2) vertices of a hexagon around (0, 0), in data units.
+    """
+
+    bounds: tuple
+    dx: float
+    dy: float
+    nx: int
+    ny: int
+    centers: np.ndarray
+    hexagon: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.centers)
+
+    def assign(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """各點所在的格，範圍外的點為-1"""
+        min_x, max_x, min_y, max_y = self.bounds
+        u = (np.asarray(x, dtype=np.float64) - min_x) / self.dx
+        v = (np.asarray(y, dtype=np.float64) - min_y) / self.dy
+        # 第一組格點在整數位置，第二組在(i + 0.5, j + 0.5)
+        i1, j1 = np.rint(u), np.rint(v)
+        # 第二組格點少一列一行，恰在範圍邊緣的點屬於第一組
+        i2 = np.clip(np.floor(u), 0, self.nx - 2)
+        j2 = np.clip(np.floor(v), 0, self.ny - 2)
+        # y方向的間距是x方向的√3倍，距離以x方向的格寬為單位比較
+        d1 = (u - i1) ** 2 + 3 * (v - j1) ** 2
+        d2 = (u - i2 - 0.5) ** 2 + 3 * (v - j2 - 0.5) ** 2
+        first = d1 <= d2
+        cell = np.where(
+            first,
+            j1 * self.nx + i1,
+            self.nx * self.ny + j2 * (self.nx - 1) + i2,
+        ).astype(np.int64)
+        inside = (
+            (u >= 0)
+            & (u * self.dx <= max_x - min_x)
+            & (v >= 0)
+            & (v * self.dy <= max_y - min_y)
+        )
+        return np.where(inside, cell, -1)
+
+    def counts(self, x: np.ndarray, y: np.ndarray, weights=None) -> np.ndarray:
+        """
+        The number of points (or the sum of their weights) in every cell.
+
+        Returns
+        -------
+        np.ndarray
+            (size,) float64, in the order of ``centers``.
+        """
+        cell = self.assign(x, y)
+        inside = cell >= 0
+        w = None if weights is None else np.asarray(weights, dtype=np.float64)[inside]
+        return np.bincount(cell[inside], weights=w, minlength=self.size).astype(np.float64)
+
+
+@lru_cache(maxsize=64)
+def hex_grid(bounds: tuple, cellsize: float, unit_x: float, unit_y: float) -> HexGrid:
+    """
+    The hexagonal grid of an inset, built once per inset and cell size.
+
+    Parameters
+    ----------
+    bounds : tuple
+        (min_x, max_x, min_y, max_y) of the inset.
+    cellsize : float
+        The width of a hexagon (between opposite sides), in meters.
+    unit_x, unit_y : float
+        The length in meters of one data unit along x and y (see
+        ``projection.unit_lengths``).
+    """
+    min_x, max_x, min_y, max_y = bounds
+    dx = cellsize / unit_x
+    dy = cellsize * np.sqrt(3) / unit_y
+    nx = int(np.ceil((max_x - min_x) / dx)) + 1
+    ny = int(np.ceil((max_y - min_y) / dy)) + 1
+    i1, j1 = np.meshgrid(np.arange(nx), np.arange(ny))
+    i2, j2 = np.meshgrid(np.arange(nx - 1) + 0.5, np.arange(ny - 1) + 0.5)
+    centers = np.column_stack(
+        [
+            np.concatenate([i1.ravel(), i2.ravel()]) * dx + min_x,
+            np.concatenate([j1.ravel(), j2.ravel()]) * dy + min_y,
+        ]
+    )
+    # 外接圓半徑為dy / 3（y方向），頂點朝上
+    hexagon = np.array([dx, dy / 3]) * np.array(
+        [[0.5, -0.5], [0.5, 0.5], [0.0, 1.0], [-0.5, 0.5], [-0.5, -0.5], [0.0, -1.0]]
+    )
+    return HexGrid(bounds, dx, dy, nx, ny, centers, hexagon)
@@ -0,0 +1,307 @@
+"""
+大量座標的空間查詢
+
+將座標對應到所在的縣市鄉鎮、最近的鄉鎮與距離，或指定半徑內的所有鄉鎮。
+各資料版本的鄉鎮圖層在第一次查詢時建立STRtree與prepared幾何，快取在該
+版本的GeometryStore上（版本被移出記憶體時一併釋放），之後的查詢全部以
+shapely的向量化函式處理，不逐點迴圈。
+
+距離以Lookup.METRIC_CRS（TWD97 TM2）計算，單位為公尺。
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import shapely
+from src.config import Lookup
+from src.projection import WGS84, transformer
+from src.store import get_store
+from src.topology import gather_ranges
+
+# 查詢結果中鄉鎮的屬性欄位
+TOWN_COLUMNS = ["TOWNCODE", "COUNTYNAME", "TOWNNAME"]
+
+# 點資料依縣市或鄉鎮彙總的方式，density為每平方公里的點數（或數值總和）
+AGGREGATIONS = ("count", "sum", "mean", "density")
+
+
+def boundary_chunks(
+    geometries: np.ndarray, size: int = Lookup.CHUNK_SIZE
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Split the rings of polygons into linestrings of at most ``size`` segments.
+
+    The distance to a polygon is linear in its vertex count, so a point
+    near a long coastline is slow to measure against the whole polygon;
+    against short chunks the tree narrows it down to a few small pieces.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The chunks, and the index of the polygon each chunk belongs to.
+    """
+    rings, ring_feature = shapely.get_rings(geometries, return_index=True)
+    coords = shapely.get_coordinates(rings)
+    ring_length = shapely.get_num_coordinates(rings)
+    ring_start = np.concatenate([[0], np.cumsum(ring_length)[:-1]])
+    # 每個環切成ceil((頂點數 - 1) / size)段，相鄰兩段共用一個頂點
+    n_chunks = -(-(ring_length - 1) // size)
+    chunk_ring = np.repeat(np.arange(len(rings)), n_chunks)
+    chunk_rank = np.arange(n_chunks.sum()) - np.repeat(np.cumsum(n_chunks) - n_chunks, n_chunks)
+    chunk_start = ring_start[chunk_ring] + chunk_rank * size
+    ring_end = ring_start[chunk_ring] + ring_length[chunk_ring] - 1
+    chunk_length = np.minimum(size, ring_end - chunk_start) + 1
+    chunks = shapely.from_ragged_array(
+        shapely.GeometryType.LINESTRING,
+        coords[gather_ranges(chunk_start, chunk_length)],
+        (np.concatenate([[0], np.cumsum(chunk_length)]),),
+    )
+    return chunks, ring_feature[chunk_ring]
+
+
+def as_points(x, y) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Validate a batch of coordinates.
+
+    Raises
+    ------
+    ValueError
+        If ``x`` and ``y`` differ in length, are not finite, or exceed
+        ``Lookup.MAX_POINTS``.
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64).reshape(-1)
+    y = np.ascontiguousarray(y, dtype=np.float64).reshape(-1)
+    if len(x) != len(y):
+        raise ValueError(f"x與y的長度不同: {len(x)} != {len(y)}")
+    if len(x) > Lookup.MAX_POINTS:
+        raise ValueError(f"座標數超過上限{Lookup.MAX_POINTS}: {len(x)}")
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        raise ValueError("座標必須為有限數值")
+    return x, y
+
+
+class TownIndex:
+    """
+    Spatial index over the town layer of one vintage.
+
+    Parameters
+    ----------
+    geometries : np.ndarray
+        The town polygons, in longitude/latitude.
+    columns : dict
+        The attribute columns of the towns, keyed by name.
+    """
+
+    def __init__(self, geometries: np.ndarray, columns: dict):
+        self.columns = columns
+        self.geometries = geometries
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+        self.transformer = transformer(WGS84, Lookup.METRIC_CRS)
+        metric = shapely.transform(
+            geometries, lambda c: np.column_stack(self.transformer.transform(*c.T))
+        )
+        self.area_km2 = shapely.area(metric) / 1e6
+        # 距離以切短的邊界計算，點在鄉鎮內時距離為0，另由locate判斷
+        self.chunks, self.chunk_fid = boundary_chunks(metric)
+        self.chunk_tree = shapely.STRtree(self.chunks)
+
+    def _metric_points(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return shapely.points(*self.transformer.transform(x, y))
+
+    def towns(self, fids: np.ndarray) -> tuple[dict, np.ndarray]:
+        """
+        Encode town indices as a table of the towns found and positions in it.
+
+        Returns
+        -------
+        tuple[dict, np.ndarray]
+            The attributes of each distinct town in ``fids`` (one list per
+            column), and for every entry its row in that table (-1 stays -1).
+        """
+        unique, inverse = np.unique(fids, return_inverse=True)
+        found = unique >= 0
+        table = {c: self.columns[c][unique[found]].tolist() for c in TOWN_COLUMNS}
+        rows = inverse.reshape(-1) - np.count_nonzero(~found)
+        rows[fids < 0] = -1
+        return table, rows.astype(np.int32)
+
+    def locate(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Find the town containing each point.
+
+        Candidates come from the bounding boxes in the tree and are then
+        tested with ``contains_xy`` against the prepared polygons. A point
+        on a shared boundary goes to the town with the smaller index.
+
+        Returns
+        -------
+        np.ndarray
+            The town index of each point, -1 if it is in no town.
+        """
+        point, fid = self.tree.query(shapely.points(x, y))
+        hit = shapely.contains_xy(self.geometries[fid], x[point], y[point])
+        point, fid = point[hit], fid[hit]
+        result = np.full(len(x), -1, dtype=np.int32)
+        # 同一點有多個結果時，依索引遞減指定，讓索引最小的鄉鎮最後寫入
+        order = np.lexsort((-fid, point))
+        result[point[order]] = fid[order]
+        return result
+
+    def nearest(
+        self, x: np.ndarray, y: np.ndarray, max_distance: Optional[float] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest town to each point; 0 m for a point inside a town.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The town index of each point (-1 if none is within
+            ``max_distance`` meters) and the distance in meters (NaN then).
+        """
+        result = self.locate(x, y)
+        distance = np.where(result >= 0, 0.0, np.nan)
+        outside = np.flatnonzero(result < 0)
+        (point, chunk), dist = self.chunk_tree.query_nearest(
+            self._metric_points(x[outside], y[outside]),
+            max_distance=max_distance,
+            return_distance=True,
+            all_matches=False,
+        )
+        result[outside[point]] = self.chunk_fid[chunk]
+        distance[outside[point]] = dist
+        return result, distance
+
+    def within(
+        self, x: np.ndarray, y: np.ndarray, radius: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find every town within ``radius`` meters of each point.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            Pairs of point index and town index sorted by point, and the
+            distance of each pair in meters.
+        """
+        mx, my = self.transformer.transform(x, y)
+        # 以外接矩形找出候選，每組只計算一次距離（比dwithin少算一次）
+        point, chunk = self.chunk_tree.query(
+            shapely.box(mx - radius, my - radius, mx + radius, my + radius)
+        )
+        distance = shapely.distance(shapely.points(mx[point], my[point]), self.chunks[chunk])
+        near = distance <= radius
+        point, fid, distance = point[near], self.chunk_fid[chunk[near]], distance[near]
+
+        # 所在的鄉鎮距離為0，其餘鄉鎮取各段邊界距離的最小值
+        located = self.locate(x, y)
+        inside = np.flatnonzero(located >= 0)
+        point = np.concatenate([inside, point])
+        fid = np.concatenate([located[inside], fid])
+        distance = np.concatenate([np.zeros(len(inside)), distance])
+        order = np.lexsort((distance, fid, point))
+        point, fid, distance = point[order], fid[order], distance[order]
+        first = np.concatenate([[True], (point[1:] != point[:-1]) | (fid[1:] != fid[:-1])])
+        return point[first].astype(np.int32), fid[first].astype(np.int32), distance[first]
+
+
+def aggregate(
+    index: TownIndex,
+    x: np.ndarray,
+    y: np.ndarray,
+    values: Optional[np.ndarray] = None,
+    how: str = "count",
+    level: str = "county",
+) -> pd.DataFrame:
+    """
+    Aggregate points by the county or town containing them.
+
+    Parameters
+    ----------
+    index : TownIndex
+        The town index of the vintage.
+    x, y : np.ndarray
+        The point coordinates, in longitude/latitude.
+    values : np.ndarray, optional
+        A value per point; required for "sum" and "mean". "density" uses
+        the sum of values if given, the point count otherwise.
+    how : str
+        One of ``AGGREGATIONS``.
+    level : str
+        "county" or "town".
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per county or town, in the columns ``county``, ``town``
+        (town level only), ``count`` and, unless ``how`` is "count", a
+        column named after ``how``. Every area is listed, with a count of
+        0 if it has no points; "mean" is NaN for those.
+
+    Raises
+    ------
+    ValueError
+        If ``how`` or ``level`` is not supported, or ``values`` is missing
+        or of the wrong length.
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"不支援的彙總方式: {how}")
+    if level not in ("county", "town"):
+        raise ValueError(f"不支援的層級: {level}")
+    if values is None and how in ("sum", "mean"):
+        raise ValueError(f"{how}需要提供value")
+    if values is not None:
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if len(values) != len(x):
+            raise ValueError(f"value與座標的長度不同: {len(values)} != {len(x)}")
+
+    fids = index.locate(x, y)
+    found = fids >= 0
+    county_names = index.columns["COUNTYNAME"]
+    if level == "town":
+        groups = fids[found]
+        table = pd.DataFrame({"county": county_names, "town": index.columns["TOWNNAME"]})
+        area = index.area_km2
+    else:
+        # 縣市由鄉鎮合併而得，各鄉鎮的點直接歸入所屬縣市
+        counties, town_county = np.unique(county_names, return_inverse=True)
+        town_county = town_county.reshape(-1)
+        groups = town_county[fids[found]]
+        table = pd.DataFrame({"county": counties})
+        area = np.bincount(town_county, weights=index.area_km2, minlength=len(counties))
+
+    n = len(table)
+    count = np.bincount(groups, minlength=n)
+    table["count"] = count
+    if how == "count":
+        return table
+    if values is not None:
+        total = np.bincount(groups, weights=values[found], minlength=n)
+    else:
+        total = count.astype(np.float64)
+    if how == "sum":
+        table[how] = total
+    elif how == "mean":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table[how] = np.where(count > 0, total / count, np.nan)
+    else:
+        table[how] = total / area
+    return table
+
+
+def town_index(vintage: Optional[str] = None) -> TownIndex:
+    """
+    Get the town index of a vintage, building it on first use.
+
+    The index is cached on the store of the vintage.
+    """
+    store = get_store(vintage)
+    key = ("town_index",)
+    if key not in store.cache:
+        town = store.layer("town")
+        columns = {c: town.column(c) for c in TOWN_COLUMNS}
+        store.cache[key] = TownIndex(town.geometries(), columns)
+    return store.cache[key]
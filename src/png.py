@@ -0,0 +1,154 @@
+"""
+分段平行的PNG編碼
+
+輸出影像約為3600x3800的RGBA，PNG壓縮佔了繪圖請求一半左右的時間，而
+matplotlib（Pillow）以單一執行緒壓縮整張影像。這裡將合成完成的影像依列
+切成數段，各段的Up濾波與deflate壓縮在執行緒中同時進行（NumPy與zlib運算時
+會釋放GIL），再依序接成一個zlib串流。
+
+各段以獨立的壓縮器壓縮，除最後一段外以Z_SYNC_FLUSH結束，沒有跨段的參照，
+因此可以直接相接（與pigz相同的作法）；zlib的Adler-32檢查碼由各段合併而得。
+解碼後的像素與matplotlib的輸出完全相同，只有壓縮內容不同。
+"""
+
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from src.config import Png
+
+# PNG的Up濾波器
+FILTER_UP = 2
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Png.THREADS, thread_name_prefix="png")
+    return _executor
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """兩段資料相接後的Adler-32，與zlib的adler32_combine相同"""
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = rem * sum1 % base
+    sum1 += (adler2 & 0xFFFF) + base - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + base - rem
+    sum1 %= base
+    sum2 %= base
+    return sum1 | (sum2 << 16)
+
+
+def _compress(
+    rows: np.ndarray, previous: np.ndarray, last: bool, level: int
+) -> tuple[bytes, int, int]:
+    """以Up濾波並壓縮一段掃描線，回傳壓縮內容、Adler-32與原始長度"""
+    filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = FILTER_UP
+    np.subtract(rows[0], previous, out=filtered[0, 1:])
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+    raw = filtered.data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(raw)
+    data += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return data, zlib.adler32(raw), filtered.nbytes
+
+
+def encode(
+    rgba: np.ndarray,
+    dpi: Optional[float] = None,
+    metadata: Optional[dict] = None,
+    stripes: Optional[int] = None,
+    level: int = Png.LEVEL,
+) -> bytes:
+    """
+    Encode an RGBA image as PNG, compressing horizontal stripes in parallel.
+
+    Parameters
+    ----------
+    rgba : np.ndarray
+        (height, width, 4) uint8 image, first row at the top.
+    dpi : float, optional
+        Written to the pHYs chunk.
+    metadata : dict, optional
+        Written as tEXt chunks; None values are skipped.
+    stripes : int, optional
+        The number of stripes compressed concurrently; ``Png.THREADS``
+        when omitted.
+    level : int
+        The zlib compression level.
+    """
+    height, width, _ = rgba.shape
+    rows = np.ascontiguousarray(rgba).reshape(height, width * 4)
+    stripes = Png.THREADS if stripes is None else stripes
+    bounds = np.linspace(0, height, max(1, min(stripes, height)) + 1).astype(int)
+    jobs = []
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        previous = rows[start - 1] if start else np.zeros(rows.shape[1], dtype=np.uint8)
+        last = i == len(bounds) - 2
+        jobs.append(_pool().submit(_compress, rows[start:end], previous, last, level))
+
+    chunks = [b"\x89PNG\r\n\x1a\n"]
+    chunks.append(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+    if dpi is not None:
+        ppm = int(dpi / 0.0254 + 0.5)
+        chunks.append(_chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1)))
+    for key, value in (metadata or {}).items():
+        if value is not None:
+            text = key.encode("latin-1") + b"\0" + value.encode("latin-1")
+            chunks.append(_chunk(b"tEXt", text))
+
+    adler = 1
+    # zlib標頭（deflate、32K視窗），壓縮內容依段落分為多個IDAT
+    chunks.append(_chunk(b"IDAT", b"\x78\x9c"))
+    for job in jobs:
+        data, part_adler, length = job.result()
+        adler = adler32_combine(adler, part_adler, length)
+        chunks.append(_chunk(b"IDAT", data))
+    chunks.append(_chunk(b"IDAT", struct.pack(">I", adler)))
+    chunks.append(_chunk(b"IEND", b""))
+    return b"".join(chunks)
+
+
+class StripedCanvas(FigureCanvasAgg):
+    """
+    Agg canvas writing PNG with ``encode``.
+
+    Drawing, the tight bounding box and everything else are those of
+    ``FigureCanvasAgg``; only the encoding of the final buffer differs.
+    """
+
+    def print_png(self, filename_or_obj, *, metadata=None, pil_kwargs=None, **kwargs):
+        # print_figure傳給第三方canvas的其他參數（dpi、orientation等）已套用在figure上
+        FigureCanvasAgg.draw(self)
+        metadata = {
+            "Software": f"Matplotlib version{mpl.__version__}, https://matplotlib.org/",
+            **(metadata or {}),
+        }
+        data = encode(np.asarray(self.buffer_rgba()), self.figure.dpi, metadata)
+        if hasattr(filename_or_obj, "write"):
+            filename_or_obj.write(data)
+        else:
+            with open(filename_or_obj, "wb") as f:
+                f.write(data)
+
+
+# 以savefig(..., backend="module://src.png")使用
+FigureCanvas = StripedCanvas
@@ -0,0 +1,124 @@
+"""
+座標參考系統的轉換
+
+請求中的座標預設為EPSG:4326經緯度，也可以指定其他座標系統（例如TWD97
+TM2的EPSG:3826/3825），由這裡整批轉為經緯度。繪圖也可以指定投影座標系統，
+此時圖層與子圖範圍會轉換到該座標系統（見GeometryStore.projected）。
+
+pyproj建立Transformer的成本遠高於轉換本身，因此依(來源, 目標)快取。
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+import pyproj
+from src.config import FigConfig
+
+WGS84 = "EPSG:4326"
+
+# 轉換子圖範圍時每邊取的點數，投影後的外框才能涵蓋彎曲的邊
+DENSIFY = 21
+
+
+@lru_cache(maxsize=64)
+def parse(crs: str) -> str:
+    """
+    Normalize a CRS given as "EPSG:3826", "3826", WKT or a PROJ string.
+
+    Raises
+    ------
+    ValueError
+        If pyproj does not recognize the CRS.
+    """
+    try:
+        parsed = pyproj.CRS.from_user_input(int(crs) if crs.isdigit() else crs)
+    except pyproj.exceptions.CRSError as e:
+        raise ValueError(f"無法辨識的座標參考系統: {crs}") from e
+    authority = parsed.to_authority()
+    return ":".join(authority) if authority else parsed.to_wkt()
+
+
+@lru_cache(maxsize=64)
+def parse_projected(crs: str) -> str:
+    """
+    Normalize a CRS to render in; it must be projected.
+
+    Raises
+    ------
+    ValueError
+        If the CRS is not recognized or is not projected.
+    """
+    crs = parse(crs)
+    if not pyproj.CRS.from_user_input(crs).is_projected:
+        raise ValueError(f"繪圖的座標參考系統必須是投影座標系統: {crs}")
+    return crs
+
+
+@lru_cache(maxsize=64)
+def transformer(source: str, target: str) -> pyproj.Transformer:
+    """座標順序固定為(x, y)，即(經度, 緯度)"""
+    return pyproj.Transformer.from_crs(source, target, always_xy=True)
+
+
+def to_lonlat(x, y, crs: Optional[str] = None) -> tuple[np.ndarray, np.ndarray]:
+    """將crs的座標整批轉為經緯度，crs為None或EPSG:4326時不轉換"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if crs is None or crs == WGS84:
+        return x, y
+    return transformer(crs, WGS84).transform(x, y)
+
+
+def from_lonlat(x, y, crs: Optional[str] = None) -> tuple[np.ndarray, np.ndarray]:
+    """將經緯度整批轉為crs的座標，crs為None或EPSG:4326時不轉換"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if crs is None or crs == WGS84:
+        return x, y
+    return transformer(WGS84, crs).transform(x, y)
+
+
+@lru_cache(maxsize=16)
+def area_bounds(crs: Optional[str] = None) -> Dict[str, dict]:
+    """
+    The bounds of every inset (``FigConfig.AREA_RANGE``) in a CRS.
+
+    Returns
+    -------
+    dict
+        Area name to ``{"min_x", "max_x", "min_y", "max_y"}``; the
+        configured longitude/latitude bounds when ``crs`` is None.
+    """
+    areas = {area: info["bounds"] for area, info in FigConfig.AREA_RANGE.items()}
+    if crs is None or crs == WGS84:
+        return areas
+    projected = {}
+    for area, b in areas.items():
+        min_x, min_y, max_x, max_y = transformer(WGS84, crs).transform_bounds(
+            b["min_x"], b["min_y"], b["max_x"], b["max_y"], densify_pts=DENSIFY
+        )
+        projected[area] = {"min_x": min_x, "max_x": max_x, "min_y": min_y, "max_y": max_y}
+    return projected
+
+
+@lru_cache(maxsize=16)
+def _unit_length(crs: str) -> float:
+    return pyproj.CRS.from_user_input(crs).axis_info[0].unit_conversion_factor
+
+
+def unit_lengths(crs: Optional[str], lat: float) -> tuple[float, float]:
+    """
+    The length in meters of one unit along x and y.
+
+    For longitude/latitude (``crs`` None or EPSG:4326) it is the length of a
+    degree on the WGS84 ellipsoid at latitude ``lat``; for a projected CRS
+    it is the length of its axis unit.
+    """
+    if crs is None or crs == WGS84:
+        phi = np.radians(lat)
+        lon = 111412.84 * np.cos(phi) - 93.5 * np.cos(3 * phi)
+        lat = 111132.92 - 559.82 * np.cos(2 * phi) + 1.175 * np.cos(4 * phi)
+        return float(lon), float(lat)
+    factor = _unit_length(crs)
+    return factor, factor
@@ -0,0 +1,179 @@
+"""
+圖徵編號點陣
+
+版面、輸出DPI與圖層固定時，每個子圖中的每個輸出像素屬於哪個縣市/鄉鎮
+也是固定的。這裡將各子圖的圖層點陣化為uint16的圖徵編號陣列（背景為
+BACKGROUND），存放在快照目錄中；分層設色圖與補助地區圖的填色只需以
+編號陣列查詢每個圖徵的顏色（``colors[ids]``），不必每次請求都把多邊形
+重新點陣化。
+
+點陣的尺寸依子圖在輸出影像中的像素大小計算，邊界線仍以向量繪製在上層。
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure
+from matplotlib.image import BboxImage
+from src.config import FigConfig, Raster
+from src.store import GeometryStore
+
+BACKGROUND = np.uint16(0xFFFF)
+
+
+def inset_shape(ax: plt.Axes, dpi: float = FigConfig.SAVE_DPI) -> tuple[int, int]:
+    """
+    The (height, width) in pixels of an inset when the figure is saved.
+
+    The inset's position depends on its locator and its aspect ratio, both
+    applied at draw time; they are applied here without drawing.
+    """
+    locator = ax.get_axes_locator()
+    ax.apply_aspect(locator(ax, None) if locator is not None else None)
+    position = ax.get_position()
+    width, height = ax.figure.get_size_inches()
+    return (
+        max(1, round(position.height * height * dpi)),
+        max(1, round(position.width * width * dpi)),
+    )
+
+
+def rasterize(fids: np.ndarray, paths: list, shape: tuple[int, int]) -> np.ndarray:
+    """
+    Rasterize Paths in axes coordinates into a feature-ID array.
+
+    Each feature is filled without anti-aliasing in a color encoding its
+    index, so every pixel belongs to exactly one feature. A background
+    pixel between features on both sides (left and right, or above and
+    below) takes the left or upper feature, closing hairline gaps where
+    several polygons meet.
+
+    Returns
+    -------
+    np.ndarray
+        (height, width) uint16 feature indices, first row at the top;
+        ``BACKGROUND`` outside every feature.
+    """
+    height, width = shape
+    code = fids.astype(np.int64) + 1
+    colors = np.column_stack(
+        [(code & 0xFF) / 255, (code >> 8) / 255, np.zeros(len(code)), np.ones(len(code))]
+    )
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    fig.patch.set_facecolor((0, 0, 0, 1))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.add_collection(
+        PathCollection(
+            paths,
+            transform=ax.transAxes,
+            facecolors=colors,
+            edgecolors="none",
+            antialiased=False,
+        )
+    )
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    code = rgba[..., 0].astype(np.int32) | (rgba[..., 1].astype(np.int32) << 8)
+    ids = np.where(code == 0, BACKGROUND, code - 1).astype(np.uint16)
+
+    bg = ids == BACKGROUND
+    gap = bg[:, 1:-1] & ~bg[:, :-2] & ~bg[:, 2:]
+    ids[:, 1:-1][gap] = ids[:, :-2][gap]
+    bg = ids == BACKGROUND
+    gap = bg[1:-1] & ~bg[:-2] & ~bg[2:]
+    ids[1:-1][gap] = ids[:-2][gap]
+    return ids
+
+
+def _digest(view, area: str, shape: tuple, projection: Optional[str]) -> str:
+    """子圖陣列與點陣尺寸的雜湊，快照重建或版面改變時快取自動失效"""
+    prefix = f"inset/{area}/"
+    h = hashlib.blake2b(digest_size=12)
+    for key in ("fids", "vertices", "offsets"):
+        h.update(np.ascontiguousarray(view.arrays[prefix + key]).data)
+    h.update(repr((view.name, area, shape, projection)).encode())
+    return h.hexdigest()
+
+
+def feature_ids(
+    store: GeometryStore,
+    layer: str,
+    area: str,
+    shape: tuple[int, int],
+    projection: Optional[str] = None,
+    cache_dir: Optional[Path] = Raster.DIR,
+) -> np.ndarray:
+    """
+    Get the feature-ID raster of an inset, rasterizing it on first use.
+
+    The raster is cached on the store, and as a .npy file in ``cache_dir``
+    so other workers and later processes load it instead of rasterizing.
+    The file name is a digest of the inset arrays and the raster shape.
+    """
+    key = ("raster", layer, area, shape, projection)
+    if key in store.cache:
+        return store.cache[key]
+
+    view = store.layer(layer, projection)
+    path = None
+    if cache_dir is not None:
+        digest = _digest(view, area, shape, projection)
+        path = cache_dir / store.vintage / f"{layer}-{area}-{digest}.npy"
+    ids = None
+    if path is not None and path.exists():
+        try:
+            ids = np.load(path)
+        except (OSError, ValueError):
+            ids = None
+    if ids is None:
+        fids, paths = view.inset_paths(area)
+        ids = rasterize(fids, paths, shape)
+        if path is not None:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # 先寫入暫存檔再改名，其他worker不會讀到寫到一半的檔案
+                tmp = path.with_suffix(f".{np.random.randint(1 << 30)}.tmp")
+                with open(tmp, "wb") as f:
+                    np.save(f, ids)
+                tmp.replace(path)
+            except OSError:
+                pass
+    ids.setflags(write=False)
+    store.cache[key] = ids
+    return ids
+
+
+def fill(
+    ax: plt.Axes,
+    ids: np.ndarray,
+    fids: np.ndarray,
+    colors: np.ndarray,
+    zorder: float = 1,
+) -> BboxImage:
+    """
+    Fill an inset from its feature-ID raster.
+
+    Parameters
+    ----------
+    ax : plt.Axes
+        The inset; the image covers its bounding box.
+    ids : np.ndarray
+        The feature-ID raster of the inset.
+    fids : np.ndarray
+        The features to fill; other features stay transparent.
+    colors : np.ndarray
+        (len(fids), 4) RGBA colors in [0, 1].
+    """
+    lut = np.zeros((int(BACKGROUND) + 1, 4), dtype=np.uint8)
+    lut[np.asarray(fids, dtype=np.int64)] = np.round(np.asarray(colors) * 255)
+    image = BboxImage(ax.bbox, interpolation="nearest", zorder=zorder)
+    image.set_data(lut[ids])
+    ax.add_artist(image)
+    return image
@@ -0,0 +1,193 @@
+"""
+res/json參考資料的登錄
+
+res/json中的分類檔（補助地區類型、無加油站鄉鎮、縣市鄉鎮清單）在第一次
+使用時載入，轉為排序後的鍵值與類別代碼陣列，再對齊各資料版本鄉鎮圖層的
+圖徵索引，繪圖時只需以索引取出類別，不必逐筆查詢字典或讀檔。
+
+檔案的修改時間最多每Json.RELOAD_INTERVAL秒檢查一次；檔案更新時先完整
+建立新的分類表，再整個替換舊表，進行中的請求不會看到一半的資料。
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from src.config import Json
+from src.store import get_store
+
+
+@dataclass(frozen=True)
+class Classification:
+    """
+    A categorical lookup table loaded from one reference file.
+
+    ``keys`` are sorted "縣市鄉鎮" names and ``key_codes`` the index of each
+    key's category in ``categories``.
+    """
+
+    name: str
+    mtime: float
+    keys: np.ndarray
+    key_codes: np.ndarray
+    categories: np.ndarray
+
+    def codes_for(self, names: np.ndarray) -> np.ndarray:
+        """names對應的類別代碼，沒有分類的為-1"""
+        pos = np.searchsorted(self.keys, names)
+        pos = np.minimum(pos, len(self.keys) - 1)
+        found = self.keys[pos] == names
+        return np.where(found, self.key_codes[pos], -1).astype(np.int16)
+
+
+def _by_key(data: dict) -> Dict[str, str]:
+    """{"縣市鄉鎮": "類別"}"""
+    return data
+
+
+def _by_category(data: dict) -> Dict[str, str]:
+    """{"類別": ["縣市鄉鎮", ...]}"""
+    return {key: category for category, keys in data.items() for key in keys}
+
+
+def _county_town(data: dict) -> Dict[str, str]:
+    """{"縣市": ["鄉鎮", ...]}，類別為縣市"""
+    return {county + town: county for county, towns in data.items() for town in towns}
+
+
+# 分類名稱: (檔案, 解析方式)
+SOURCES = {
+    "town_type": (Json.TOWN_TYPE_BY_TOWN, _by_key),
+    "town_type_sp6": (Json.TOWN_TYPE_SP6, _by_key),
+    "town_type_by_type": (Json.TOWN_TYPE_BY_TYPE, _by_category),
+    "no_gas_station": (Json.NO_GAS_STATION_TOWN, _by_category),
+    "county_town": (Json.COUNTY_TOWN, _county_town),
+}
+
+
+def load_classification(name: str, path: Path, parse) -> Classification:
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        mapping = parse(json.load(f))
+    keys = np.array(sorted(mapping), dtype=str)
+    categories, key_codes = np.unique(
+        np.array([mapping[k] for k in keys], dtype=str), return_inverse=True
+    )
+    return Classification(name, mtime, keys, key_codes.reshape(-1), categories)
+
+
+class ReferenceRegistry:
+    """
+    Reference classifications of this process, reloaded when their file changes.
+    """
+
+    def __init__(self, sources: dict = SOURCES, interval: float = Json.RELOAD_INTERVAL):
+        self.sources = sources
+        self.interval = interval
+        self.reloads = 0
+        self._tables: Dict[str, Classification] = {}
+        self._checked: Dict[str, float] = {}
+
+    def get(self, name: str) -> Classification:
+        """
+        Get a classification, reloading it if its file has changed.
+
+        Raises
+        ------
+        KeyError
+            If ``name`` is not a known reference file.
+        """
+        path, parse = self.sources[name]
+        table = self._tables.get(name)
+        now = time.monotonic()
+        if table is not None and now - self._checked[name] < self.interval:
+            return table
+        self._checked[name] = now
+        if table is None or os.stat(path).st_mtime != table.mtime:
+            # 建立完成後才替換，讀取中的請求仍使用舊表
+            self._tables[name] = load_classification(name, path, parse)
+            if table is not None:
+                self.reloads += 1
+        return self._tables[name]
+
+    def town_codes(
+        self, name: str, vintage: Optional[str] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get a classification aligned with the town layer of a vintage.
+
+        The aligned codes are cached on the store of the vintage and rebuilt
+        only when the classification is reloaded.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The category labels, and for every town feature the index of
+            its category (-1 if unclassified).
+        """
+        table = self.get(name)
+        store = get_store(vintage)
+        key = ("reference", name)
+        cached = store.cache.get(key)
+        if cached is None or cached[0] is not table:
+            if ("town_keys",) not in store.cache:
+                town = store.layer("town")
+                store.cache[("town_keys",)] = np.char.add(
+                    town.column("COUNTYNAME"), town.column("TOWNNAME")
+                )
+            cached = (table, table.codes_for(store.cache[("town_keys",)]))
+            store.cache[key] = cached
+        return table.categories, cached[1]
+
+    def check_region(self, region: str) -> str:
+        """
+        Validate a region against the county and town list.
+
+        Parameters
+        ----------
+        region : str
+            A county ("臺北市"), or a county and town ("臺北市中正區" or
+            "臺北市/中正區").
+
+        Returns
+        -------
+        str
+            The region as "縣市" or "縣市鄉鎮".
+
+        Raises
+        ------
+        ValueError
+            If the region is not in ``Json.COUNTY_TOWN``.
+        """
+        table = self.get("county_town")
+        name = region.replace("/", "")
+        if name in table.categories or table.codes_for(np.array([name]))[0] >= 0:
+            return name
+        raise ValueError(f"不存在的縣市或鄉鎮: {region}")
+
+    def stats(self) -> dict:
+        return {
+            "loaded": {name: table.mtime for name, table in self._tables.items()},
+            "reloads": self.reloads,
+        }
+
+
+_registry = ReferenceRegistry()
+
+
+def registry() -> ReferenceRegistry:
+    return _registry
+
+
+def town_codes(name: str, vintage: Optional[str] = None) -> tuple[np.ndarray, np.ndarray]:
+    """見ReferenceRegistry.town_codes"""
+    return _registry.town_codes(name, vintage)
+
+
+def check_region(region: str) -> str:
+    """見ReferenceRegistry.check_region"""
+    return _registry.check_region(region)
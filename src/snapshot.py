@@ -0,0 +1,300 @@
+"""
+地理資料與字體快照
+
+將res/shp各資料版本的圖層轉為NumPy陣列（座標、環/多邊形偏移量、屬性欄位），
+建立鄉鎮圖層的拓樸弧段（見src/topology.py），取出CJK字體的子集（見
+src/fonts.py）並快取字體屬性，讓worker啟動時不必解析shapefile與字體檔。
+縣市圖層由鄉鎮合併而得。
+各版本的快照位於res/snapshot/<版本>/。
+
+建立快照::
+
+    python -m src.snapshot
+"""
+
+import json
+import os
+import string
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from matplotlib import font_manager, ft2font
+from src import dataset
+from src.config import Font, Json, Snapshot
+from src.topology import build_arcs, dissolve_counties
+
+# 縣市圖層由鄉鎮圖層合併而得，兩者的來源都是該版本的鄉鎮界shapefile
+LAYERS = ("county", "town")
+
+VERSION = 3
+
+
+def _source_info(path: Path) -> dict:
+    stat = os.stat(path)
+    return {"path": str(path), "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def read_layer(
+    name: str, vintage: str, town: Optional[gpd.GeoDataFrame] = None
+) -> gpd.GeoDataFrame:
+    """讀取圖層的來源資料，縣市圖層由鄉鎮依縣市合併"""
+    if town is None:
+        town = gpd.read_file(dataset.town_path(vintage))
+    return dissolve_counties(town) if name == "county" else town
+
+
+def build_layer(name: str, gdf: gpd.GeoDataFrame, source: Path, output_dir: Path) -> dict:
+    """將單一圖層寫成NumPy陣列，回傳圖層的描述資訊"""
+    layer_dir = output_dir / name
+    layer_dir.mkdir(parents=True, exist_ok=True)
+
+    geom_type, coords, offsets = shapely.to_ragged_array(gdf.geometry.values)
+    np.save(layer_dir / "coords.npy", np.ascontiguousarray(coords))
+    for i, offset in enumerate(offsets):
+        np.save(layer_dir / f"offsets_{i}.npy", offset)
+    np.save(layer_dir / "bounds.npy", shapely.bounds(gdf.geometry.values))
+
+    columns = [c for c in gdf.columns if c != gdf.geometry.name]
+    for column in columns:
+        np.save(layer_dir / f"col_{column}.npy", gdf[column].to_numpy(dtype=str))
+
+    return {
+        "source": _source_info(source),
+        "geom_type": int(geom_type),
+        "offsets": len(offsets),
+        "columns": columns,
+        "crs": gdf.crs.to_wkt() if gdf.crs else None,
+        "count": len(gdf),
+    }
+
+
+def build_arc_arrays(town: gpd.GeoDataFrame, source: Path, output_dir: Path) -> dict:
+    """將鄉鎮圖層的拓樸弧段寫成NumPy陣列"""
+    arcs_dir = output_dir / "arcs"
+    arcs_dir.mkdir(parents=True, exist_ok=True)
+    arcs = build_arcs(town)
+    issues = {key: arcs.pop(key) for key in ("unmatched", "overshared")}
+    for key, array in arcs.items():
+        np.save(arcs_dir / f"{key}.npy", array)
+    return {"source": _source_info(source), "count": len(arcs["rank"]), **issues}
+
+
+def _collect_chars(value, chars: set):
+    if isinstance(value, str):
+        chars.update(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _collect_chars(k, chars)
+            _collect_chars(v, chars)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_chars(v, chars)
+
+
+def subset_text(json_dir: Path = Json.JSON_DIR) -> str:
+    """子集字體包含的字：ASCII可列印字元、常用全形標點與res/json中所有的字"""
+    chars = set(string.printable) | set("，、。：；（）－—…−")
+    for path in sorted(json_dir.glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            _collect_chars(json.load(f), chars)
+    return "".join(sorted(chars))
+
+
+def _rename_subset(font, suffix: str = " Subset"):
+    """子集的family加上suffix，與完整字體同時註冊時不會混淆"""
+    for record in font["name"].names:
+        if record.nameID in (1, 4, 16):
+            record.string = record.toUnicode() + suffix
+        elif record.nameID == 6:
+            # PostScript名稱不可有空白
+            record.string = record.toUnicode() + suffix.replace(" ", "-")
+
+
+def build_font_subsets(
+    output_dir: Path = Snapshot.FONT_SUBSETS, fonts: Iterable[Path] = Font.SUBSET
+):
+    """將fonts取出subset_text用到的字，寫成<輸出目錄>/<檔名>.subset.<副檔名>"""
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    text = subset_text()
+    options = subset.Options(name_IDs=["*"], name_languages=["*"], notdef_outline=True)
+    for path in fonts:
+        font = TTFont(path)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(text=text)
+        subsetter.subset(font)
+        _rename_subset(font)
+        output = output_dir / f"{path.stem}.subset{path.suffix}"
+        font.save(output)
+        size, subset_size = os.path.getsize(path), os.path.getsize(output)
+        print(f"{path.name}: {size / 1024:,.0f} KB -> {subset_size / 1024:,.0f} KB")
+
+
+def build_fonts(
+    output: Path, font_dirs: Iterable[Path] = (Font.FONT_DIR, Snapshot.FONT_SUBSETS)
+):
+    """快取res/fonts中所有字體與子集字體的屬性，省去啟動時以FreeType解析字體檔"""
+    entries = []
+    for font_dir in font_dirs:
+        for path in sorted(font_dir.glob("*.[ot]tf")):
+            entry = font_manager.ttfFontProperty(ft2font.FT2Font(str(path)))
+            entries.append(asdict(entry))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+
+
+def build_vintage(vintage: str, output_dir: Path = Snapshot.DIR):
+    """建立單一資料版本所有圖層的快照"""
+    vintage_dir = output_dir / vintage
+    vintage_dir.mkdir(parents=True, exist_ok=True)
+    source = dataset.town_path(vintage)
+    meta = {"version": VERSION, "vintage": vintage, "layers": {}}
+    town = gpd.read_file(source)
+    for name in LAYERS:
+        gdf = read_layer(name, vintage, town)
+        meta["layers"][name] = build_layer(name, gdf, source, vintage_dir)
+        print(f"{vintage} {name}: {meta['layers'][name]['count']} 筆")
+    meta["arcs"] = build_arc_arrays(town, source, vintage_dir)
+    print(
+        f"{vintage} arcs: {meta['arcs']['count']} 條"
+        f"（未配對的內部線段{meta['arcs']['unmatched']}條、"
+        f"三環以上共用{meta['arcs']['overshared']}條）"
+    )
+    with open(vintage_dir / Snapshot.META, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def build(output_dir: Path = Snapshot.DIR):
+    """建立所有資料版本與字體的快照"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for vintage in dataset.vintages():
+        build_vintage(vintage, output_dir)
+    build_font_subsets(output_dir / Snapshot.FONT_SUBSETS.name)
+    build_fonts(
+        output_dir / Snapshot.FONTS.name,
+        (Font.FONT_DIR, output_dir / Snapshot.FONT_SUBSETS.name),
+    )
+    print(f"快照已建立: {output_dir}")
+
+
+def _load_meta(vintage: str, snapshot_dir: Path = Snapshot.DIR) -> Optional[dict]:
+    path = snapshot_dir / vintage / Snapshot.META
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return meta if meta.get("version") == VERSION else None
+
+
+def is_fresh(layer: dict) -> bool:
+    """來源shapefile存在且已變更時，快照視為過期"""
+    source = Path(layer["source"]["path"])
+    if not source.exists():
+        return True
+    stat = os.stat(source)
+    return (
+        stat.st_mtime == layer["source"]["mtime"]
+        and stat.st_size == layer["source"]["size"]
+    )
+
+
+def load_arrays(
+    name: str, vintage: str, snapshot_dir: Path = Snapshot.DIR
+) -> Optional[dict]:
+    """
+    Memory-map the arrays of a layer snapshot.
+
+    Returns
+    -------
+    dict or None
+        ``geom_type``, ``coords``, ``offsets``, ``bounds``, ``columns`` and
+        ``crs``, or None if there is no fresh snapshot of the layer.
+    """
+    meta = _load_meta(vintage, snapshot_dir)
+    if meta is None or name not in meta["layers"]:
+        return None
+    layer = meta["layers"][name]
+    if not is_fresh(layer):
+        return None
+
+    layer_dir = snapshot_dir / vintage / name
+    return {
+        "geom_type": shapely.GeometryType(layer["geom_type"]),
+        "coords": np.load(layer_dir / "coords.npy", mmap_mode="r"),
+        "offsets": tuple(
+            np.load(layer_dir / f"offsets_{i}.npy", mmap_mode="r")
+            for i in range(layer["offsets"])
+        ),
+        "bounds": np.load(layer_dir / "bounds.npy", mmap_mode="r"),
+        "columns": {
+            column: np.load(layer_dir / f"col_{column}.npy")
+            for column in layer["columns"]
+        },
+        "crs": layer["crs"],
+    }
+
+
+def load_arcs(vintage: str, snapshot_dir: Path = Snapshot.DIR) -> Optional[dict]:
+    """
+    Memory-map the arc arrays built by ``build_arcs``.
+
+    Returns
+    -------
+    dict or None
+        ``coords``, ``offsets``, ``rank`` and ``bounds``, or None if there
+        is no fresh snapshot of the arcs.
+    """
+    meta = _load_meta(vintage, snapshot_dir)
+    if meta is None or "arcs" not in meta or not is_fresh(meta["arcs"]):
+        return None
+    arcs_dir = snapshot_dir / vintage / "arcs"
+    return {
+        key: np.load(arcs_dir / f"{key}.npy", mmap_mode="r")
+        for key in ("coords", "offsets", "rank", "bounds")
+    }
+
+
+def load_layer(
+    name: str, vintage: str, snapshot_dir: Path = Snapshot.DIR
+) -> Optional[gpd.GeoDataFrame]:
+    """由快照重建圖層的GeoDataFrame，沒有可用快照時回傳None"""
+    arrays = load_arrays(name, vintage, snapshot_dir)
+    if arrays is None:
+        return None
+    geometry = shapely.from_ragged_array(
+        arrays["geom_type"], arrays["coords"], arrays["offsets"]
+    )
+    return gpd.GeoDataFrame(arrays["columns"], geometry=geometry, crs=arrays["crs"])
+
+
+def register_fonts(fonts: Iterable[Path], snapshot_dir: Path = Snapshot.DIR):
+    """
+    註冊字體，優先使用快照中快取的字體屬性
+
+    快取中沒有的字體改以FontManager.addfont解析字體檔
+    """
+    cached = {}
+    path = snapshot_dir / Snapshot.FONTS.name
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            cached = {entry["fname"]: entry for entry in json.load(f)}
+
+    manager = font_manager.fontManager
+    for font in fonts:
+        entry = cached.get(str(font))
+        if entry is None:
+            manager.addfont(font)
+            continue
+        manager.ttflist.append(font_manager.FontEntry(**entry))
+    # 與addfont相同，新增字體後需清除findfont的快取
+    manager._findfont_cached.cache_clear()
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,677 @@
+"""
+圖層幾何的共享儲存
+
+繪圖只需要各子圖中圖徵的頂點位置與縣市/鄉鎮名稱，因此每個圖層在
+store中保存的是：各子圖（AREA_RANGE）內圖徵的float32頂點（已轉換為
+該子圖的axes座標）、Path codes、圖徵偏移量，以及外框與屬性鍵值陣列。
+邊界線則使用鄉鎮圖層的拓樸弧段（"arcs"圖層），每條共用邊界只畫一次。
+主行程把這些陣列放在一塊唯讀的共享記憶體中，worker以名稱連結後直接
+取得陣列的view（不複製），再以此建立matplotlib Path。
+
+完整精度（float64）的幾何只在需要空間運算時才由快照載入。
+
+每個邊界資料版本（見src/dataset.py）各有一個store。預設版本常駐，
+其他版本在第一次使用時載入，並在記憶體預算內依最近使用順序保留。
+"""
+
+import sys
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from matplotlib.path import Path
+from src import dataset, projection, snapshot
+from src.config import Dataset
+from src.topology import build_arcs, gather_ranges
+
+# 陣列在共享記憶體中的對齊位元組數
+ALIGN = 64
+
+# 估計shapely幾何的記憶體：每個頂點16位元組，另加每個幾何物件的額外開銷
+VERTEX_BYTES = 16
+GEOMETRY_BYTES = 112
+
+# 單一區域地圖（見GeometryStore.region）的子圖名稱
+REGION = "region"
+# 區域地圖在區域外框四周保留的邊界，為外框長邊的比例
+REGION_MARGIN = 0.05
+
+
+def path_arrays(geom_type, coords: np.ndarray, offsets: tuple) -> dict:
+    """
+    Derive Path codes and per-feature coordinate ranges from ragged arrays.
+
+    Parameters
+    ----------
+    geom_type : shapely.GeometryType
+        Polygon or MultiPolygon.
+    coords : np.ndarray
+        The (N, 2) coordinates from ``shapely.to_ragged_array``.
+    offsets : tuple
+        The offsets from ``shapely.to_ragged_array``.
+
+    Returns
+    -------
+    dict
+        ``codes`` (N,) uint8 Path codes and ``feature_offsets`` (F + 1,)
+        so that feature ``i`` spans ``coords[feature_offsets[i]:feature_offsets[i + 1]]``.
+    """
+    ring_offsets = np.asarray(offsets[0])
+    if geom_type == shapely.GeometryType.MULTIPOLYGON:
+        feature_offsets = ring_offsets[np.asarray(offsets[1])[np.asarray(offsets[2])]]
+    elif geom_type == shapely.GeometryType.POLYGON:
+        feature_offsets = ring_offsets[np.asarray(offsets[1])]
+    else:
+        raise ValueError(f"不支援的幾何類型: {geom_type!r}")
+
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    codes[ring_offsets[:-1]] = Path.MOVETO
+    codes[ring_offsets[1:] - 1] = Path.CLOSEPOLY
+    return {"codes": codes, "feature_offsets": feature_offsets.astype(np.int64)}
+
+
+def load_layer_arrays(name: str, vintage: str) -> dict:
+    """由快照（或shapefile）取得圖層的所有陣列"""
+    arrays = snapshot.load_arrays(name, vintage)
+    if arrays is None:
+        gdf = snapshot.read_layer(name, vintage)
+        geom_type, coords, offsets = shapely.to_ragged_array(gdf.geometry.values)
+        arrays = {
+            "geom_type": geom_type,
+            "coords": coords,
+            "offsets": offsets,
+            "bounds": shapely.bounds(gdf.geometry.values),
+            "columns": {
+                c: gdf[c].to_numpy(dtype=str)
+                for c in gdf.columns
+                if c != gdf.geometry.name
+            },
+            "crs": gdf.crs.to_wkt() if gdf.crs else None,
+        }
+    return arrays
+
+
+def load_arc_arrays(vintage: str) -> dict:
+    """由快照（或鄉鎮圖層）取得拓樸弧段的陣列"""
+    arcs = snapshot.load_arcs(vintage)
+    if arcs is None:
+        arcs = build_arcs(snapshot.read_layer("town", vintage))
+    return arcs
+
+
+def arc_codes(offsets: np.ndarray) -> np.ndarray:
+    """弧段為開放的折線，只有起點為MOVETO"""
+    codes = np.full(offsets[-1], Path.LINETO, dtype=Path.code_type)
+    codes[offsets[:-1]] = Path.MOVETO
+    return codes
+
+
+def feature_bounds(coords: np.ndarray, feature_offsets: np.ndarray) -> np.ndarray:
+    """由各圖徵的頂點範圍計算外框 (F, 4)"""
+    starts = feature_offsets[:-1]
+    lo = np.minimum.reduceat(coords, starts, axis=0)
+    hi = np.maximum.reduceat(coords, starts, axis=0)
+    return np.hstack([lo, hi])
+
+
+def query_bbox(bounds: np.ndarray, bbox: tuple) -> np.ndarray:
+    """回傳外框與bbox相交的圖徵索引（依原始順序）"""
+    min_x, min_y, max_x, max_y = bbox
+    hit = (
+        (bounds[:, 0] <= max_x)
+        & (bounds[:, 2] >= min_x)
+        & (bounds[:, 1] <= max_y)
+        & (bounds[:, 3] >= min_y)
+    )
+    return np.flatnonzero(hit)
+
+
+def inset_arrays(
+    coords: np.ndarray,
+    codes: np.ndarray,
+    feature_offsets: np.ndarray,
+    bounds: np.ndarray,
+    bbox: tuple,
+) -> dict:
+    """
+    Gather the features of one inset as compact render arrays.
+
+    Vertices are transformed into the inset's axes coordinates (0-1 over
+    the inset bounds) and stored as float32, which is far below pixel
+    precision at the output DPI.
+    """
+    min_x, min_y, max_x, max_y = bbox
+    fids = query_bbox(bounds, bbox)
+
+    starts = feature_offsets[fids]
+    lengths = feature_offsets[fids + 1] - starts
+    # 各圖徵的頂點範圍在原陣列中是連續的，一次取出所有頂點
+    vertex_idx = gather_ranges(starts, lengths)
+
+    scale = np.array([max_x - min_x, max_y - min_y])
+    vertices = (coords[vertex_idx] - (min_x, min_y)) / scale
+    return {
+        "fids": fids.astype(np.int32),
+        "vertices": vertices.astype(np.float32),
+        "codes": codes[vertex_idx],
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+    }
+
+
+class LayerView:
+    """單一圖層的陣列view，提供bbox查詢、子圖Path與shapely幾何的建立"""
+
+    def __init__(
+        self,
+        name: str,
+        vintage: str,
+        arrays: Dict[str, np.ndarray],
+        crs: Optional[str],
+    ):
+        self.name = name
+        self.vintage = vintage
+        self.arrays = arrays
+        self.crs = crs
+
+    @property
+    def columns(self) -> list:
+        return [k[len("col_"):] for k in self.arrays if k.startswith("col_")]
+
+    def __len__(self) -> int:
+        return len(self.arrays["bounds"])
+
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[f"col_{name}"]
+
+    def query_bbox(self, bbox: tuple) -> np.ndarray:
+        return query_bbox(self.arrays["bounds"], bbox)
+
+    def inset_fids(self, area: str) -> np.ndarray:
+        """子圖中的圖徵索引（遞增排序）"""
+        return self.arrays[f"inset/{area}/fids"]
+
+    def inset_paths(
+        self, area: str, fids: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, list]:
+        """
+        Build the Paths of the features of an inset, in axes coordinates.
+
+        Parameters
+        ----------
+        area : str
+            The inset name, a key of ``FigConfig.AREA_RANGE``.
+        fids : np.ndarray, optional
+            Feature indices to draw, in this order; all features of the
+            inset when omitted. Indices outside the inset are skipped.
+
+        Returns
+        -------
+        tuple[np.ndarray, list]
+            The feature indices actually drawn and their Paths.
+        """
+        prefix = f"inset/{area}/"
+        vertices = self.arrays[prefix + "vertices"]
+        codes = self.arrays[prefix + "codes"]
+        offsets = self.arrays[prefix + "offsets"]
+        inset_fids = self.arrays[prefix + "fids"]
+
+        local = self._inset_local(inset_fids, fids)
+        paths = [
+            Path(vertices[offsets[i]:offsets[i + 1]], codes[offsets[i]:offsets[i + 1]])
+            for i in local
+        ]
+        return inset_fids[local], paths
+
+    def inset_path(self, area: str, fids: Optional[np.ndarray] = None) -> Path:
+        """
+        Build one compound Path of the features of an inset, in axes coordinates.
+
+        Drawing many features as a single Path avoids the per-path overhead
+        of a collection. When ``fids`` is a contiguous range of the inset
+        (e.g. one arc rank), the Path is a view of the shared arrays.
+        """
+        prefix = f"inset/{area}/"
+        vertices = self.arrays[prefix + "vertices"]
+        codes = self.arrays[prefix + "codes"]
+        offsets = self.arrays[prefix + "offsets"]
+
+        local = self._inset_local(self.arrays[prefix + "fids"], fids)
+        if len(local) == 0:
+            return Path(np.empty((0, 2), dtype=np.float32))
+        if local[-1] - local[0] + 1 == len(local):
+            start, stop = offsets[local[0]], offsets[local[-1] + 1]
+            return Path(vertices[start:stop], codes[start:stop])
+        starts = offsets[local]
+        idx = gather_ranges(starts, offsets[local + 1] - starts)
+        return Path(vertices[idx], codes[idx])
+
+    @staticmethod
+    def _inset_local(inset_fids: np.ndarray, fids: Optional[np.ndarray]) -> np.ndarray:
+        """將圖徵索引轉為子圖陣列中的位置，略過不在子圖中的圖徵"""
+        if fids is None:
+            return np.arange(len(inset_fids))
+        fids = np.asarray(fids)
+        local = np.searchsorted(inset_fids, fids)
+        found = local < len(inset_fids)
+        found[found] = inset_fids[local[found]] == fids[found]
+        return local[found]
+
+    def geometries(self) -> np.ndarray:
+        """由快照載入完整精度的shapely幾何（只在需要空間運算時使用）"""
+        arrays = load_layer_arrays(self.name, self.vintage)
+        return shapely.from_ragged_array(
+            arrays["geom_type"], arrays["coords"], arrays["offsets"]
+        )
+
+    def to_gdf(self) -> gpd.GeoDataFrame:
+        return gpd.GeoDataFrame(
+            {c: self.column(c) for c in self.columns},
+            geometry=self.geometries(),
+            crs=self.crs,
+        )
+
+
+def _geometry_nbytes(geoms: np.ndarray) -> int:
+    geoms = geoms[shapely.is_geometry(geoms)]
+    return len(geoms) * GEOMETRY_BYTES + VERTEX_BYTES * int(
+        shapely.get_num_coordinates(geoms).sum()
+    )
+
+
+def cache_nbytes(value, seen: Optional[set] = None) -> int:
+    """
+    Estimate the memory held by a cached object.
+
+    Arrays count their buffers, DataFrames their columns and shapely
+    geometries their vertices; containers and plain objects (e.g. a
+    ``TownIndex``) are walked recursively, counting each object once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + _geometry_nbytes(value)
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        size = int(value.memory_usage(deep=True).sum())
+        if isinstance(value, gpd.GeoDataFrame):
+            size += _geometry_nbytes(np.asarray(value.geometry.values))
+        return size
+    if isinstance(value, dict):
+        return sum(cache_nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(cache_nbytes(v, seen) for v in value)
+    if isinstance(value, shapely.Geometry):
+        return _geometry_nbytes(np.array([value]))
+    if hasattr(value, "__dict__"):
+        return cache_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class GeometryStore:
+    """
+    Render arrays of every layer, optionally backed by shared memory.
+
+    ``create`` copies the arrays into one shared-memory segment and returns
+    a picklable manifest; ``attach`` maps that segment in another process
+    and exposes read-only views of the same arrays.
+
+    ``cache`` holds objects derived from this vintage (e.g. GeoDataFrames
+    with their spatial index), so they are dropped together with it and
+    count towards its ``nbytes``.
+    """
+
+    def __init__(
+        self,
+        vintage: str,
+        layers: Dict[str, LayerView],
+        shm=None,
+        owner: bool = False,
+    ):
+        self.vintage = vintage
+        self.layers = layers
+        self.shm = shm
+        self.owner = owner
+        self.cache = {}
+
+    def layer(
+        self, name: str, crs: Optional[str] = None, region: Optional[str] = None
+    ) -> LayerView:
+        """
+        Get the render arrays of a layer.
+
+        Parameters
+        ----------
+        name : str
+            "county", "town" or "arcs".
+        crs : str, optional
+            A projected CRS to render in (see ``projected``); the
+            longitude/latitude layers when omitted.
+        region : str, optional
+            A county or county+town name; the layer then has the single
+            inset ``REGION`` covering it (see ``region``).
+        """
+        if region is not None:
+            return self.region(region, crs)[name]
+        if crs is None:
+            return self.layers[name]
+        return self.projected(crs)[name]
+
+    def projected(self, crs: str) -> Dict[str, LayerView]:
+        """
+        The layers reprojected to a CRS, built on first use.
+
+        Reprojected layers live in this process only (not in shared
+        memory) and are cached in ``cache`` per CRS, so they are dropped
+        together with the vintage. At most ``Dataset.PROJECTED_CACHE``
+        CRSs are kept; the least recently used one is dropped first,
+        together with its rasters.
+        """
+
+        def build():
+            names = [name for name in self.layers if name != "arcs"]
+            return {
+                name: LayerView(name, self.vintage, info["arrays"], info["crs"])
+                for name, info in self._collect(self.vintage, names, crs).items()
+            }
+
+        return self._cached(("projected", crs), build, Dataset.PROJECTED_CACHE)
+
+    def region_bounds(self, region: str, crs: Optional[str] = None) -> dict:
+        """
+        The extent of a single-region map, from the cached town bounds.
+
+        Parameters
+        ----------
+        region : str
+            A county name ("臺北市"), or a county and town name
+            ("臺北市中正區").
+        crs : str, optional
+            A projected CRS to render in.
+
+        Returns
+        -------
+        dict
+            ``{"min_x", "max_x", "min_y", "max_y"}`` of the towns of the
+            region, with a margin of ``REGION_MARGIN`` on every side.
+
+        Raises
+        ------
+        ValueError
+            If no town of this vintage is in the region.
+        """
+        town = self.layers["town"]
+        county = town.column("COUNTYNAME")
+        hit = (county == region) | (np.char.add(county, town.column("TOWNNAME")) == region)
+        if not hit.any():
+            raise ValueError(f"資料版本{self.vintage}中沒有此區域: {region}")
+        b = town.arrays["bounds"][hit]
+        min_x, min_y = b[:, 0].min(), b[:, 1].min()
+        max_x, max_y = b[:, 2].max(), b[:, 3].max()
+        if crs is not None:
+            min_x, min_y, max_x, max_y = projection.transformer(
+                projection.WGS84, crs
+            ).transform_bounds(min_x, min_y, max_x, max_y, densify_pts=projection.DENSIFY)
+        margin = max(max_x - min_x, max_y - min_y) * REGION_MARGIN
+        return {
+            "min_x": float(min_x - margin),
+            "max_x": float(max_x + margin),
+            "min_y": float(min_y - margin),
+            "max_y": float(max_y + margin),
+        }
+
+    def region(self, region: str, crs: Optional[str] = None) -> Dict[str, LayerView]:
+        """
+        The layers of a single-region map, built on first use.
+
+        Each layer has one inset, ``REGION``, covering ``region_bounds``;
+        only the features whose bounds intersect it are gathered. Like
+        ``projected``, the layers live in this process only and are cached
+        in ``cache``, at most ``Dataset.REGION_CACHE`` regions and CRSs.
+        """
+
+        def build():
+            names = [name for name in self.layers if name != "arcs"]
+            areas = {REGION: self.region_bounds(region, crs)}
+            return {
+                name: LayerView(name, self.vintage, info["arrays"], info["crs"])
+                for name, info in self._collect(self.vintage, names, crs, areas).items()
+            }
+
+        return self._cached(("region", region, crs), build, Dataset.REGION_CACHE)
+
+    def _cached(self, key: tuple, build, size: int):
+        """
+        Get a cache entry, building it on first use.
+
+        Entries of the same kind (``key[0]``) are kept in least recently
+        used order and at most ``size`` of them are kept.
+        """
+        value = self.cache.pop(key, None)
+        if value is None:
+            value = build()
+        self.cache[key] = value
+        same = [k for k in self.cache if k[0] == key[0]]
+        for old in same[: -max(size, 1)]:
+            self.cache.pop(old, None)
+            if old[0] == "projected":
+                # 該投影的圖徵編號點陣（見src/raster.py）一併移除
+                for k in [k for k in self.cache if k[0] == "raster" and k[-1] == old[1]]:
+                    self.cache.pop(k, None)
+        return value
+
+    @staticmethod
+    def _insets(
+        coords, codes, feature_offsets, bounds, areas: Dict[str, dict]
+    ) -> Dict[str, np.ndarray]:
+        flat = {"bounds": bounds}
+        for area, b in areas.items():
+            bbox = (b["min_x"], b["min_y"], b["max_x"], b["max_y"])
+            arrays = inset_arrays(coords, codes, feature_offsets, bounds, bbox)
+            for key, value in arrays.items():
+                flat[f"inset/{area}/{key}"] = value
+        return flat
+
+    @classmethod
+    def _collect(
+        cls,
+        vintage: str,
+        names,
+        crs: Optional[str] = None,
+        areas: Optional[Dict[str, dict]] = None,
+    ) -> Dict[str, dict]:
+        """
+        Build the render arrays of every layer and the arcs.
+
+        With ``crs``, vertices are reprojected from longitude/latitude. The
+        insets cover ``areas`` (in ``crs``), by default
+        ``projection.area_bounds(crs)``.
+        """
+        if areas is None:
+            areas = projection.area_bounds(crs)
+
+        def project(coords, offsets, bounds):
+            if crs is None:
+                return coords, np.asarray(bounds, dtype=np.float64)
+            coords = np.column_stack(projection.from_lonlat(coords[:, 0], coords[:, 1], crs))
+            return coords, feature_bounds(coords, offsets)
+
+        collected = {}
+        for name in names:
+            arrays = load_layer_arrays(name, vintage)
+            coords = np.asarray(arrays["coords"])
+            paths = path_arrays(arrays["geom_type"], coords, arrays["offsets"])
+            coords, bounds = project(coords, paths["feature_offsets"], arrays["bounds"])
+            flat = cls._insets(
+                coords, paths["codes"], paths["feature_offsets"], bounds, areas
+            )
+            for column, values in arrays["columns"].items():
+                flat[f"col_{column}"] = np.asarray(values)
+            # LayerView.crs描述geometries()載入的原始幾何，投影只影響子圖陣列
+            collected[name] = {"crs": arrays["crs"], "arrays": flat}
+
+        # 鄉鎮圖層的拓樸弧段，供繪製邊界線
+        arcs = load_arc_arrays(vintage)
+        offsets = np.asarray(arcs["offsets"])
+        rank = np.asarray(arcs["rank"])
+        coords, bounds = project(np.asarray(arcs["coords"]), offsets, arcs["bounds"])
+        flat = cls._insets(coords, arc_codes(offsets), offsets, bounds, areas)
+        flat["col_rank"] = rank
+        collected["arcs"] = {"crs": None, "arrays": flat}
+        return collected
+
+    @classmethod
+    def load(cls, vintage: str, names=snapshot.LAYERS) -> "GeometryStore":
+        """在目前行程內載入（不使用共享記憶體）"""
+        layers = {
+            name: LayerView(name, vintage, info["arrays"], info["crs"])
+            for name, info in cls._collect(vintage, names).items()
+        }
+        return cls(vintage, layers)
+
+    @classmethod
+    def create(cls, vintage: str, names=snapshot.LAYERS) -> tuple["GeometryStore", dict]:
+        """
+        Copy every layer into a new shared-memory segment.
+
+        Returns
+        -------
+        tuple[GeometryStore, dict]
+            The owning store and the manifest to pass to ``attach``.
+        """
+        collected = cls._collect(vintage, names)
+        size = 0
+        for info in collected.values():
+            for array in info["arrays"].values():
+                size += -(-array.nbytes // ALIGN) * ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+        manifest = {"name": shm.name, "vintage": vintage, "layers": {}}
+        pos = 0
+        for name, info in collected.items():
+            entries = {}
+            for key, array in info["arrays"].items():
+                view = np.ndarray(array.shape, array.dtype, buffer=shm.buf, offset=pos)
+                view[...] = array
+                entries[key] = (pos, array.dtype.str, array.shape)
+                pos += -(-array.nbytes // ALIGN) * ALIGN
+            manifest["layers"][name] = {"crs": info["crs"], "arrays": entries}
+        return cls._from_manifest(shm, manifest, owner=True), manifest
+
+    @classmethod
+    def attach(cls, manifest: dict) -> "GeometryStore":
+        """連結主行程建立的共享記憶體"""
+        shm = shared_memory.SharedMemory(name=manifest["name"])
+        return cls._from_manifest(shm, manifest, owner=False)
+
+    @classmethod
+    def _from_manifest(cls, shm, manifest: dict, owner: bool) -> "GeometryStore":
+        layers = {}
+        for name, info in manifest["layers"].items():
+            arrays = {}
+            for key, (pos, dtype, shape) in info["arrays"].items():
+                view = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=pos)
+                view.flags.writeable = False
+                arrays[key] = view
+            layers[name] = LayerView(name, manifest["vintage"], arrays, info["crs"])
+        return cls(manifest["vintage"], layers, shm=shm, owner=owner)
+
+    def nbytes(self) -> int:
+        """圖層陣列加上cache中衍生物件的估計大小"""
+        return sum(
+            array.nbytes for view in self.layers.values() for array in view.arrays.values()
+        ) + cache_nbytes(self.cache)
+
+    def close(self):
+        """釋放共享記憶體；建立者同時移除該記憶體區段"""
+        self.cache = {}
+        if self.shm is None:
+            return
+        # 先移除所有view，才能關閉共享記憶體
+        self.layers = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+class StoreRegistry:
+    """
+    The stores of the boundary vintages used by this process.
+
+    The default vintage is pinned: workers attach it from shared memory,
+    otherwise it is loaded on first use. Other vintages are loaded on first
+    use and the least recently used ones are evicted once the total size
+    exceeds ``budget_mb``.
+    """
+
+    def __init__(self, budget_mb: int):
+        self.budget = budget_mb * 1024 * 1024
+        self.default: Optional[str] = None
+        self.evicted = 0
+        self._stores: "OrderedDict[str, GeometryStore]" = OrderedDict()
+
+    def set(self, store: GeometryStore):
+        """設定常駐的預設版本store"""
+        old = self._stores.pop(store.vintage, None)
+        if old is not None and old is not store:
+            old.close()
+        self.default = store.vintage
+        self._stores[store.vintage] = store
+
+    def get(self, vintage: Optional[str] = None) -> GeometryStore:
+        if vintage is None:
+            vintage = self.default or dataset.latest()
+        store = self._stores.get(vintage)
+        if store is None:
+            store = GeometryStore.load(dataset.resolve(vintage))
+            self._stores[vintage] = store
+            if self.default is None:
+                self.default = vintage
+            self._evict(keep=vintage)
+        self._stores.move_to_end(vintage)
+        return store
+
+    def _evict(self, keep: str):
+        for vintage in list(self._stores):
+            if self.nbytes() <= self.budget:
+                break
+            if vintage in (keep, self.default):
+                continue
+            self._stores.pop(vintage).close()
+            self.evicted += 1
+
+    def nbytes(self) -> int:
+        return sum(store.nbytes() for store in self._stores.values())
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default,
+            "loaded": list(self._stores),
+            "memory_mb": round(self.nbytes() / 1024 / 1024, 1),
+            "budget_mb": self.budget // 1024 // 1024,
+            "evicted": self.evicted,
+        }
+
+
+# 目前行程使用的store，worker的預設版本由attach設定
+_registry = StoreRegistry(Dataset.MEMORY_MB)
+
+
+def set_store(store: GeometryStore):
+    _registry.set(store)
+
+
+def get_store(vintage: Optional[str] = None) -> GeometryStore:
+    """取得資料版本的store，未指定時為預設版本"""
+    return _registry.get(vintage)
+
+
+def registry() -> StoreRegistry:
+    return _registry
@@ -0,0 +1,161 @@
+"""
+可重複使用的底圖figure
+
+每個請求都要建立一張14.65x16的figure、7個子圖（範圍、長寬比、外框），
+分層設色圖另外建立色條的axes，繪圖完成後全部丟棄。這裡在各行程中保留
+建好的底圖，依版面（投影、單一區域、有無色條或圖例）區分：
+
+- 請求取出（checkout）一張底圖，只加入自己的圖徵、點或影像
+- fig_to_image輸出後歸還（release），移除請求加入的元素、還原子圖範圍，
+  底圖放回池中給下一個相同版面的請求
+
+底圖不經過pyplot建立，plt.close("all")不會關閉池中的figure；取出後發生
+例外而未歸還的底圖直接被回收，不影響池。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional
+
+import matplotlib.pyplot as plt
+from matplotlib.colorbar import Colorbar
+from src.config import Templates
+
+
+class Template:
+    """
+    A prebuilt figure and the state to restore it to after a request.
+
+    Parameters
+    ----------
+    key : Hashable
+        The layout variant of the figure.
+    fig, ax : plt.Figure, plt.Axes
+        The figure and its main axes, with the insets as child axes.
+    colorbar : Colorbar, optional
+        The colorbar of a "colorbar" variant; requests update its mappable.
+    """
+
+    def __init__(
+        self,
+        key: Hashable,
+        fig: plt.Figure,
+        ax: plt.Axes,
+        colorbar: Optional[Colorbar] = None,
+    ):
+        self.key = key
+        self.fig = fig
+        self.ax = ax
+        self.colorbar = colorbar
+        self.axes = list(fig.axes)
+        # 色條的內容由Colorbar自行管理，不列入還原；子圖是主圖的child_axes
+        cax = colorbar.ax if colorbar is not None else None
+        self._state = [
+            (a, set(a.get_children()), a.get_xlim(), a.get_ylim(), a.legend_)
+            for a in self.axes + [c for a in self.axes for c in a.child_axes]
+            if a is not cax
+        ]
+        fig._template = self
+
+    def reset(self):
+        """移除建立底圖之後加入的元素，還原各子圖的範圍與圖例"""
+        for a in self.fig.axes:
+            if a not in self.axes:
+                self.fig.delaxes(a)
+        for a, children, xlim, ylim, legend in self._state:
+            for artist in a.get_children():
+                if artist not in children:
+                    artist.remove()
+            a.legend_ = legend
+            if a.get_xlim() != xlim:
+                a.set_xlim(xlim)
+            if a.get_ylim() != ylim:
+                a.set_ylim(ylim)
+        for text in list(self.fig.texts):
+            text.remove()
+        for legend in list(self.fig.legends):
+            legend.remove()
+        # Agg canvas保留的繪圖緩衝區（約數十MB）不隨底圖留在池中
+        self.fig.canvas.__dict__.pop("renderer", None)
+        self.fig.canvas.__dict__.pop("_lastKey", None)
+
+
+class FigurePool:
+    """
+    Idle template figures of this process, by layout variant.
+
+    At most ``size`` idle figures are kept; the least recently used
+    variant is dropped first.
+    """
+
+    def __init__(self, size: int = Templates.SIZE):
+        self.size = size
+        self._idle: "OrderedDict[Hashable, List[Template]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def checkout(self, key: Hashable, build: Callable[[], tuple]) -> Template:
+        """
+        Take an idle figure of a layout variant, or build one.
+
+        Parameters
+        ----------
+        key : Hashable
+            The layout variant.
+        build : Callable[[], tuple]
+            Builds ``(fig, ax)`` or ``(fig, ax, colorbar)`` of the variant.
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.hits += 1
+                self._idle.move_to_end(key)
+                return idle.pop()
+            self.misses += 1
+        return Template(key, *build())
+
+    def release(self, template: Template):
+        """還原底圖並放回池中，超過size時捨棄最久未使用版面的底圖"""
+        if self.size <= 0:
+            return
+        template.reset()
+        with self._lock:
+            self._idle.setdefault(template.key, []).append(template)
+            self._idle.move_to_end(template.key)
+            while sum(len(v) for v in self._idle.values()) > self.size:
+                key, idle = next(iter(self._idle.items()))
+                idle.pop(0)
+                if not idle:
+                    del self._idle[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": sum(len(v) for v in self._idle.values()),
+                "variants": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_pool = FigurePool()
+
+
+def pool() -> FigurePool:
+    return _pool
+
+
+def colorbar(fig: plt.Figure) -> Optional[Colorbar]:
+    """底圖預先建立的色條，沒有時為None"""
+    template: Optional[Template] = getattr(fig, "_template", None)
+    return template.colorbar if template is not None else None
+
+
+def release(fig: plt.Figure) -> bool:
+    """將底圖figure歸還池中，不是底圖時回傳False"""
+    template: Optional[Template] = getattr(fig, "_template", None)
+    if template is None:
+        return False
+    _pool.release(template)
+    return True
@@ -0,0 +1,215 @@
+"""
+鄉鎮圖層的拓樸
+
+相鄰鄉鎮共用的邊界在兩個多邊形中各出現一次，若逐一描繪多邊形外框，
+每條內部邊界都會被畫兩次，縣市界又會再疊在鄉鎮界上。這裡由鄉鎮圖層
+拆出弧段（arc）：每條共用邊界只保留一次，並依兩側所屬縣市分級，
+縣市界（含海岸線）為ARC_COUNTY，同一縣市內的鄉鎮界為ARC_TOWN。
+
+共用邊界在兩側的頂點不一定相同（一側多了頂點），比對前先將落在其他
+環線段上的頂點插入該線段（noding），兩側才會拆成相同的線段。仍未配對
+的內部線段與三個以上的環共用的線段會計數並發出警告。
+縣市多邊形則由鄉鎮依縣市合併（dissolve）而得，不需另外讀取縣市圖層。
+"""
+
+import warnings
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+# 弧段等級
+ARC_COUNTY = 0
+ARC_TOWN = 1
+
+# 比對共用頂點時的座標精度（經緯度小數位數）
+PRECISION = 7
+
+COUNTY_COLUMNS = ["COUNTYID", "COUNTYCODE", "COUNTYNAME"]
+
+
+def dissolve_counties(town: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """依COUNTYNAME合併鄉鎮，得到縣市多邊形"""
+    county = town[COUNTY_COLUMNS + [town.geometry.name]].dissolve(
+        by="COUNTYNAME", as_index=False, aggfunc="first"
+    )
+    return county[COUNTY_COLUMNS + [county.geometry.name]]
+
+
+def gather_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """展開多個連續範圍[start, start + length)的索引"""
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(
+        lengths.sum()
+    )
+
+
+def node_rings(coords: np.ndarray, ring_offsets: np.ndarray) -> tuple:
+    """
+    Insert into every segment the vertices of other rings that lie on it.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        (N, 2) vertices of all rings.
+    ring_offsets : np.ndarray
+        (R + 1,) so that ring ``i`` spans
+        ``coords[ring_offsets[i]:ring_offsets[i + 1]]``.
+
+    Returns
+    -------
+    tuple
+        The noded ``(coords, ring_offsets)``; the inserted vertices are
+        copies of the existing ones, so both sides of a shared edge end
+        up with the same vertices.
+    """
+    is_start = np.ones(len(coords), dtype=bool)
+    is_start[ring_offsets[1:] - 1] = False
+    seg = np.flatnonzero(is_start)
+    quantized = np.round(coords * 10**PRECISION).astype(np.int64)
+    _, first = np.unique(quantized, axis=0, return_index=True)
+
+    segments = shapely.linestrings(np.stack([coords[seg], coords[seg + 1]], axis=1))
+    tree = shapely.STRtree(segments)
+    point, hit = tree.query(
+        shapely.points(coords[first]), predicate="dwithin", distance=10**-PRECISION
+    )
+    vertex, start = first[point], seg[hit]
+    # 略過線段本身的端點
+    inner = np.any(quantized[vertex] != quantized[start], axis=1) & np.any(
+        quantized[vertex] != quantized[start + 1], axis=1
+    )
+    vertex, start = vertex[inner], start[inner]
+    if len(vertex) == 0:
+        return coords, ring_offsets
+
+    a, b = coords[start], coords[start + 1]
+    t = np.einsum("ij,ij->i", coords[vertex] - a, b - a) / np.einsum(
+        "ij,ij->i", b - a, b - a
+    )
+    # 各線段起點t = 0，插入的頂點依t排在起點之後
+    key = np.concatenate([np.arange(len(coords)), start])
+    order = np.lexsort((np.concatenate([np.zeros(len(coords)), t]), key))
+    noded = np.concatenate([coords, coords[vertex]])[order]
+    inserted = np.sort(start)
+    ring_offsets = ring_offsets + np.searchsorted(inserted, ring_offsets, side="left")
+    return noded, ring_offsets
+
+
+def build_arcs(town: gpd.GeoDataFrame) -> dict:
+    """
+    Extract the arcs of the town layer.
+
+    The rings are noded first (see ``node_rings``), then split into
+    segments; a segment shared by two towns is kept only from the town
+    with the smaller index. Consecutive kept
+    segments of a ring with the same neighbor form one arc, and arcs of
+    the same rank are then merged where exactly two of them meet, so a
+    county line is stroked as one polyline across town junctions.
+
+    Parameters
+    ----------
+    town : gpd.GeoDataFrame
+        The town layer, with a COUNTYNAME column.
+
+    Returns
+    -------
+    dict
+        ``coords`` (N, 2), ``offsets`` (A + 1,) so that arc ``i`` spans
+        ``coords[offsets[i]:offsets[i + 1]]``, ``rank`` (A,) and
+        ``bounds`` (A, 4). County arcs come first. ``unmatched`` counts
+        the segments without a neighbor that still lie on another town's
+        boundary, and ``overshared`` the segments shared by three or more
+        rings; both are drawn as county lines.
+    """
+    geom_type, coords, offsets = shapely.to_ragged_array(town.geometry.values)
+    coords, ring_offsets = node_rings(coords, np.asarray(offsets[0]))
+    if geom_type == shapely.GeometryType.MULTIPOLYGON:
+        feature_rings = np.asarray(offsets[1])[np.asarray(offsets[2])]
+    else:
+        feature_rings = np.asarray(offsets[1])
+    ring_feature = np.repeat(np.arange(len(town)), np.diff(feature_rings))
+    _, county = np.unique(town["COUNTYNAME"].to_numpy(dtype=str), return_inverse=True)
+
+    # 線段以起點索引表示，略過各環的最後一點與長度為0的線段
+    quantized = np.round(coords * 10**PRECISION).astype(np.int64)
+    is_start = np.ones(len(coords), dtype=bool)
+    is_start[ring_offsets[1:] - 1] = False
+    seg = np.flatnonzero(is_start)
+    seg = seg[np.any(quantized[seg] != quantized[seg + 1], axis=1)]
+    seg_ring = np.searchsorted(ring_offsets, seg, side="right") - 1
+    seg_feature = ring_feature[seg_ring]
+
+    # 以無方向的端點組合找出共用線段
+    a, b = quantized[seg], quantized[seg + 1]
+    swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+    keys = np.where(swap[:, None], np.hstack([b, a]), np.hstack([a, b]))
+    _, inverse, counts = np.unique(
+        keys, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    group_start = np.concatenate([[0], np.cumsum(counts)[:-1]])[counts == 2]
+    neighbor = np.full(len(seg), -1)
+    neighbor[order[group_start]] = seg_feature[order[group_start + 1]]
+    neighbor[order[group_start + 1]] = seg_feature[order[group_start]]
+    overshared = int(np.count_nonzero(counts > 2))
+
+    # 沒有鄰居、卻落在其他鄉鎮邊界上的線段表示共用邊界未能配對
+    lonely = np.flatnonzero((neighbor == -1) & (counts[inverse] <= 2))
+    index, hit = shapely.STRtree(town.geometry.boundary.values).query(
+        shapely.points((coords[seg[lonely]] + coords[seg[lonely] + 1]) / 2),
+        predicate="dwithin",
+        distance=10**-PRECISION,
+    )
+    unmatched = len(np.unique(index[hit != seg_feature[lonely[index]]]))
+    if unmatched or overshared:
+        warnings.warn(
+            f"鄉鎮圖層有{unmatched}條未配對的內部線段、"
+            f"{overshared}條由三個以上的環共用的線段，將以縣市界繪製"
+        )
+
+    # 同一環中相鄰且鄰居相同的線段合為一條弧段
+    run_start = np.flatnonzero(
+        np.concatenate(
+            [[True], (seg_ring[1:] != seg_ring[:-1]) | (neighbor[1:] != neighbor[:-1])]
+        )
+    )
+    run_length = np.diff(np.append(run_start, len(seg)))
+    own, other = seg_feature[run_start], neighbor[run_start]
+    keep = (other == -1) | (own < other)
+    rank = np.where(
+        (other == -1) | (county[own] != county[np.maximum(other, 0)]),
+        ARC_COUNTY,
+        ARC_TOWN,
+    ).astype(np.uint8)
+
+    run_start, run_length, rank = run_start[keep], run_length[keep], rank[keep]
+
+    # 弧段頂點為各線段起點，再加上最後一段的終點
+    vertex = seg[gather_ranges(run_start, run_length)]
+    ends = seg[run_start + run_length - 1] + 1
+    vertex = np.insert(vertex, np.cumsum(run_length), ends)
+    lines = shapely.from_ragged_array(
+        shapely.GeometryType.LINESTRING,
+        coords[vertex],
+        (np.concatenate([[0], np.cumsum(run_length + 1)]),),
+    )
+
+    # 同等級的弧段在只有兩條交會的節點相接，合為一條折線
+    merged = []
+    for r in (ARC_COUNTY, ARC_TOWN):
+        parts = shapely.get_parts(
+            shapely.line_merge(shapely.multilinestrings(lines[rank == r]))
+        )
+        merged.append((parts, np.full(len(parts), r, dtype=np.uint8)))
+    arcs = np.concatenate([parts for parts, _ in merged])
+    _, arc_coords, (arc_offsets,) = shapely.to_ragged_array(arcs)
+
+    return {
+        "coords": np.ascontiguousarray(arc_coords),
+        "offsets": np.asarray(arc_offsets, dtype=np.int64),
+        "rank": np.concatenate([r for _, r in merged]),
+        "bounds": shapely.bounds(arcs),
+        "unmatched": unmatched,
+        "overshared": overshared,
+    }
@@ -0,0 +1,200 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+from typing import List, Optional
+
+import psutil
+
+# worker行程內的Graph實例，由_init_worker建立
+_graph = None
+
+
+def _init_worker(manifest: Optional[dict] = None, png_threads: Optional[int] = None):
+    global _graph
+    from src.config import Png
+    from src.graph import Graph
+    from src.store import GeometryStore, set_store
+
+    if png_threads is not None and "PNG_THREADS" not in os.environ:
+        # 未指定PNG_THREADS時，依池的大小將CPU平分給各worker
+        Png.THREADS = png_threads
+    if manifest is not None:
+        # 連結主行程建立的共享幾何資料，不另外載入圖層
+        set_store(GeometryStore.attach(manifest))
+    _graph = Graph()
+    _graph.warm_up()
+
+
+def _ping() -> int:
+    """觸發worker行程啟動，回傳其RSS"""
+    return psutil.Process().memory_info().rss
+
+
+def _render(method: str, args: tuple) -> tuple[bytes, int]:
+    """在worker行程內繪圖，回傳PNG內容與繪圖後的RSS"""
+    from src.graph import fig_to_image
+
+    fig, _ = getattr(_graph, method)(*args)
+    img = fig_to_image(fig).getvalue()
+    return img, psutil.Process().memory_info().rss
+
+
+class RenderWorker:
+    """單一繪圖worker，擁有自己的行程與請求統計"""
+
+    def __init__(
+        self,
+        worker_id: int,
+        mp_context,
+        manifest: Optional[dict] = None,
+        png_threads: Optional[int] = None,
+    ):
+        self.id = worker_id
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(manifest, png_threads),
+        )
+        self.in_flight = 0
+        self.requests = 0
+        self.rss = 0
+        self.ready = False
+        self.draining = False
+
+    async def start(self):
+        self.rss = await asyncio.wrap_future(self.executor.submit(_ping))
+        self.ready = True
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "rss_mb": round(self.rss / 1024 / 1024, 1),
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "ready": self.ready,
+            "draining": self.draining,
+        }
+
+
+class RenderPool:
+    """
+    Supervisor of render worker processes.
+
+    Each worker runs in its own process and reports its RSS after every
+    render. A worker above ``max_rss_mb`` or ``max_requests`` stops
+    receiving new requests, a replacement is started, and the old process
+    is shut down once its in-flight requests have finished.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_rss_mb: int,
+        max_requests: int,
+        manifest: Optional[dict] = None,
+    ):
+        self.size = size
+        self.manifest = manifest
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.max_requests = max_requests
+        self.workers: List[RenderWorker] = []
+        self.recycled = 0
+        self._ids = count()
+        # 使用spawn，避免在已有事件迴圈與執行緒的行程中fork
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._tasks = set()
+
+    def start(self) -> asyncio.Future:
+        """建立所有worker，回傳全部預熱完成時結束的future"""
+        self.workers = [self._new_worker() for _ in range(self.size)]
+        return asyncio.gather(*(w.start() for w in self.workers))
+
+    async def shutdown(self):
+        for worker in self.workers:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
+        self.workers = []
+
+    def _new_worker(self) -> RenderWorker:
+        from src.config import png_threads
+
+        return RenderWorker(
+            next(self._ids), self._mp_context, self.manifest, png_threads(self.size)
+        )
+
+    def _spawn_replacement(self):
+        worker = self._new_worker()
+        self.workers.append(worker)
+        task = asyncio.ensure_future(worker.start())
+        # 保留task的參照，避免尚未完成就被回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _pick(self) -> RenderWorker:
+        candidates = [w for w in self.workers if not w.draining]
+        ready = [w for w in candidates if w.ready] or candidates
+        return min(ready, key=lambda w: w.in_flight)
+
+    def _drain(self, worker: RenderWorker):
+        if not worker.draining:
+            worker.draining = True
+            self.recycled += 1
+            self._spawn_replacement()
+        self._retire_if_idle(worker)
+
+    def _retire_if_idle(self, worker: RenderWorker):
+        if worker.draining and worker.in_flight == 0 and worker in self.workers:
+            self.workers.remove(worker)
+            worker.executor.shutdown(wait=False)
+
+    def recycle_all(self):
+        """替換所有worker（進行中的請求會先完成）"""
+        for worker in list(self.workers):
+            self._drain(worker)
+
+    async def render(self, method: str, *args) -> bytes:
+        """
+        Render ``Graph.<method>(*args)`` on the least-loaded worker.
+
+        Returns
+        -------
+        bytes
+            The PNG image.
+        """
+        worker = self._pick()
+        worker.in_flight += 1
+        worker.requests += 1
+        try:
+            img, worker.rss = await asyncio.wrap_future(
+                worker.executor.submit(_render, method, args)
+            )
+            return img
+        except BrokenProcessPool:
+            # worker行程異常結束，直接替換
+            self._drain(worker)
+            raise
+        finally:
+            worker.in_flight -= 1
+            if worker.rss > self.max_rss or worker.requests >= self.max_requests:
+                self._drain(worker)
+            self._retire_if_idle(worker)
+
+    def stats(self) -> dict:
+        return {
+            "recycled": self.recycled,
+            "max_rss_mb": self.max_rss // 1024 // 1024,
+            "max_requests": self.max_requests,
+            "workers": [w.stats() for w in self.workers],
+        }
+
+
+def create_pool(
+    size: int, max_rss_mb: int, max_requests: int, manifest: Optional[dict] = None
+) -> Optional[RenderPool]:
+    """size為0時不使用worker，回傳None"""
+    if size <= 0:
+        return None
+    return RenderPool(size, max_rss_mb, max_requests, manifest)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+離線效能基準測試
+直接呼叫Graph的繪圖方法（不需啟動API服務），記錄每個案例的
+執行時間、記憶體峰值與輸出大小，並與JSON基準檔比較是否退化
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.config import FigConfig, Json  # noqa: E402
+from src.graph import (  # noqa: E402
+    Graph,
+    SubsidyBoundaryParams,
+    ChoroplethParams,
+    Hist2DParams,
+    DotParams,
+    BubbleParams,
+    fig_to_image,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "benchmark_baseline.json"
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def synthetic_points(n: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """依各區域面積比例，在AREA_RANGE範圍內產生均勻分布的隨機點"""
+    rng = np.random.default_rng(seed)
+    bounds = [area["bounds"] for area in FigConfig.AREA_RANGE.values()]
+    weights = np.array(
+        [(b["max_x"] - b["min_x"]) * (b["max_y"] - b["min_y"]) for b in bounds]
+    )
+    area_idx = rng.choice(len(bounds), size=n, p=weights / weights.sum())
+    min_x = np.array([b["min_x"] for b in bounds])[area_idx]
+    max_x = np.array([b["max_x"] for b in bounds])[area_idx]
+    min_y = np.array([b["min_y"] for b in bounds])[area_idx]
+    max_y = np.array([b["max_y"] for b in bounds])[area_idx]
+    x = min_x + rng.random(n) * (max_x - min_x)
+    y = min_y + rng.random(n) * (max_y - min_y)
+    return x, y
+
+
+def synthetic_choropleth(level: str, seed: int = 0) -> pd.DataFrame:
+    """產生涵蓋所有縣市（22個）或所有鄉鎮市區（368個）的等值區域圖資料"""
+    rng = np.random.default_rng(seed)
+    with open(Json.COUNTY_TOWN, "r", encoding="utf-8") as f:
+        county_town = json.load(f)
+    if level == "town":
+        rows = [
+            {"county": county, "town": town}
+            for county, towns in county_town.items()
+            for town in towns
+        ]
+    else:
+        rows = [{"county": county} for county in county_town]
+    df = pd.DataFrame(rows)
+    df["value"] = rng.integers(0, 1000, size=len(df))
+    return df
+
+
+def build_cases(graph: Graph, sizes: List[int]) -> Dict[str, Callable]:
+    """建立所有基準測試案例，每個案例回傳(fig, ax)"""
+    cases = {
+        "plot_boundary": lambda: graph.plot_boundary(),
+        "plot_subsidy_boundary[type=1]": lambda: graph.plot_subsidy_boundary(
+            SubsidyBoundaryParams(type=1)
+        ),
+        "plot_subsidy_boundary[type=2]": lambda: graph.plot_subsidy_boundary(
+            SubsidyBoundaryParams(type=2)
+        ),
+    }
+    for level in ["county", "town"]:
+        df = synthetic_choropleth(level)
+        cases[f"plot_choropleth[level={level}]"] = (
+            lambda df=df, level=level: graph.plot_choropleth(
+                ChoroplethParams(data=df, column="value", level=level)
+            )
+        )
+    for n in sizes:
+        x, y = synthetic_points(n)
+        cases[f"plot_hist2d[n={n}]"] = lambda x=x, y=y: graph.plot_hist2d(
+            Hist2DParams(x=x, y=y)
+        )
+        cases[f"plot_dot[n={n}]"] = lambda x=x, y=y: graph.plot_dot(
+            DotParams(x=x, y=y, size=1)
+        )
+        size = np.full(n, 10.0)
+        color = np.full(n, "red")
+        cases[f"plot_bubble[n={n}]"] = lambda x=x, y=y, s=size, c=color: (
+            graph.plot_bubble(BubbleParams(x=x, y=y, size=s, color=c))
+        )
+    return cases
+
+
+def run_case(case: Callable, repeat: int) -> Dict[str, float]:
+    """執行單一案例：先計時（不追蹤記憶體），再追蹤一次記憶體峰值"""
+    plot_times, image_times = [], []
+    output_bytes = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig, _ = case()
+        plotted = time.perf_counter()
+        img_buf = fig_to_image(fig)
+        done = time.perf_counter()
+        plot_times.append(plotted - start)
+        image_times.append(done - plotted)
+        output_bytes = img_buf.getbuffer().nbytes
+
+    # tracemalloc本身會拖慢執行，因此記憶體峰值另外量測
+    tracemalloc.start()
+    try:
+        fig, _ = case()
+        fig_to_image(fig)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    plot_time = statistics.median(plot_times)
+    image_time = statistics.median(image_times)
+    return {
+        "plot_time": round(plot_time, 4),
+        "fig_to_image_time": round(image_time, 4),
+        "wall_time": round(plot_time + image_time, 4),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "output_bytes": output_bytes,
+    }
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float
+) -> List[str]:
+    """比較本次結果與基準，回傳退化的項目說明"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ["wall_time", "peak_memory_mb"]:
+            limit = base[metric] * (1 + threshold)
+            if result[metric] > limit:
+                regressions.append(
+                    f"{name} {metric}: {result[metric]} > {base[metric]} "
+                    f"(+{threshold:.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIS Toolkit 離線效能基準測試")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="點資料的筆數（預設: 1e2 ~ 1e6）",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="每個案例的重複次數")
+    parser.add_argument(
+        "--filter", default=None, help="只執行名稱包含此字串的案例"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=DEFAULT_BASELINE, help="基準JSON檔路徑"
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="將本次結果寫入基準檔，而非比較"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="允許的退化比例（預設20%%）"
+    )
+    args = parser.parse_args()
+
+    graph = Graph()
+    cases = build_cases(graph, args.sizes)
+    if args.filter:
+        cases = {k: v for k, v in cases.items() if args.filter in k}
+
+    # 預熱：載入字體與地理資料，避免第一個案例承擔冷啟動成本
+    fig, _ = graph.plot_boundary()
+    fig_to_image(fig)
+
+    results = {}
+    for name, case in cases.items():
+        result = run_case(case, args.repeat)
+        results[name] = result
+        print(
+            f"{name:<40} {result['plot_time']:>8.3f}s {result['fig_to_image_time']:>8.3f}s "
+            f"{result['peak_memory_mb']:>9.1f}MB {result['output_bytes']:>10,}B"
+        )
+
+    if args.save or not args.baseline.exists():
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基準結果已保存到: {args.baseline}")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\n⚠️  效能退化：")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n✓ 未發現效能退化")
+
+
+if __name__ == "__main__":
+    main()
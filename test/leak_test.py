@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+行程內記憶體洩露測試工具
+以TestClient在同一個行程內驅動FastAPI應用（不需啟動服務），
+透過tracemalloc快照與存活的matplotlib Figure/Artist數量，
+統計各端點的記憶體增長
+
+--cleanup可在每個請求後加入清理，比較逐請求的plt.close/rcdefaults/gc
+是否必要（記憶體增長）及其代價（延遲）
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import matplotlib.pyplot as plt
+from matplotlib.artist import Artist
+from matplotlib.figure import Figure
+from fastapi.testclient import TestClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+# 在主行程內繪圖，才能以tracemalloc追蹤Graph的記憶體
+os.environ["RENDER_WORKERS"] = "0"
+
+import app as app_module  # noqa: E402
+
+ENDPOINTS: List[Tuple[str, str, dict]] = [
+    ("GET", "/boundary", None),
+    (
+        "POST",
+        "/choropleth",
+        {
+            "data": [
+                {"county": "臺北市", "value": 100},
+                {"county": "新北市", "value": 200},
+                {"county": "桃園市", "value": 150},
+            ],
+            "column": "value",
+            "level": "county",
+        },
+    ),
+    (
+        "POST",
+        "/dot",
+        {"x": [121.5, 121.6, 121.7], "y": [25.0, 25.1, 25.2], "size": 10},
+    ),
+    (
+        "POST",
+        "/hist2d",
+        {
+            "x": [121.5, 121.6, 121.7, 121.8] * 25,
+            "y": [25.0, 25.1, 25.2, 25.3] * 25,
+            "bins": 50,
+        },
+    ),
+    (
+        "POST",
+        "/bubble",
+        {
+            "x": [121.5, 121.6, 121.7],
+            "y": [25.0, 25.1, 25.2],
+            "size": [10, 20, 15],
+            "color": ["red", "blue", "green"],
+        },
+    ),
+]
+
+
+def count_live_artists() -> Dict[str, int]:
+    """計算目前存活的matplotlib Figure與Artist物件數量"""
+    gc.collect()
+    figures = artists = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, Figure):
+            figures += 1
+        if isinstance(obj, Artist):
+            artists += 1
+    return {
+        "figures": figures,
+        "artists": artists,
+        "open_figures": len(plt.get_fignums()),
+    }
+
+
+def cleanup(mode: str):
+    """
+    請求結束後的清理，用於比較清理機制是否必要
+
+    - none: 維持應用目前的行為，不另外清理
+    - close: 關閉所有圖表
+    - gc: 關閉所有圖表並gc
+    - full: 關閉所有圖表、重設rcParams並gc（Graph.cleanup_memory）
+    """
+    if mode == "close":
+        plt.close("all")
+    elif mode == "gc":
+        plt.close("all")
+        gc.collect()
+    elif mode == "full":
+        app_module.graph_instance.cleanup_memory()
+
+
+def run(
+    requests_count: int, warmup: int, sample_every: int, seed: int, mode: str = "none"
+) -> dict:
+    with TestClient(app_module.app) as client:
+        return _run(client, requests_count, warmup, sample_every, seed, mode)
+
+
+def _run(
+    client: TestClient,
+    requests_count: int,
+    warmup: int,
+    sample_every: int,
+    seed: int,
+    mode: str,
+) -> dict:
+    rng = random.Random(seed)
+
+    # 預熱：讓字體、地理資料等一次性快取先建立，避免被誤判為洩露
+    for method, endpoint, data in ENDPOINTS * warmup:
+        client.request(method, endpoint, json=data)
+        cleanup(mode)
+    gc.collect()
+
+    growth = defaultdict(int)
+    calls = defaultdict(int)
+    errors = defaultdict(int)
+    latency = defaultdict(float)
+    samples = []
+
+    tracemalloc.start()
+    samples.append({"request": 0, "traced_mb": 0.0, **count_live_artists()})
+    first_snapshot = tracemalloc.take_snapshot()
+    base_traced, _ = tracemalloc.get_traced_memory()
+
+    for i in range(1, requests_count + 1):
+        method, endpoint, data = rng.choice(ENDPOINTS)
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        response = client.request(method, endpoint, json=data)
+        cleanup(mode)
+        latency[endpoint] += time.perf_counter() - start
+        if response.status_code != 200:
+            errors[endpoint] += 1
+        del response
+        # 先回收循環參照的垃圾，只統計真正被保留下來的記憶體
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+
+        growth[endpoint] += after - before
+        calls[endpoint] += 1
+
+        if i % sample_every == 0:
+            live = count_live_artists()
+            traced, _ = tracemalloc.get_traced_memory()
+            sample = {
+                "request": i,
+                "traced_mb": round((traced - base_traced) / 1024 / 1024, 3),
+                **live,
+            }
+            samples.append(sample)
+            print(
+                f"[{i}/{requests_count}] 記憶體增長 {sample['traced_mb']:+.3f} MB, "
+                f"Figure {sample['figures']}, Artist {sample['artists']}"
+            )
+
+    last_snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    top_stats = last_snapshot.compare_to(first_snapshot, "lineno")[:10]
+    return {
+        "cleanup": mode,
+        "endpoints": {
+            endpoint: {
+                "calls": calls[endpoint],
+                "errors": errors[endpoint],
+                "growth_kb": round(growth[endpoint] / 1024, 1),
+                "growth_per_call_b": round(growth[endpoint] / calls[endpoint], 1),
+                "latency_ms": round(latency[endpoint] / calls[endpoint] * 1000, 1),
+            }
+            for endpoint in calls
+        },
+        "samples": samples,
+        "top_allocations": [str(stat) for stat in top_stats],
+    }
+
+
+def report(result: dict):
+    print(f"\n=== 各端點記憶體增長（清理: {result['cleanup']}） ===")
+    for endpoint, stat in sorted(result["endpoints"].items()):
+        print(
+            f"{endpoint:<14} 請求 {stat['calls']:>6}  錯誤 {stat['errors']:>4}  "
+            f"累計 {stat['growth_kb']:>+10.1f} KB  每次 {stat['growth_per_call_b']:>+9.1f} B  "
+            f"延遲 {stat['latency_ms']:>7.1f} ms"
+        )
+
+    first, last = result["samples"][0], result["samples"][-1]
+    print("\n=== 存活的matplotlib物件 ===")
+    print(f"Figure: {first['figures']} -> {last['figures']}")
+    print(f"Artist: {first['artists']} -> {last['artists']}")
+    print(f"未關閉的圖表: {last['open_figures']}")
+
+    print("\n=== 增長最多的配置位置 ===")
+    for line in result["top_allocations"]:
+        print(f"  {line}")
+
+    if last["figures"] > first["figures"] or last["artists"] > first["artists"]:
+        print("\n⚠️  matplotlib物件持續存活，可能存在洩露")
+    elif last["traced_mb"] > 10:
+        print("\n⚠️  記憶體持續增長，可能存在洩露")
+    else:
+        print("\n✓ 未發現記憶體洩露")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIS Toolkit 行程內記憶體洩露測試")
+    parser.add_argument("--requests", type=int, default=2000, help="總請求數")
+    parser.add_argument("--warmup", type=int, default=2, help="每個端點的預熱次數")
+    parser.add_argument(
+        "--sample-every", type=int, default=100, help="每隔多少請求統計一次物件數"
+    )
+    parser.add_argument(
+        "--cleanup",
+        choices=["none", "close", "gc", "full"],
+        default="none",
+        help="每個請求後的清理方式，用於比較清理是否必要",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="結果JSON輸出路徑")
+    args = parser.parse_args()
+
+    result = run(args.requests, args.warmup, args.sample_every, args.seed, args.cleanup)
+    report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"測試結果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
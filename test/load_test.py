@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+負載測試工具
+在本機以uvicorn啟動應用，依設定的端點比例以固定並發數（closed-loop）
+或目標RPS（open-loop）發送請求，回報延遲百分位數、吞吐量、錯誤率，
+以及服務端各行程的記憶體（RSS）變化
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import psutil
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "boundary=1,choropleth=1,dot=1,hist2d=1,bubble=1"
+
+
+def build_payloads(points: int, seed: int = 0) -> Dict[str, Tuple[str, str, dict]]:
+    """建立各端點的請求內容，點資料的筆數由points決定"""
+    rng = np.random.default_rng(seed)
+    x = np.round(rng.uniform(120.1, 121.9, points), 5).tolist()
+    y = np.round(rng.uniform(22.0, 25.2, points), 5).tolist()
+    return {
+        "boundary": ("GET", "/boundary", None),
+        "subsidy_boundary": ("GET", "/subsidy_boundary", None),
+        "choropleth": (
+            "POST",
+            "/choropleth",
+            {
+                "data": [
+                    {"county": "臺北市", "value": 100},
+                    {"county": "新北市", "value": 200},
+                    {"county": "桃園市", "value": 150},
+                    {"county": "臺中市", "value": 180},
+                    {"county": "臺南市", "value": 120},
+                    {"county": "高雄市", "value": 220},
+                ],
+                "column": "value",
+                "level": "county",
+            },
+        ),
+        "dot": ("POST", "/dot", {"x": x, "y": y, "size": 10}),
+        "hist2d": ("POST", "/hist2d", {"x": x, "y": y, "bins": 100}),
+        "bubble": (
+            "POST",
+            "/bubble",
+            {
+                "x": x,
+                "y": y,
+                "size": [10] * points,
+                "color": ["red"] * points,
+            },
+        ),
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析端點比例，例如 'boundary=1,dot=2'"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class ServerProcess:
+    """以uvicorn啟動應用，並追蹤主行程與所有子行程的RSS"""
+
+    def __init__(self, port: int, workers: int, env: Dict[str, str]):
+        self.port = port
+        self.workers = workers
+        self.env = {**os.environ, "PYTHONPATH": str(ROOT_DIR), **env}
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 120):
+        self.proc = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self.port),
+                "--workers",
+                str(self.workers),
+                "--log-level",
+                "warning",
+            ],
+            cwd=ROOT_DIR,
+            env=self.env,
+        )
+        # 等到/ready回報預熱完成；多個uvicorn worker時每次連線可能由不同
+        # 行程處理，連續數次都就緒才開始測試
+        deadline = time.monotonic() + timeout
+        streak = 0
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError("服務啟動失敗")
+            try:
+                ready = httpx.get(f"{self.url}/ready", timeout=1).status_code == 200
+            except httpx.HTTPError:
+                ready = False
+            streak = streak + 1 if ready else 0
+            if streak >= 2 * self.workers:
+                return
+            time.sleep(0.1 if ready else 0.5)
+        raise TimeoutError("等待服務預熱逾時")
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def rss_mb(self) -> Dict[str, float]:
+        """回傳服務端所有行程的RSS（MB）"""
+        if self.proc is None:
+            return {}
+        try:
+            parent = psutil.Process(self.proc.pid)
+            procs = [parent] + parent.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return {}
+        rss = {}
+        for p in procs:
+            try:
+                rss[str(p.pid)] = round(p.memory_info().rss / 1024 / 1024, 1)
+            except psutil.NoSuchProcess:
+                continue
+        return rss
+
+
+class LoadTest:
+    def __init__(
+        self,
+        base_url: str,
+        payloads: Dict[str, Tuple[str, str, dict]],
+        weights: Dict[str, float],
+        duration: float,
+        concurrency: int,
+        rps: Optional[float],
+        timeout: float,
+        seed: int = 0,
+    ):
+        self.base_url = base_url
+        self.payloads = payloads
+        self.names = list(weights)
+        self.weights = [weights[n] for n in self.names]
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rps = rps
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.results: List[dict] = []
+
+    async def _send(
+        self, client: httpx.AsyncClient, name: str, start: Optional[float] = None
+    ):
+        method, endpoint, data = self.payloads[name]
+        start = start or time.perf_counter()
+        try:
+            response = await client.request(method, endpoint, json=data)
+            status = response.status_code
+            size = len(response.content)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            size = 0
+        self.results.append(
+            {
+                "endpoint": name,
+                "status": status,
+                "latency": time.perf_counter() - start,
+                "bytes": size,
+                "time": start,
+            }
+        )
+
+    def _pick(self) -> str:
+        return self.rng.choices(self.names, weights=self.weights)[0]
+
+    async def _closed_loop(self, client: httpx.AsyncClient, end: float):
+        async def user():
+            while time.perf_counter() < end:
+                await self._send(client, self._pick())
+
+        await asyncio.gather(*(user() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, client: httpx.AsyncClient, end: float):
+        # 以固定間隔送出請求，不等待前一個請求完成；concurrency為同時進行中的上限
+        interval = 1 / self.rps
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        async def send(name, scheduled):
+            # 延遲從預定送出時間起算，包含在客戶端排隊的時間
+            async with semaphore:
+                await self._send(client, name, start=scheduled)
+
+        next_time = time.perf_counter()
+        while next_time < end:
+            tasks.append(asyncio.create_task(send(self._pick(), next_time)))
+            next_time += interval
+            await asyncio.sleep(max(0, next_time - time.perf_counter()))
+        await asyncio.gather(*tasks)
+
+    async def run(self, server: Optional[ServerProcess] = None) -> dict:
+        limits = httpx.Limits(max_connections=self.concurrency)
+        rss_timeline = []
+
+        async def sample_rss(stop: asyncio.Event, start: float):
+            while not stop.is_set():
+                rss = server.rss_mb() if server else {}
+                rss_timeline.append(
+                    {
+                        "t": round(time.perf_counter() - start, 1),
+                        "total_mb": round(sum(rss.values()), 1),
+                        "processes": rss,
+                    }
+                )
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, limits=limits
+        ) as client:
+            start = time.perf_counter()
+            end = start + self.duration
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(sample_rss(stop, start))
+            if self.rps:
+                await self._open_loop(client, end)
+            else:
+                await self._closed_loop(client, end)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await sampler
+
+        return summarize(self.results, elapsed, rss_timeline)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+    }
+
+
+def summarize(results: List[dict], elapsed: float, rss_timeline: List[dict]) -> dict:
+    def stats(rows):
+        ok = [r for r in rows if r["status"] == 200]
+        return {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "error_rate": round((len(rows) - len(ok)) / len(rows), 4) if rows else 0,
+            "throughput_rps": round(len(ok) / elapsed, 2),
+            "latency": percentiles([r["latency"] for r in ok]),
+        }
+
+    endpoints = sorted({r["endpoint"] for r in results})
+    return {
+        "elapsed": round(elapsed, 2),
+        "total": stats(results),
+        "endpoints": {
+            e: stats([r for r in results if r["endpoint"] == e]) for e in endpoints
+        },
+        "status_counts": {
+            str(s): sum(1 for r in results if r["status"] == s)
+            for s in {r["status"] for r in results}
+        },
+        "rss": rss_timeline,
+    }
+
+
+def report(summary: dict):
+    def line(name, s):
+        lat = s["latency"]
+        fmt = lambda v: f"{v * 1000:>8.0f}" if v is not None else f"{'-':>8}"  # noqa: E731
+        print(
+            f"{name:<18} {s['requests']:>7} {s['error_rate']:>7.1%} "
+            f"{s['throughput_rps']:>8.2f} {fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])}"
+        )
+
+    print(f"\n測試時間: {summary['elapsed']} 秒")
+    print(
+        f"{'端點':<16} {'請求數':>5} {'錯誤率':>5} {'RPS':>8} "
+        f"{'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8}"
+    )
+    for name, s in summary["endpoints"].items():
+        line(name, s)
+    line("total", summary["total"])
+    print(f"狀態碼: {summary['status_counts']}")
+
+    if summary["rss"]:
+        totals = [r["total_mb"] for r in summary["rss"] if r["total_mb"]]
+        if totals:
+            print(
+                f"服務端RSS: 起始 {totals[0]:.1f} MB, 峰值 {max(totals):.1f} MB, "
+                f"結束 {totals[-1]:.1f} MB"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIS Toolkit 負載測試工具")
+    parser.add_argument(
+        "--url", default=None, help="已啟動服務的URL；未指定時自動以uvicorn啟動"
+    )
+    parser.add_argument("--port", type=int, default=5020, help="自動啟動時使用的埠號")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker數")
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="傳給服務的環境變數，可重複指定",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="端點比例")
+    parser.add_argument("--points", type=int, default=1000, help="點資料的筆數")
+    parser.add_argument("--duration", type=float, default=30, help="測試秒數")
+    parser.add_argument("--concurrency", type=int, default=4, help="並發數")
+    parser.add_argument(
+        "--rps", type=float, default=None, help="目標RPS；指定時改為open-loop模式"
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="請求逾時秒數")
+    parser.add_argument("--output", type=Path, default=None, help="結果JSON輸出路徑")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    payloads = build_payloads(args.points)
+    unknown = set(weights) - set(payloads)
+    if unknown:
+        parser.error(f"未知的端點: {', '.join(sorted(unknown))}")
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        env = dict(item.split("=", 1) for item in args.env)
+        server = ServerProcess(args.port, args.workers, env)
+        print(f"啟動服務 (workers={args.workers}) ...")
+        server.start()
+        base_url = server.url
+
+    try:
+        load_test = LoadTest(
+            base_url,
+            payloads,
+            weights,
+            duration=args.duration,
+            concurrency=args.concurrency,
+            rps=args.rps,
+            timeout=args.timeout,
+        )
+        mode = f"rps={args.rps}" if args.rps else f"concurrency={args.concurrency}"
+        print(f"開始負載測試 ({mode}, {args.duration} 秒) ...")
+        summary = asyncio.run(load_test.run(server))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"測試結果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
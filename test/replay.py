@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+流量重播工具
+讀取TrafficCapture錄製的JSONL檔，依原始時間間隔（或加速）重播，
+目標可為同一行程內的應用，或透過HTTP連線的服務
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from load_test import report, summarize  # noqa: E402
+
+
+def load_records(paths: List[Path]) -> List[dict]:
+    """讀取錄製檔（含輪替的備份檔），依時間排序"""
+    records = []
+    for path in paths:
+        files = sorted(path.glob("capture.jsonl*")) if path.is_dir() else [path]
+        for file in files:
+            with open(file, "r", encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: List[dict],
+    speed: float,
+    concurrency: int,
+) -> dict:
+    """
+    重播錄製的請求
+
+    speed為1時依原始間隔送出，大於1時等比例加速，0則不等待、盡快送出
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def send(record: dict, scheduled: float):
+        async with semaphore:
+            url = record["path"] + (f"?{record['query']}" if record["query"] else "")
+            try:
+                response = await client.request(
+                    record["method"], url, json=record["body"]
+                )
+                status = response.status_code
+                size = len(response.content)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                size = 0
+            results.append(
+                {
+                    "endpoint": record["path"].lstrip("/"),
+                    "status": status,
+                    "latency": time.perf_counter() - scheduled,
+                    "bytes": size,
+                    "captured_duration": record["duration"],
+                }
+            )
+
+    start = time.perf_counter()
+    first_ts = records[0]["ts"] if records else 0
+    tasks = []
+    for record in records:
+        scheduled = start
+        if speed > 0:
+            scheduled = start + (record["ts"] - first_ts) / speed
+            await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+        tasks.append(
+            asyncio.create_task(send(record, max(scheduled, time.perf_counter())))
+        )
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results, elapsed, [])
+    summary["captured_duration_total"] = round(
+        sum(r["captured_duration"] for r in results), 2
+    )
+    return summary
+
+
+async def wait_ready(app, timeout: float = 300):
+    """等待lifespan中的背景預熱完成（app.state.ready）"""
+    deadline = time.monotonic() + timeout
+    while not getattr(app.state, "ready", False):
+        if time.monotonic() > deadline:
+            raise TimeoutError("等待服務預熱逾時")
+        await asyncio.sleep(0.1)
+
+
+async def run(
+    records: List[dict], url: Optional[str], speed: float, concurrency: int
+) -> dict:
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+            return await replay(client, records, speed, concurrency)
+
+    # 同一行程內重播：直接以ASGI介面呼叫應用，並執行其lifespan
+    from app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        await wait_ready(app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://replay", timeout=300
+        ) as client:
+            return await replay(client, records, speed, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GIS Toolkit 流量重播工具")
+    parser.add_argument(
+        "captures", type=Path, nargs="+", help="錄製檔或CAPTURE_DIR目錄"
+    )
+    parser.add_argument(
+        "--url", default=None, help="目標服務URL；未指定時在同一行程內重播"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="重播速度倍率，1為原始速度，0為盡快送出",
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="同時進行的請求上限")
+    parser.add_argument("--limit", type=int, default=None, help="最多重播的請求數")
+    parser.add_argument(
+        "--include-redacted",
+        action="store_true",
+        help="也重播欄位已遮蔽的請求（數值為0、字串為***，結果與原請求不同）",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="結果JSON輸出路徑")
+    args = parser.parse_args()
+
+    records = load_records(args.captures)
+    redacted = sum(1 for r in records if r.get("redacted"))
+    if redacted and not args.include_redacted:
+        records = [r for r in records if not r.get("redacted")]
+        print(f"略過 {redacted} 個欄位已遮蔽的請求（--include-redacted可一併重播）")
+    records = records[: args.limit]
+    if not records:
+        parser.error("沒有可重播的請求")
+
+    target = args.url or "in-process"
+    print(f"重播 {len(records)} 個請求 (目標: {target}, 速度: {args.speed}x) ...")
+    summary = asyncio.run(run(records, args.url, args.speed, args.concurrency))
+
+    report(summary)
+    print(f"錄製時的服務端總耗時: {summary['captured_duration_total']} 秒")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"測試結果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+允入控制測試腳本 - 排隊中的請求在另一個繪圖完成的同一輪被取消或逾時
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.admission import AdmissionControl, Rejected  # noqa: E402
+
+
+async def _race(trigger: str):
+    """a繪圖中、b排隊；a完成的同一輪中b被取消（cancel）或到期（timeout）"""
+    adm = AdmissionControl(limits={}, default_limit=1, max_waiting=8, max_cost=10)
+    loop = asyncio.get_running_loop()
+    gate = loop.create_future()
+
+    async def render():
+        await gate
+        return b"png"
+
+    a = asyncio.ensure_future(adm.run("plot", 1.0, loop.time() + 10, render))
+    await asyncio.sleep(0)
+    if trigger == "cancel":
+        b = asyncio.ensure_future(adm.run("plot", 1.0, loop.time() + 10, render))
+        await asyncio.sleep(0)
+        gate.set_result(None)
+        b.cancel()
+    else:
+        finish = loop.time() + 0.05
+        b = asyncio.ensure_future(adm.run("plot", 1.0, finish, render))
+        await asyncio.sleep(0)
+        loop.call_at(finish, gate.set_result, None)
+    results = await asyncio.gather(a, b, return_exceptions=True)
+    return adm, results
+
+
+def test_cancel_during_release():
+    adm, (a, b) = asyncio.run(_race("cancel"))
+    assert a == b"png"
+    assert isinstance(b, asyncio.CancelledError), repr(b)
+    assert adm.cost == 0 and adm.running["plot"] == 0 and not adm._queues["plot"]
+    assert adm.cancelled == 1
+    print("✅ 繪圖完成的同一輪中取消排隊的請求")
+
+
+def test_timeout_during_release():
+    adm, (a, b) = asyncio.run(_race("timeout"))
+    assert a == b"png"
+    assert isinstance(b, Rejected) and b.status == 503, repr(b)
+    assert adm.cost == 0 and adm.running["plot"] == 0 and not adm._queues["plot"]
+    assert adm.expired == 1
+    print("✅ 繪圖完成的同一輪中排隊的請求逾時")
+
+
+def test_cost_released_on_any_error():
+    """取得名額前發生任何例外都歸還成本"""
+    adm = AdmissionControl(limits={}, default_limit=1, max_waiting=8, max_cost=10)
+
+    async def fail(method, timeout):
+        raise RuntimeError("boom")
+
+    adm._acquire = fail
+    try:
+        asyncio.run(adm.run("plot", 1.0, 0.0, lambda: None))
+    except RuntimeError:
+        pass
+    assert adm.cost == 0
+    print("✅ 取得名額前的例外歸還成本")
+
+
+if __name__ == "__main__":
+    test_cancel_during_release()
+    test_timeout_during_release()
+    test_cost_released_on_any_error()
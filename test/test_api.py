@@ -4,9 +4,29 @@ API測試腳本 - 測試更新後的API端點
 """
 import requests
 import json
+import struct
 import time
 
 
+def check_endpoint(base_url, name, method, path, expected=200, save=None, **kwargs):
+    """送出一個請求並檢查狀態碼，成功且save有值時保存回應內容"""
+    try:
+        response = requests.request(method, f"{base_url}{path}", **kwargs)
+    except Exception as e:
+        print(f"❌ {name}連接失敗: {e}")
+        return None
+    if response.status_code != expected:
+        print(f"❌ {name}: 預期 {expected}，實際 {response.status_code}")
+        print(f"   錯誤信息: {response.text[:200]}")
+        return None
+    print(f"✅ {name}: {response.status_code}")
+    if save:
+        with open(save, "wb") as f:
+            f.write(response.content)
+        print(f"   已保存為 {save}")
+    return response
+
+
 def test_api_endpoints():
     """測試所有API端點"""
     base_url = "http://localhost:5010"
@@ -156,6 +176,163 @@ def test_api_endpoints():
             print(f"   錯誤信息: {response.text}")
     except Exception as e:
         print(f"❌ 氣泡圖端點失敗: {e}")
+
+    points = {
+        "x": [121.52, 121.55, 121.50, 120.68, 120.30, 120.20] * 10,
+        "y": [25.04, 25.03, 25.05, 24.15, 22.63, 23.00] * 10,
+    }
+
+    # 測試資料版本
+    print("\n7. 測試資料版本端點...")
+    response = check_endpoint(base_url, "資料版本", "GET", "/vintages")
+    latest = response.json()["latest"] if response is not None else None
+    print(f"   最新版本: {latest}")
+    check_endpoint(base_url, "指定資料版本", "GET", "/boundary", params={"vintage": latest})
+    check_endpoint(base_url, "未知的資料版本", "GET", "/boundary", 400, params={"vintage": "0"})
+
+    # 測試單一區域與投影
+    print("\n8. 測試單一區域與投影...")
+    check_endpoint(
+        base_url, "單一縣市", "GET", "/boundary",
+        params={"region": "臺北市"}, save="test_region.png",
+    )
+    check_endpoint(
+        base_url, "單一鄉鎮", "GET", "/subsidy_boundary",
+        params={"region": "臺北市中正區"},
+    )
+    check_endpoint(base_url, "不存在的區域", "GET", "/boundary", 400, params={"region": "不存在市"})
+    check_endpoint(
+        base_url, "投影座標系統", "GET", "/boundary",
+        params={"projection": "EPSG:3826"}, save="test_projection.png",
+    )
+    check_endpoint(
+        base_url, "非投影座標系統", "GET", "/boundary", 400,
+        params={"projection": "EPSG:4326"},
+    )
+    check_endpoint(
+        base_url, "無法辨識的投影", "GET", "/boundary", 400,
+        params={"projection": "foo"},
+    )
+
+    # 測試分層設色圖的分級方式
+    print("\n9. 測試分級方式...")
+    check_endpoint(
+        base_url, "分位數分級", "POST", "/choropleth",
+        json={**choropleth_data, "scheme": "quantile", "k": 3}, save="test_scheme.png",
+    )
+    check_endpoint(
+        base_url, "不支援的分級方式", "POST", "/choropleth", 400,
+        json={**choropleth_data, "scheme": "foo"},
+    )
+    check_endpoint(
+        base_url, "分級數超出範圍", "POST", "/choropleth", 400,
+        json={**choropleth_data, "scheme": "quantile", "k": 20},
+    )
+
+    # 測試點資料彙總的分層設色圖
+    print("\n10. 測試點資料彙總分層設色圖端點...")
+    check_endpoint(
+        base_url, "點彙總（縣市）", "POST", "/choropleth/points",
+        json=points,
+        save="test_choropleth_points.png",
+    )
+    response = check_endpoint(
+        base_url, "點彙總（鄉鎮，JSON）", "POST", "/choropleth/points",
+        json={**points, "level": "town", "format": "json"},
+    )
+    if response is not None:
+        print(f"   未對應的點數: {response.json()['unmatched']}")
+    check_endpoint(
+        base_url, "點彙總（投影輸入座標）", "POST", "/choropleth/points",
+        json={"x": [304000, 250000], "y": [2770000, 2670000], "crs": "EPSG:3826", "format": "json"},
+    )
+    check_endpoint(
+        base_url, "不支援的層級", "POST", "/choropleth/points", 400,
+        json={**points, "level": "village"},
+    )
+    check_endpoint(
+        base_url, "不支援的格式", "POST", "/choropleth/points", 400,
+        json={**points, "format": "xml"},
+    )
+    check_endpoint(
+        base_url, "不支援的彙總方式", "POST", "/choropleth/points", 400,
+        json={**points, "aggregation": "median"},
+    )
+    check_endpoint(
+        base_url, "缺少數值的平均", "POST", "/choropleth/points", 400,
+        json={**points, "aggregation": "mean"},
+    )
+
+    # 測試核密度熱度圖
+    print("\n11. 測試核密度熱度圖端點...")
+    check_endpoint(
+        base_url, "核密度熱度圖", "POST", "/kde",
+        json={**points, "bandwidth": 3000},
+        save="test_kde.png",
+    )
+    check_endpoint(base_url, "頻寬超出範圍", "POST", "/kde", 400, json={**points, "bandwidth": 0})
+    check_endpoint(base_url, "格點數超出範圍", "POST", "/kde", 400, json={**points, "gridsize": 5})
+    check_endpoint(
+        base_url, "權重長度不同", "POST", "/kde", 400,
+        json={**points, "weights": [1.0]},
+    )
+
+    # 測試六角形分箱圖
+    print("\n12. 測試六角形分箱圖端點...")
+    check_endpoint(
+        base_url, "六角形分箱圖", "POST", "/hexbin",
+        json={**points, "cellsize": 10000},
+        save="test_hexbin.png",
+    )
+    check_endpoint(
+        base_url, "六角形分箱圖（單一縣市）", "POST", "/hexbin",
+        json={**points, "region": "臺北市", "cellsize": 1000},
+    )
+    check_endpoint(
+        base_url, "格大小超出範圍", "POST", "/hexbin", 400,
+        json={**points, "cellsize": 10},
+    )
+    check_endpoint(
+        base_url, "權重長度不同", "POST", "/hexbin", 400,
+        json={**points, "weights": [1.0]},
+    )
+
+    # 測試座標查詢
+    print("\n13. 測試座標查詢端點...")
+    lookup = {"x": [121.52, 120.68, 119.0], "y": [25.04, 24.15, 21.0]}
+    response = check_endpoint(base_url, "所在鄉鎮", "POST", "/lookup/town", json=lookup)
+    if response is not None:
+        print(f"   鄉鎮: {response.json()['towns']['TOWNNAME']}")
+    check_endpoint(
+        base_url, "所在鄉鎮（二進位座標）", "POST", "/lookup/town",
+        data=struct.pack("<4d", 121.52, 25.04, 120.68, 24.15),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    check_endpoint(
+        base_url, "最近的鄉鎮", "POST", "/lookup/nearest",
+        json=lookup,
+        params={"max_distance": 50000},
+    )
+    check_endpoint(
+        base_url, "半徑內的鄉鎮", "POST", "/lookup/within",
+        json=lookup,
+        params={"radius": 3000},
+    )
+    check_endpoint(
+        base_url, "搜尋距離無效", "POST", "/lookup/nearest", 400,
+        json=lookup,
+        params={"max_distance": 0},
+    )
+    check_endpoint(
+        base_url, "半徑無效", "POST", "/lookup/within", 400,
+        json=lookup,
+        params={"radius": 0},
+    )
+    check_endpoint(
+        base_url, "無法辨識的座標系統", "POST", "/lookup/town", 400,
+        json=lookup,
+        params={"crs": "foo"},
+    )
     
     print("\n" + "=" * 50)
     print("🎉 API測試完成！")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+分級方式測試腳本 - Jenks自然斷點與窮舉所有分法的結果比較
+"""
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.classify import breaks  # noqa: E402
+
+
+def ssd(groups) -> float:
+    return sum(((g - g.mean()) ** 2).sum() for g in groups)
+
+
+def brute_force(x: np.ndarray, k: int) -> float:
+    """排序後的x分為k個連續級的最小離差平方和"""
+    return min(
+        ssd(np.split(x, cuts)) for cuts in itertools.combinations(range(1, len(x)), k - 1)
+    )
+
+
+def classes(x: np.ndarray, edges: np.ndarray) -> list:
+    """依級距邊界分級，與BoundaryNorm(clip=True)相同：最大值屬於最後一級"""
+    index = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, len(edges) - 2)
+    return [x[index == i] for i in range(len(edges) - 1)]
+
+
+def test_outlier_class():
+    """只有最大值的一級不應消失"""
+    edges = breaks([1, 2, 3, 4, 5, 100], "jenks", 3)
+    assert len(edges) == 4 and classes(np.array([100.0]), edges)[-1].size == 1, edges
+    edges = breaks([0.95, 1.81, 2.16, 2.79, 5.43, 5.89, 8.03, 17.82], "jenks", 2)
+    assert len(edges) == 3, edges
+    assert [g.tolist() for g in classes(np.array([8.03, 17.82]), edges)] == [[8.03], [17.82]]
+    print("✅ 極端值自成一級")
+
+
+def test_jenks_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        n = int(rng.integers(3, 9))
+        k = int(rng.integers(2, min(n, 5) + 1))
+        x = np.sort(np.round(rng.exponential(5, n), 2))
+        if len(np.unique(x)) < n:
+            continue
+        edges = breaks(x, "jenks", k)
+        groups = classes(x, edges)
+        assert len(groups) == k and all(len(g) for g in groups), (x, k, edges)
+        assert np.isclose(ssd(groups), brute_force(x, k)), (x, k, edges)
+    print("✅ Jenks與窮舉結果相同")
+
+
+if __name__ == "__main__":
+    test_outlier_class()
+    test_jenks_matches_brute_force()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+拓樸弧段測試腳本 - 共用邊界兩側頂點不一致時仍應只畫一次
+"""
+import sys
+import warnings
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from src.topology import ARC_COUNTY, ARC_TOWN, build_arcs  # noqa: E402
+
+
+def test_mismatched_vertices():
+    """左側鄉鎮的共用邊多一個頂點，仍應配對為一條鄉鎮界"""
+    town = gpd.GeoDataFrame(
+        {"COUNTYNAME": ["甲縣", "甲縣", "乙縣"]},
+        geometry=[
+            shapely.Polygon([(0, 0), (1, 0), (1, 0.5), (1, 1), (0, 1)]),
+            shapely.box(1, 0, 2, 1),
+            # 另一縣市，共用邊上多一個頂點(1, 1)
+            shapely.Polygon([(0, 1), (1, 1), (2, 1), (2, 2), (0, 2)]),
+        ],
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        arcs = build_arcs(town)
+    assert arcs["unmatched"] == 0 and arcs["overshared"] == 0
+
+    rank, offsets, coords = arcs["rank"], arcs["offsets"], arcs["coords"]
+    town_arcs = [
+        coords[offsets[i] : offsets[i + 1]].tolist()
+        for i in np.flatnonzero(rank == ARC_TOWN)
+    ]
+    assert town_arcs in (
+        [[[1.0, 0.0], [1.0, 0.5], [1.0, 1.0]]],
+        [[[1.0, 1.0], [1.0, 0.5], [1.0, 0.0]]],
+    ), town_arcs
+
+    # 每條線段只畫一次：縣市界的總長為外框8加上y = 1的縣市界2
+    lengths = [
+        shapely.length(shapely.linestrings(coords[offsets[i] : offsets[i + 1]]))
+        for i in np.flatnonzero(rank == ARC_COUNTY)
+    ]
+    assert np.isclose(sum(lengths), 10.0), lengths
+    print("✅ 頂點不一致的共用邊界")
+
+
+def test_overshared_segments():
+    """重複的鄉鎮使線段由三個環共用，應計數並發出警告"""
+    town = gpd.GeoDataFrame(
+        {"COUNTYNAME": ["甲縣"] * 3},
+        geometry=[shapely.box(0, 0, 1, 1)] * 2 + [shapely.box(1, 0, 2, 1)],
+    )
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        arcs = build_arcs(town)
+    assert arcs["overshared"] == 1 and arcs["unmatched"] == 0, arcs
+    assert len(caught) == 1
+    print("✅ 三個以上的環共用的線段")
+
+
+if __name__ == "__main__":
+    test_mismatched_vertices()
+    test_overshared_segments()